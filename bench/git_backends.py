@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""Compare ``git`` and ``python`` backends of gitchangelog
+
+Usage:
+
+    python bench/git_backends.py [--repo PATH | --commits N]
+                                 [--spawn-delay MS] [--runs N]
+
+Without ``--repo``, a repository of N commits (default 3000) with
+merges and a tag every 20 commits is made with ``git fast-import`` in a
+temporary directory.
+
+gitchangelog is run in a separate process for each backend, with and
+without ``single_pass_log``. The best wall time of the runs is given,
+along with the number of ``git`` processes started, and outputs are
+checked to be identical.
+
+``--spawn-delay`` simulates a container where starting processes is
+slow (``pids`` limited cgroup, seccomp or emulated CPU): a ``git``
+wrapper put first in ``$PATH`` sleeps that many milliseconds before
+running git.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import os.path
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src")
+
+MODES = [
+    ("git", False),
+    ("git", True),
+    ("python", False),
+    ("python", True),
+]
+
+
+def history(nb_commits, rand):
+    """Return a ``git fast-import`` stream of a branchy history"""
+    stream = []
+    date = 1000000000
+    side = None
+    for mark in range(1, nb_commits + 1):
+        date += rand.randint(1, 3600)
+        parents = [mark - 1] if mark > 1 else []
+        if side is None and mark > 10 and rand.random() < 0.05:
+            side = rand.randint(mark - 10, mark - 1)  ## fork a branch
+        elif side is not None and rand.random() < 0.2:
+            parents.append(side)  ## merge it back
+            side = None
+        elif side is not None:
+            ## commit on the branch instead
+            parents, side = [side], mark
+        message = "%s: commit %d\n\nSome body.\n" % (
+            rand.choice(["new", "fix", "chg"]), mark)
+        stream.append(
+            "commit refs/heads/%s\nmark :%d\n"
+            "author Alice <alice@example.com> %d +0000\n"
+            "committer Bob <bob@example.com> %d +0000\n"
+            "data %d\n%s"
+            % ("side" if side == mark else "master", mark, date, date,
+               len(message.encode("utf-8")), message))
+        stream.extend("%s :%d\n" % ("merge" if idx else "from", parent)
+                      for idx, parent in enumerate(parents))
+        stream.append("\n")
+        if mark % 20 == 0 and side != mark:
+            stream.append("reset refs/tags/0.%d\nfrom :%d\n\n"
+                          % (mark // 20, mark))
+    return "".join(stream)
+
+
+def make_repo(path, nb_commits):
+    subprocess.check_call(["git", "init", "-q", path])
+    p = subprocess.Popen(["git", "fast-import", "--quiet"],
+                         stdin=subprocess.PIPE, cwd=path)
+    p.communicate(history(nb_commits, random.Random(42)).encode("utf-8"))
+    subprocess.check_call(["git", "symbolic-ref", "HEAD",
+                           "refs/heads/master"], cwd=path)
+    subprocess.check_call(["git", "gc", "-q"], cwd=path)
+
+
+def git_wrapper(directory, delay, log):
+    """Put a ``git`` counting its calls and sleeping ``delay`` ms"""
+    real_git = subprocess.check_output(
+        ["sh", "-c", "command -v git"]).decode().strip()
+    path = os.path.join(directory, "git")
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\necho >> '%s'\n" % log)
+        if delay:
+            f.write("sleep %f\n" % (delay / 1000.0))
+        f.write("exec '%s' \"$@\"\n" % real_git)
+    os.chmod(path, 0o755)
+
+
+def run(repo, tmpdir, backend, single_pass_log, env):
+    rc = os.path.join(tmpdir, "bench.rc")
+    with open(rc, "w") as f:
+        f.write("git_backend = %r\nsingle_pass_log = %r\n"
+                % (backend, single_pass_log))
+    log = os.path.join(tmpdir, "calls.log")
+    if os.path.exists(log):
+        os.remove(log)
+    env = dict(env, GITCHANGELOG_CONFIG_FILENAME=rc)
+    start = time.time()
+    out = subprocess.check_output(
+        [sys.executable, "-m", "gitchangelog.gitchangelog"],
+        cwd=repo, env=env)
+    elapsed = time.time() - start
+    with open(log) as f:
+        calls = len(f.readlines())
+    return elapsed, calls, out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repo", help="existing repository to use")
+    parser.add_argument("--commits", type=int, default=3000,
+                        help="size of generated repository (default 3000)")
+    parser.add_argument("--spawn-delay", type=float, default=0,
+                        help="milliseconds added to each git process")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="runs per mode, best is kept (default 3)")
+    opts = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="gitchangelog-bench-")
+    try:
+        repo = opts.repo
+        if repo is None:
+            repo = os.path.join(tmpdir, "repo")
+            make_repo(repo, opts.commits)
+        bindir = os.path.join(tmpdir, "bin")
+        os.mkdir(bindir)
+        git_wrapper(bindir, opts.spawn_delay,
+                    os.path.join(tmpdir, "calls.log"))
+        env = dict(os.environ,
+                   PATH=bindir + os.pathsep + os.environ["PATH"],
+                   PYTHONPATH=SRC)
+
+        print("repository: %s, spawn delay: %g ms, best of %d runs"
+              % (opts.repo or "%d generated commits" % opts.commits,
+                 opts.spawn_delay, opts.runs))
+        outputs = set()
+        for backend, single_pass_log in MODES:
+            results = [run(repo, tmpdir, backend, single_pass_log, env)
+                       for _ in range(opts.runs)]
+            outputs.update(out for _, _, out in results)
+            print("  %-6s backend %-16s %7.3fs  %5d git processes"
+                  % (backend,
+                     "single pass" if single_pass_log else "per version",
+                     min(elapsed for elapsed, _, _ in results),
+                     results[0][1]))
+        print("outputs are %s" % ("identical" if len(outputs) == 1
+                                  else "DIFFERENT"))
+        return 0 if len(outputs) == 1 else 1
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -50,11 +50,32 @@ if "%%short-version%%".startswith("%%"):
     sys.exit(errlvl)
 
 
+##
+## ``gitchangelog.aio`` is python 3.7+ syntax, it must not be installed
+## (nor byte-compiled) on older pythons.
+##
+
+import sys
+
+from setuptools.command.build_py import build_py
+
+
+class build_py_without_aio(build_py):
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 7):
+            modules = [m for m in modules
+                       if (m[0], m[1]) != ("gitchangelog", "aio")]
+        return modules
+
+
 ##
 ## Normal d2to1 setup
 ##
 
 setup(
+    cmdclass={'build_py': build_py_without_aio},
     setup_requires=['d2to1'],
     extras_require={
         'Mustache': ["pystache", ],
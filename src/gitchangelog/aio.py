@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""asyncio API of gitchangelog
+
+Same features than ``changelog(..)`` and ``versions_data_iter(..)``,
+for programs running an ``asyncio`` event loop: ``git`` commands are
+run with ``asyncio.create_subprocess_exec`` and their output is read
+without blocking the loop, so one process can compute many
+changelogs at once.
+
+    >>> import asyncio
+    >>> from gitchangelog.aio import changelog_async, open_repos
+
+    >>> async def main(path):
+    ...     repository = await open_repos(path)
+    ...     return await changelog_async(repository=repository)
+
+    >>> asyncio.run(main("."))  # doctest: +SKIP
+
+Requires python 3.7 or later, this module is not installed on older
+pythons. The few parts of gitchangelog that are
+not available as coroutines (the creation of ``GitRepos`` and the
+first build of its ``AncestryIndex``) are run in the default executor
+of the loop.
+
+"""
+
+import asyncio
+import collections
+import functools
+import re
+import sys
+
+from asyncio.subprocess import PIPE
+
+if sys.version_info < (3, 7):
+    raise ImportError("gitchangelog.aio requires python 3.7 or later")
+
+from .gitchangelog import (
+    GitRepos, GitCommit, ShellError, CommitClassifier,
+    GIT_FORMAT_KEYS, GIT_TAG_REFS_FORMAT_STRING, VERSION_DATA_FIELDS,
+    DEFAULT_GIT_LOG_ENCODING, PLT_CFG, _preferred_encoding,
+    git_format_keys, parse_tag_refs, tags_until, version_data,
+    indent, rest_py, warn)
+
+
+##
+## Shell command helper functions
+##
+
+async def acmd(command, env=None, cwd=None, input=None):
+    """Coroutine version of ``cmd(..)``
+
+    ``command`` must be a list of arguments, it is run without shell.
+    Returns ``(stdout, stderr, errlvl)``.
+
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+            close_fds=PLT_CFG['close_fds'], env=env, cwd=cwd)
+    except OSError as e:
+        return "", "%s: %s\n" % (command[0], e.strerror), 127
+    stdout, stderr = await proc.communicate(input)
+    return (stdout.decode(_preferred_encoding),
+            stderr.decode(_preferred_encoding),
+            proc.returncode)
+
+
+def _shell_error(command, errlvl, out, err):
+    formatted = []
+    if out:
+        formatted.append("stdout:\n%s" % indent(out.rstrip("\n"), "| "))
+    if err:
+        formatted.append("stderr:\n%s" % indent(err.rstrip("\n"), "| "))
+    command = " ".join(command)
+    return ShellError(
+        "Wrapped command %r exited with errorlevel %d.\n%s"
+        % (command, errlvl, indent("\n".join(formatted), chars="  ")),
+        errlvl=errlvl, command=command, out=out, err=err)
+
+
+async def aswrap(command, ignore_errlvls=[0], **kwargs):
+    """Coroutine version of ``swrap(..)``"""
+    out, err, errlvl = await acmd(command, **kwargs)
+    if errlvl not in ignore_errlvls:
+        raise _shell_error(command, errlvl, out, err)
+    return out.strip()
+
+
+##
+## git information access
+##
+
+async def open_repos(path, backend=GitRepos):
+    """Return a ``backend`` instance of the repository at ``path``
+
+    Its creation runs a few ``git`` commands, so it is done in the
+    default executor of the loop.
+
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, backend, path)
+
+
+class AsyncGitRepos(object):
+    """Coroutine versions of ``GitRepos`` queries
+
+    This is an adaptor on a ``GitRepos`` instance, commits are
+    ``GitCommit`` of this repository, with all their attributes set
+    so that no ``git`` command is left to be run when using them.
+
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    async def swrap(self, command, **kwargs):
+        """Run ``command`` in the repository (see ``aswrap(..)``)"""
+        kwargs.setdefault("cwd", self.repository._orig_path)
+        return await aswrap(command, **kwargs)
+
+    async def _run_in_executor(self, fun, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(fun, *args))
+
+    async def commit(self, identifier, encoding=_preferred_encoding):
+        """``GitCommit`` of ``identifier`` with its attributes set"""
+        try:
+            commits = [commit async for commit in self._git_log(
+                ["--no-walk"], [identifier], encoding=encoding)]
+        except ShellError:
+            commits = []
+        if not commits:
+            raise ValueError("Given commit identifier %s doesn't exists"
+                             % identifier)
+        commits[0].identifier = identifier
+        return commits[0]
+
+    async def ancestry(self):
+        """``AncestryIndex`` of the repository"""
+        ## First use builds it from the whole history
+        return await self._run_in_executor(
+            lambda: self.repository.ancestry)
+
+    async def tags(self, contains=None):
+        """Same as ``GitRepos.tags(..)``"""
+        tags = []
+        for name, dct in parse_tag_refs(await self.swrap(
+                ["git", "for-each-ref",
+                 "--format=%s" % GIT_TAG_REFS_FORMAT_STRING, "refs/tags"])):
+            tag = self.repository.commit(name)
+            for k, v in dct.items():
+                setattr(tag, k, v)
+            tags.append(tag)
+
+        if contains:
+            ancestry = await self.ancestry()
+            sha1 = (await self.commit(contains)).sha1
+            reaching = await self._run_in_executor(
+                ancestry.reaching, sha1, [tag.sha1 for tag in tags])
+            tags = [tag for tag in tags if tag.sha1 in reaching]
+
+        return sorted(tags, key=lambda x: int(x.committer_date_timestamp))
+
+    async def log(self, includes=["HEAD", ], excludes=[], include_merge=True,
+                  encoding=_preferred_encoding, fields=None):
+        """Async iterator version of ``GitRepos.log(..)``
+
+        Commits are given as soon as ``git log`` outputs them. Fields
+        not requested with ``fields`` are read on first access, without
+        asyncio.
+
+        """
+        async def sha1(ref):
+            if isinstance(ref, GitCommit):
+                if "sha1" in ref.__dict__:
+                    return ref.sha1
+                ref = ref.identifier
+            return (await self.commit(ref)).sha1
+
+        revs = [await sha1(ref) for ref in includes] + \
+               ["^%s" % (await sha1(ref)) for ref in excludes]
+
+        ## --topo-order: don't mix commits from separate branches.
+        async for commit in self._git_log(
+                ["--topo-order"] + ([] if include_merge else ["--no-merges"]),
+                revs, encoding=encoding, fields=fields):
+            yield commit
+
+    async def _git_log(self, options, revs, encoding=_preferred_encoding,
+                       fields=None, buffersize=65536):
+        """Iterate on commits output by ``git log`` given ``revs`` on stdin"""
+        keys = git_format_keys(fields)
+        command = ["git", "log", "--stdin", "-z"] + options + \
+                  ["--pretty=format:%s" % "%x00".join(
+                      GIT_FORMAT_KEYS[key] for key in keys), "--"]
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+            close_fds=PLT_CFG['close_fds'],
+            cwd=self.repository._orig_path)
+
+        ## stderr is read along stdout so that none of them can block git
+        errors = asyncio.ensure_future(proc.stderr.read())
+        try:
+            proc.stdin.write("".join("%s\n" % rev for rev in revs)
+                             .encode(encoding))
+            await proc.stdin.drain()
+            proc.stdin.close()
+
+            values = []
+            buf = b""
+            while True:
+                chunk = await proc.stdout.read(buffersize)
+                if not chunk:
+                    break
+                records = (buf + chunk).split(b"\x00")
+                buf = records.pop()
+                values.extend(records)
+                while len(values) >= len(keys):
+                    dct = dict(zip(keys, values[:len(keys)]))
+                    del values[:len(keys)]
+                    yield self._mk_commit(dct, encoding)
+            values.append(buf)
+            if len(values) == len(keys):
+                yield self._mk_commit(dict(zip(keys, values)), encoding)
+
+            errlvl = await proc.wait()
+            if errlvl != 0:
+                raise _shell_error(command, errlvl, "",
+                                   (await errors).decode(encoding, "replace"))
+        finally:
+            if proc.returncode is None:  ## iteration was stopped early
+                proc.kill()
+                await proc.wait()
+            errors.cancel()
+
+    def _mk_commit(self, dct, encoding):
+        """Creates an already set commit from a dct of bytes values"""
+        c = self.repository.commit(dct["sha1"].decode(encoding))
+        for k, v in dct.items():
+            setattr(c, k, v.decode(encoding))
+        return c
+
+
+##
+## Changelog
+##
+
+async def ordered_amap(fun, iterable, workers):
+    """Async iterator on results of coroutine function ``fun``
+
+    At most ``workers`` coroutines are running at the same time, and
+    results are given in the order of ``iterable``.
+
+    """
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            pending.append(asyncio.ensure_future(fun(item)))
+            if len(pending) >= workers:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def versions_data_aiter(repository, revlist=None,
+                              ignore_regexps=[],
+                              section_regexps=[(None, '')],
+                              tag_filter_regexp=r"\d+\.\d+(\.\d+)?",
+                              include_merge=True,
+                              body_process=lambda x: x,
+                              subject_process=lambda x: x,
+                              log_encoding=DEFAULT_GIT_LOG_ENCODING,
+                              log_workers=1,
+                              log_fields=None,
+                              classifier=None,
+                              warn=warn,        ## Mostly used for test
+                              ):
+    """Async iterator version of ``versions_data_iter(..)``
+
+    ``repository`` is a ``GitRepos`` or an ``AsyncGitRepos``. Options
+    are the ones of ``versions_data_iter(..)``, except for
+    ``single_pass_log`` and ``incremental`` which are not available.
+    With ``log_workers`` above 1, commits of that many versions are
+    read concurrently, versions are still given in order.
+
+    """
+    if not isinstance(repository, AsyncGitRepos):
+        repository = AsyncGitRepos(repository)
+
+    revlist = revlist or []
+    fields = None if log_fields is None else \
+             set(log_fields) | set(VERSION_DATA_FIELDS)
+    if classifier is None:
+        classifier = CommitClassifier(ignore_regexps, section_regexps)
+
+    excludes = [rev[1:]
+                for rev in (await repository.swrap(
+                    ["git", "rev-parse", "--rev-only"] + revlist + ["--"]
+                )).split("\n")
+                if rev.startswith("^")] if revlist else []
+
+    contains = max_rev = None
+    if revlist:
+        walk = [line.split()
+                for line in (await repository.swrap(
+                    ["git", "rev-list", "--parents"] + revlist + ["--"]
+                )).split("\n")
+                if line]
+        (await repository.ancestry()).learn(
+            dict((node[0], node[1:]) for node in walk))
+        if walk:
+            max_rev, contains = walk[0][0], walk[-1][0]
+
+    tags = [tag
+            for tag in await repository.tags(contains=contains)
+            if re.match(tag_filter_regexp, tag.identifier)]
+
+    if not tags:
+        warn("no tag %sname matching tag_filter_regexp %r."
+             % ("contained in revlist %r with " % " ".join(revlist)
+                if revlist else "",
+                tag_filter_regexp))
+
+    head = await repository.commit("HEAD", encoding=log_encoding)
+    tags.append(head)
+
+    if revlist:
+        ## Revlists holding only excludes (as ``^1.2``) stop at ``HEAD``
+        tags = await repository._run_in_executor(
+            tags_until, repository.repository, tags, max_rev or head.sha1)
+
+    tags = list(reversed(tags))
+
+    async def fetch(idx):
+        return tags[idx], [commit async for commit in repository.log(
+            includes=[tags[idx]],
+            excludes=tags[idx + 1:] + excludes,
+            include_merge=include_merge,
+            encoding=log_encoding,
+            fields=fields)]
+
+    ## Get the changes between tags (releases)
+    async for tag, commits in ordered_amap(fetch, range(len(tags)),
+                                           workers=log_workers):
+        version = version_data(
+            tag, commits,
+            body_process=body_process,
+            subject_process=subject_process,
+            classifier=classifier)
+        if len(version["sections"]) != 0:
+            yield version
+
+
+async def changelog_async(output_engine=rest_py,
+                          unreleased_version_label="unreleased",
+                          warn=warn,        ## Mostly used for test
+                          **kwargs):
+    """Coroutine version of ``changelog(..)``
+
+    For an exact list of arguments, see the arguments of
+    ``versions_data_aiter(..)``. Versions are all read before
+    rendering them with ``output_engine``.
+
+    """
+    opts = {
+        'unreleased_version_label': unreleased_version_label,
+    }
+
+    if "log_fields" not in kwargs:
+        kwargs["log_fields"] = getattr(output_engine, "log_fields", None)
+
+    title = None if kwargs.get("revlist") else "Changelog"
+    versions = [version
+                async for version in versions_data_aiter(warn=warn,
+                                                         **kwargs)]
+    if not versions:
+        warn("Empty changelog. No commits were elected to be used as entry.")
+
+    return output_engine(data={"title": title, "versions": versions},
+                         opts=opts)
@@ -11,22 +11,27 @@ import sys
 import glob
 import textwrap
 import datetime
+import codecs
 import collections
 import traceback
-import contextlib
 import itertools
+import threading
+import hashlib
+import tempfile
+import copy
+import time
 
 from subprocess import Popen, PIPE
 
 try:
-    import pystache
+    from collections.abc import Iterator
 except ImportError:  ## pragma: no cover
-    pystache = None
+    from collections import Iterator
 
 try:
-    import mako
+    import queue
 except ImportError:  ## pragma: no cover
-    mako = None
+    import Queue as queue
 
 
 __version__ = "%%version%%"  ## replaced by autogen.sh
@@ -64,7 +69,7 @@ else:
 usage_msg = """
   %(exname)s {-h|--help}
   %(exname)s {-v|--version}
-  %(exname)s [--debug|-d] [REVLIST]"""
+  %(exname)s [--debug|-d] [--output|-o FILE] [REVLIST]"""
 
 description_msg = """\
 Run this command in a git repository to output a formatted changelog
@@ -114,16 +119,6 @@ class ShellError(Exception):
         super(ShellError, self).__init__(msg)
 
 
-@contextlib.contextmanager
-def set_cwd(dir):
-    curdir = os.getcwd()
-    os.chdir(dir)
-    try:
-        yield
-    finally:
-        os.chdir(curdir)
-
-
 def format_last_exception(prefix="  | "):
     """Format the last exception for display it in tests.
 
@@ -192,23 +187,191 @@ def load_config_file(filename, default_filename=None,
 ## Text functions
 ##
 
+## best available clock to measure durations
+_timer = getattr(time, "perf_counter", time.time)
+
+
 @available_in_config
 class TextProc(object):
+    """Text processing function, that can be chained with ``|``
+
+    Chained ``TextProc`` are flattened in one list of stages, called in
+    turn without nested calls:
 
-    def __init__(self, fun):
-        self.fun = fun
+        >>> proc = strip | ucfirst | final_dot
+        >>> proc("  hello ")
+        'Hello.'
+        >>> [name for name, _fun in proc.stages]
+        ['strip', 'ucfirst', 'final_dot']
+
+    ``map()`` processes a list of texts, stage after stage:
+
+        >>> proc.map(["a", " b!"])
+        ['A.', 'B!']
+
+    Number of texts and time spent by each stage are measured once
+    enabled:
+
+        >>> proc.enable_timing()
+        >>> len(proc.map(["a"] * 10)), proc("b")
+        (10, 'B.')
+        >>> [(name, texts) for name, texts, _seconds in proc.timings()]
+        [('strip', 11), ('ucfirst', 11), ('final_dot', 11)]
+
+    """
+
+    def __init__(self, fun, name=None):
         if hasattr(fun, "__name__"):
             self.__name__ = fun.__name__
+        self.stages = [(name or getattr(fun, "__name__", repr(fun)), fun)]
+        self._funs = [fun]
+        self._timings = None
+
+    @classmethod
+    def from_stages(cls, stages):
+        proc = cls(stages[0][1], stages[0][0])
+        proc.stages = list(stages)
+        proc._funs = [fun for _name, fun in stages]
+        return proc
+
+    @property
+    def fun(self):
+        return self._funs[0] if len(self._funs) == 1 else self.__call__
 
     def __call__(self, text):
-        return self.fun(text)
+        if self._timings is not None:
+            return self.map([text])[0]
+        for fun in self._funs:
+            text = fun(text)
+        return text
+
+    def map(self, texts):
+        """Return list of processed ``texts``"""
+        texts = list(texts)
+        timings = self._timings
+        for idx, fun in enumerate(self._funs):
+            if timings is None:
+                texts = [fun(text) for text in texts]
+                continue
+            start = _timer()
+            texts = [fun(text) for text in texts]
+            timings[idx][0] += len(texts)
+            timings[idx][1] += _timer() - start
+        return texts
+
+    def enable_timing(self):
+        """Measure time spent by each stage from now on"""
+        self._timings = [[0, 0.0] for _fun in self._funs]
+
+    def timings(self):
+        """Return ``(name, texts, seconds)`` for each stage"""
+        return [(name, texts, seconds)
+                for (name, _fun), (texts, seconds)
+                in zip(self.stages, self._timings or [])]
 
     def __or__(self, value):
         if isinstance(value, TextProc):
-            return TextProc(lambda text: value.fun(self.fun(text)))
+            return TextProc.from_stages(self.stages + value.stages)
         raise SyntaxError
 
 
+def text_digest(text):
+    if not isinstance(text, bytes):
+        text = text.encode("utf-8")
+    return hashlib.sha1(text).hexdigest()
+
+
+class MemoizedTextProc(TextProc):
+    """``TextProc`` that remembers its results
+
+    Processing must only depend on the given text. The ``size`` last
+    used results are kept in memory:
+
+        >>> calls = []
+        >>> def upper(text):
+        ...     calls.append(text)
+        ...     return text.upper()
+        >>> proc = MemoizedTextProc(TextProc(upper), size=2)
+        >>> proc.map(["a", "b", "a"])
+        ['A', 'B', 'A']
+        >>> proc("b"), proc("c"), proc("a")
+        ('B', 'C', 'A')
+        >>> calls
+        ['a', 'b', 'c', 'a']
+        >>> proc.hits, proc.misses
+        (2, 4)
+
+    Results can also be kept in a ``TextCache`` to be reused by later
+    runs. They are then stored under ``key``, which must change when the
+    processing changes.
+
+    """
+
+    def __init__(self, proc, size=4096, store=None, key=""):
+        if not isinstance(proc, TextProc):
+            proc = TextProc(proc)
+        self.proc = proc
+        self.stages = proc.stages
+        if hasattr(proc, "__name__"):
+            self.__name__ = proc.__name__
+        self.size = size
+        self.store = store
+        self.key = key
+        self._results = collections.OrderedDict()  ## LRU order
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def fun(self):
+        return self.__call__
+
+    def __call__(self, text):
+        return self.map([text])[0]
+
+    def map(self, texts):
+        """Return list of processed ``texts``"""
+        texts = list(texts)
+        results = {}
+        with self._lock:
+            for text in texts:
+                if text in self._results and text not in results:
+                    results[text] = self._results.pop(text)
+                    self._results[text] = results[text]  ## most recent
+
+        missing = list(collections.OrderedDict.fromkeys(
+            text for text in texts if text not in results))
+        if missing and self.store is not None:
+            digests = dict((text_digest(text), text) for text in missing)
+            for digest, result in self.store.get(
+                    self.key, list(digests)).items():
+                results[digests[digest]] = result
+            missing = [text for text in missing if text not in results]
+        if missing:
+            computed = dict(zip(missing, self.proc.map(missing)))
+            if self.store is not None:
+                self.store.put(self.key, dict(
+                    (text_digest(text), result)
+                    for text, result in computed.items()))
+            results.update(computed)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            for text in texts:
+                if self.size and text not in self._results:
+                    self._results[text] = results[text]
+                    if len(self._results) > self.size:
+                        self._results.popitem(last=False)
+        return [results[text] for text in texts]
+
+    def enable_timing(self):
+        self.proc.enable_timing()
+
+    def timings(self):
+        return self.proc.timings()
+
+
 @TextProc
 def ucfirst(msg):
     return msg[0].upper() + msg[1:]
@@ -254,6 +417,41 @@ def indent(text, chars="  ", first=None):
                       for line in text.split('\n')])
 
 
+_text_wrappers = {}
+
+
+def wrap_lines(text, width=70):
+    """Return same lines than ``textwrap.wrap(text, width)``, faster
+
+        >>> wrap_lines("a few words", width=7)
+        ['a few', 'words']
+        >>> wrap_lines("hyphen-ated words", width=10)
+        ['hyphen-', 'ated words']
+
+    """
+    words = text.split(" ")
+    ## Only words separated by single spaces are wrapped here, as
+    ## ``textwrap`` would also split on hyphens and inside long words
+    if "-" in text or words != text.split() or \
+           any(len(word) > width for word in words):
+        if width not in _text_wrappers:
+            _text_wrappers[width] = textwrap.TextWrapper(width=width)
+        return _text_wrappers[width].wrap(text)
+    lines = []
+    line = []
+    size = -1
+    for word in words:
+        if size + 1 + len(word) > width:
+            lines.append(" ".join(line))
+            line = []
+            size = -1
+        line.append(word)
+        size += 1 + len(word)
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+
 def paragraph_wrap(text, regexp="\n\n"):
     r"""Wrap text by making sure that paragraph are separated correctly
 
@@ -268,44 +466,39 @@ def paragraph_wrap(text, regexp="\n\n"):
     Notice that that each paragraph has been wrapped separately.
 
     """
-    regexp = re.compile(regexp, re.MULTILINE)
-    return "\n".join("\n".join(textwrap.wrap(paragraph.strip()))
+    if isinstance(regexp, basestring):
+        regexp = re.compile(regexp, re.MULTILINE)
+    return "\n".join("\n".join(wrap_lines(paragraph.strip()))
                      for paragraph in regexp.split(text)).strip()
 
 
 def curryfy(f):
-    return lambda *a, **kw: TextProc(lambda txt: f(txt, *a, **kw))
+    return lambda *a, **kw: TextProc(lambda txt: f(txt, *a, **kw),
+                                     f.__name__)
 
 ## these are curryfied version of their lower case definition
 
 Indent = curryfy(indent)
-Wrap = curryfy(paragraph_wrap)
-ReSub = lambda p, r, **k: TextProc(lambda txt: re.sub(p, r, txt, **k))
-noop = TextProc(lambda txt: txt)
-strip = TextProc(lambda txt: txt.strip())
-
-for label in ("Indent", "Wrap", "ReSub", "noop", "final_dot",
-              "ucfirst", "strip"):
-    _config_env[label] = locals()[label]
 
 
-def protect_rev(rev):
-    """Protect revision when used on a command line
+def Wrap(regexp="\n\n"):
+    regexp = re.compile(regexp, re.MULTILINE)  ## compiled only once
+    return TextProc(lambda txt: paragraph_wrap(txt, regexp=regexp),
+                    "Wrap(%r)" % regexp.pattern)
 
-    This targets ``bash`` and ``CMD.exe``
 
-    In bash environment, interpretation of quotes is made by bash
-    itself.  On CMD, it is passed as-is (with quote) and git on
-    windows support the de-quoting.
+def ReSub(pattern, repl, count=0, flags=0):
+    regexp = re.compile(pattern, flags)  ## compiled only once
+    return TextProc(lambda txt: regexp.sub(repl, txt, count=count),
+                    "ReSub(%r)" % pattern)
 
-    Note that using quotes in reference is valid (at least on linux)::
 
-        $ git check-ref-format --branch "let's\"see" && echo "is valid"
-        let's"see
-        is valid
+noop = TextProc(lambda txt: txt, "noop")
+strip = TextProc(lambda txt: txt.strip(), "strip")
 
-    """
-    return '"%s"' % rev.replace('"', r'\"')
+for label in ("Indent", "Wrap", "ReSub", "noop", "final_dot",
+              "ucfirst", "strip"):
+    _config_env[label] = locals()[label]
 
 
 ##
@@ -389,6 +582,12 @@ class Phile(object):
         >>> len(list(f.read(delimiter="-")))
         4
 
+    Characters cut between two chunks are kept whole:
+
+        >>> f = Phile(File("é-à-ü-d"), buffersize=1)
+        >>> [len(record) for record in f.read(delimiter="-")]
+        [1, 1, 1, 1]
+
         >>> f = Phile(File("foo-bang-yummy"), buffersize=3)
         >>> show(f.read(delimiter="-"))
         foo, bang, yummy
@@ -397,28 +596,49 @@ class Phile(object):
         >>> show(f.read(delimiter="-"))
         foo, bang, yummy
 
+    Each chunk is decoded at once, before being split, by an
+    incremental decoder that keeps the bytes of a character cut by
+    the end of the chunk for the next one. On python 3, chunks are read
+    in the same buffer when the file supports ``readinto(..)``.
+
     """
 
-    def __init__(self, file, buffersize=4096, encoding=_preferred_encoding):
+    def __init__(self, file, buffersize=65536, encoding=_preferred_encoding):
         self._file = file
         self._buffersize = buffersize
         self._encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)
+
+    def _chunks(self):
+        """Iterate through decoded chunks of the file"""
+        decode = self._decoder().decode
+        ## python 2 decoders don't accept ``memoryview``
+        readinto = getattr(self._file, "readinto", None) if PY3 else None
+        if readinto is None:
+            for chunk in iter(lambda: self._file.read(self._buffersize), b""):
+                yield decode(chunk)
+        else:
+            buf = bytearray(self._buffersize)
+            view = memoryview(buf)
+            while True:
+                size = readinto(buf)
+                if not size:
+                    break
+                yield decode(view[:size])
+        yield decode(b"", True)
 
     def read(self, delimiter="\n"):
         buf = ""
-        if PY3:
-            delimiter = delimiter.encode(_preferred_encoding)
-            buf = buf.encode(_preferred_encoding)
-        while True:
-            chunk = self._file.read(self._buffersize)
-            if not chunk:
-                yield buf.decode(self._encoding)
-                raise StopIteration
+        for chunk in self._chunks():
             records = chunk.split(delimiter)
+            if len(records) == 1:
+                buf += chunk
+                continue
             records[0] = buf + records[0]
-            for record in records[:-1]:
-                yield record.decode(self._encoding)
-            buf = records[-1]
+            buf = records.pop()
+            for record in records:
+                yield record
+        yield buf
 
     def write(self, buf):
         if PY3:
@@ -430,24 +650,68 @@ class Phile(object):
 
 
 class Proc(Popen):
+    """``Popen`` with ``Phile`` streams
 
-    def __init__(self, command, env=None, encoding=_preferred_encoding):
+    ``command`` is run through the shell if it is a string, and
+    directly, without any shell, if it is a list of arguments.
+
+    stderr is drained by a thread as soon as the process is started,
+    so that a command writing a lot on stderr can't block while its
+    stdout is read. Its content is given by ``stderr_output()``.
+
+    """
+
+    def __init__(self, command, env=None, encoding=_preferred_encoding,
+                 cwd=None):
         super(Proc, self).__init__(
-            command, shell=True,
+            command, shell=isinstance(command, basestring),
             stdin=PIPE, stdout=PIPE, stderr=PIPE,
-            close_fds=PLT_CFG['close_fds'], env=env,
+            close_fds=PLT_CFG['close_fds'], env=env, cwd=cwd,
             universal_newlines=False)
 
+        self._encoding = encoding
+        self._stderr_chunks = []
+        self._stderr_reader = threading.Thread(target=self._drain_stderr)
+        self._stderr_reader.daemon = True
+        self._stderr_reader.start()
+
         self.stdin = Phile(self.stdin, encoding=encoding)
         self.stdout = Phile(self.stdout, encoding=encoding)
-        self.stderr = Phile(self.stderr, encoding=encoding)
+
+    def _drain_stderr(self):
+        for chunk in iter(lambda: self.stderr.read(4096), b""):
+            self._stderr_chunks.append(chunk)
+        self.stderr.close()
+
+    def stderr_output(self):
+        """Return stderr output, waits for the command to close it"""
+        self._stderr_reader.join()
+        return b"".join(self._stderr_chunks).decode(self._encoding,
+                                                    "replace")
 
 
-def cmd(command, env=None):
-    p = Popen(command, shell=True,
-              stdin=PIPE, stdout=PIPE, stderr=PIPE,
-              close_fds=PLT_CFG['close_fds'], env=env,
-              universal_newlines=False)
+def cmd(command, env=None, cwd=None):
+    r"""Run ``command`` and return ``(stdout, stderr, errlvl)``
+
+    ``command`` is run through the shell if it is a string, and
+    directly if it is a list of arguments, which spares a shell process
+    and any quoting:
+
+        >>> cmd(["printf", "%s", "let's \"see\""])[0] == 'let\'s "see"'
+        True
+
+    As the shell would do, an unknown executable gives errorlevel 127.
+
+    """
+    try:
+        p = Popen(command, shell=isinstance(command, basestring),
+                  stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                  close_fds=PLT_CFG['close_fds'], env=env, cwd=cwd,
+                  universal_newlines=False)
+    except OSError as e:
+        if isinstance(command, basestring):
+            raise
+        return "", "%s: %s\n" % (command[0], e.strerror), 127
     stdout, stderr = p.communicate()
     return (
         stdout.decode(getattr(sys.stdout, "encoding", None) or _preferred_encoding),
@@ -455,7 +719,7 @@ def cmd(command, env=None):
         p.returncode)
 
 
-def wrap(command, ignore_errlvls=[0], env=None):
+def wrap(command, ignore_errlvls=[0], env=None, cwd=None):
     """Wraps a shell command and casts an exception on unexpected errlvl
 
     >>> wrap('/tmp/lsdjflkjf') # doctest: +ELLIPSIS +IGNORE_EXCEPTION_DETAIL
@@ -470,7 +734,7 @@ def wrap(command, ignore_errlvls=[0], env=None):
 
     """
 
-    out, err, errlvl = cmd(command, env=env)
+    out, err, errlvl = cmd(command, env=env, cwd=cwd)
 
     if errlvl not in ignore_errlvls:
 
@@ -485,6 +749,8 @@ def wrap(command, ignore_errlvls=[0], env=None):
             formatted.append("stderr:\n%s" % indent(err, "| "))
         formatted = '\n'.join(formatted)
 
+        if not isinstance(command, basestring):
+            command = " ".join(command)
         raise ShellError("Wrapped command %r exited with errorlevel %d.\n%s"
                          % (command, errlvl, indent(formatted, chars="  ")),
                          errlvl=errlvl, command=command, out=out, err=err)
@@ -525,11 +791,250 @@ GIT_FORMAT_KEYS = {
     'body': "%b",
 }
 
-GIT_FULL_FORMAT_STRING = "%x00".join(GIT_FORMAT_KEYS.values())
+## ``GIT_FORMAT_KEYS`` values that don't only depend on the commit: the
+## abbreviation length grows with the repository, and dates follow
+## ``log.date`` of git config. They are not stored in ``CommitCache``.
+GIT_VOLATILE_KEYS = ("sha1_short", "author_date")
+
+## Commit attributes used by ``versions_data_iter(..)`` to build versions
+VERSION_DATA_FIELDS = ("sha1", "subject", "author_name", "author_email",
+                       "body")
+
+
+def git_format_keys(fields=None):
+    """List of ``GIT_FORMAT_KEYS`` keys to request for ``fields``
+
+    ``sha1`` is always requested, and all keys are if ``fields`` is
+    None.
+
+        >>> git_format_keys(["body", "subject"])
+        ['sha1', 'subject', 'body']
+
+    """
+    if fields is None:
+        return list(GIT_FORMAT_KEYS.keys())
+    return [key for key in GIT_FORMAT_KEYS
+            if key == "sha1" or key in fields]
+
+## Only requested by history walks that need the commit graph
+GIT_PARENTS_FORMAT = "%P"
+
+## ``git for-each-ref`` atoms of commit attributes that can be
+## prefetched for all tags at once.
+GIT_REF_FORMAT_KEYS = collections.OrderedDict([
+    ('sha1', "objectname"),
+    ('author_name', "authorname"),
+    ('author_email', "authoremail"),
+    ('author_date_timestamp', "authordate:raw"),
+    ('committer_name', "committername"),
+    ('committer_date_timestamp', "committerdate:raw"),
+])
+
+## For annotated tags, ``*`` prefixed atoms are the ones of the tagged object
+GIT_TAG_REFS_FORMAT_STRING = "%00".join(
+    ["%(refname)"] +
+    ["%%(%sobjecttype)%%00%s" % (
+        prefix,
+        "%00".join("%%(%s%s)" % (prefix, atom)
+                   for atom in GIT_REF_FORMAT_KEYS.values()))
+     for prefix in ("", "*")])
+
+
+def parse_tag_refs(output):
+    r"""Parse ``git for-each-ref`` output with GIT_TAG_REFS_FORMAT_STRING
+
+    Returns a list of ``(tag_name, dct)`` where ``dct`` holds the commit
+    attributes of the tagged commit, or is empty if the tag doesn't point
+    to a commit (or to an annotated tag on a commit).
+
+        >>> line = "\x00".join([
+        ...     "refs/tags/0.1", "tag", "0123", "", "", "", "", "",
+        ...     "commit", "abcd", "Bob", "<bob@example.com>",
+        ...     "1000 +0200", "Alice", "2000 +0200"])
+        >>> [(name, dct)] = parse_tag_refs(line)
+        >>> name
+        '0.1'
+        >>> dct["sha1"], dct["author_email"], dct["author_date_timestamp"]
+        ('abcd', 'bob@example.com', '1000')
+
+    """
+    nb_keys = len(GIT_REF_FORMAT_KEYS)
+    tags = []
+    for line in output.split("\n"):
+        if not line:
+            continue
+        values = line.split("\x00")
+        name = values[0][len("refs/tags/"):]
+        dct = {}
+        for start in (1, 2 + nb_keys):
+            if values[start] == "commit":
+                dct = dict(zip(GIT_REF_FORMAT_KEYS.keys(),
+                               values[start + 1:start + 1 + nb_keys]))
+                break
+        if dct:
+            dct["author_email"] = dct["author_email"].strip("<>")
+            for key in ("author_date_timestamp", "committer_date_timestamp"):
+                dct[key] = dct[key].split(" ")[0]
+        tags.append((name, dct))
+    return tags
 
 REGEX_RFC822_KEY_VALUE = r'(^|\n)(?P<key>[A-Z]\w+(-\w+)*): (?P<value>[^\n]*(\n\s+[^\n]*)*)'
 REGEX_RFC822_POSTFIX = r'(%s)+$' % REGEX_RFC822_KEY_VALUE
 
+_TRAILER_KEY = re.compile(r'[A-Z]\w+(-\w+)*: ')
+_INDENTED = re.compile(r'\s')
+_BLANK = re.compile(r'\s*\Z')
+
+
+def trailers_start(body):
+    r"""Return position where trailers start in ``body``, or None
+
+    It is the position of a ``re.search(REGEX_RFC822_POSTFIX, body)``
+    match, but lines are read once from last to first, whereas the
+    regexp can backtrack for seconds on long bodies:
+
+        >>> trailers_start("Body\nKey: value\nOther-Key: multi\n  line")
+        4
+        >>> trailers_start("Key: value\n")
+        0
+        >>> print(trailers_start("Body\nKey: value\nnot a trailer"))
+        None
+
+    As in the regexp, continuation lines of a value start with blanks,
+    or are the first non blank line after blank lines.
+
+    """
+    lines = body.split("\n")
+    last = len(lines) - 1
+    ## From a line boundary, can next lines end the trailers, being
+    ## after a complete trailer (``closed``), or in a continuation whose
+    ## lines are all blank so far (``blank``).
+    closed, blank = True, False
+    start = None
+    for idx in range(last, -1, -1):
+        line = lines[idx]
+        key = _TRAILER_KEY.match(line) is not None
+        if key and closed:
+            start = idx
+        is_blank = _BLANK.match(line) is not None
+        closed, blank = (
+            ## ``$`` also matches before a final newline
+            (idx == last and last > 0 and line == "") or
+            ((key or _INDENTED.match(line) is not None) and closed) or
+            (is_blank and blank),
+            closed or (is_blank and blank))
+    if start is None:
+        return None
+    return max(0, sum(len(line) + 1 for line in lines[:start]) - 1)
+
+
+_WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def format_git_date(timestamp, tz):
+    """Format a git raw date as ``git log`` default date format does
+
+        >>> format_git_date(946724400, "+0100")
+        'Sat Jan 1 12:00:00 2000 +0100'
+        >>> format_git_date(946724400, "-0130")
+        'Sat Jan 1 09:30:00 2000 -0130'
+
+    Note that, as git, the date is displayed in the given timezone and
+    that day of month is not padded.
+
+    """
+    sign = -1 if tz.startswith("-") else 1
+    offset = sign * (int(tz[-4:-2]) * 3600 + int(tz[-2:]) * 60)
+    d = datetime.datetime.utcfromtimestamp(int(timestamp) + offset)
+    return "%s %s %d %02d:%02d:%02d %d %s" % (
+        _WEEKDAY_NAMES[d.weekday()], _MONTH_NAMES[d.month - 1], d.day,
+        d.hour, d.minute, d.second, d.year, tz)
+
+
+def _is_blank_line(line):
+    return line.strip() == ""
+
+
+def parse_commit_object(sha1, raw, dates=True):
+    r"""Return commit attributes from a raw git commit object
+
+    Returned dict holds the same values as ``git log --pretty=format:``
+    would give for the keys of ``GIT_FORMAT_KEYS``, apart ``sha1_short``
+    as it requires knowledge of the other objects of the repository.
+    The list of parents' sha1 is stored in ``parents``.
+
+    ``author_date`` and ``committer_date`` are in git's default format,
+    they are left out if ``dates`` is False (as when ``log.date`` is
+    set in git config).
+
+        >>> raw = (b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+        ...        b"parent 1111111111111111111111111111111111111111\n"
+        ...        b"author Bob <bob@example.com> 946724400 +0100\n"
+        ...        b"committer Alice <alice@example.com> 946724500 +0000\n"
+        ...        b"\n"
+        ...        b"new: my subject\n"
+        ...        b"on two lines\n\n"
+        ...        b"My body\n")
+        >>> dct = parse_commit_object("2222", raw)
+        >>> print(dct["subject"])
+        new: my subject on two lines
+        >>> print(dct["body"])
+        My body
+        <BLANKLINE>
+        >>> print(dct["author_date"])
+        Sat Jan 1 12:00:00 2000 +0100
+        >>> dct["parents"] == ["1111111111111111111111111111111111111111"]
+        True
+
+    """
+    header, _, message = raw.partition(b"\n\n")
+    fields = {}
+    parents = []
+    for line in header.split(b"\n"):
+        if line.startswith(b" "):  ## continuation of multi-line header
+            continue
+        key, _, value = line.partition(b" ")
+        if key == b"parent":
+            parents.append(value.decode("ascii"))
+        elif key in (b"author", b"committer", b"encoding"):
+            fields[key.decode("ascii")] = value
+
+    encoding = fields.get("encoding", b"utf-8").decode("ascii")
+    try:
+        message = message.decode(encoding, "replace")
+    except LookupError:
+        encoding = DEFAULT_GIT_LOG_ENCODING
+        message = message.decode(encoding, "replace")
+
+    dct = {"sha1": sha1, "parents": parents, "raw_body": message}
+    for role in ("author", "committer"):
+        ident = fields.get(role, b"").decode(encoding, "replace")
+        name, _, rest = ident.partition("<")
+        email, _, date = rest.partition(">")
+        date = date.split() or ["0", "+0000"]
+        dct["%s_name" % role] = name.strip()
+        dct["%s_email" % role] = email
+        dct["%s_date_timestamp" % role] = date[0]
+        if dates:
+            dct["%s_date" % role] = format_git_date(*date[:2])
+
+    ## same rules than git to split subject and body (see ``pretty.c``)
+    lines = message.split("\n")
+    idx = 0
+    while idx < len(lines) and _is_blank_line(lines[idx]):
+        idx += 1
+    subject = []
+    while idx < len(lines) and not _is_blank_line(lines[idx]):
+        subject.append(lines[idx].rstrip())
+        idx += 1
+    while idx < len(lines) and _is_blank_line(lines[idx]):
+        idx += 1
+    dct["subject"] = " ".join(subject)
+    dct["body"] = "\n".join(lines[idx:])
+    return dct
+
 
 class GitCommit(SubGitObjectMixin):
     r"""Represent a Git Commit and expose through its attribute many information
@@ -543,10 +1048,10 @@ class GitCommit(SubGitObjectMixin):
 
         >>> def mock_swrap(str):
         ...     global BODY, SUBJECT
-        ...     print("Called gitRepos.swrap(%r)" % str)
-        ...     if str.startswith("git rev-list"):
+        ...     print("Called gitRepos.swrap(%r)" % (str, ))
+        ...     if str[:2] == ["git", "rev-list"]:
         ...         return "123456"  ## sha1 of first element of tree
-        ...     elif str.startswith("git log"):
+        ...     elif str[:2] == ["git", "log"]:
         ...         dct = {
         ...             'sha1': "000000",
         ...             'sha1_short': "000",
@@ -565,6 +1070,11 @@ class GitCommit(SubGitObjectMixin):
         ...
         >>> repos.swrap = mock_swrap
 
+    This fake repository has no ``git cat-file --batch`` reader, so
+    values are resolved through ``git log``:
+
+        >>> repos.read_commit = lambda identifier: None
+
     Query, by attributes or items:
 
         >>> SUBJECT = "fee fie foh"
@@ -572,7 +1082,7 @@ class GitCommit(SubGitObjectMixin):
 
         >>> head = GitCommit(repos, "HEAD")
         >>> head.subject
-        Called gitRepos.swrap('git log -n 1 HEAD --pretty=format:...')
+        Called gitRepos.swrap(['git', 'log', '-n', '1', 'HEAD', '--pretty=format:...', '--'])
         'fee fie foh'
         >>> head.author_name
         'John Smith'
@@ -594,7 +1104,7 @@ class GitCommit(SubGitObjectMixin):
 
         >>> head = GitCommit(repos, "HEAD")
         >>> head.trailer_change_id
-        Called gitRepos.swrap('git log -n 1 HEAD --pretty=format:...')
+        Called gitRepos.swrap(['git', 'log', '-n', '1', 'HEAD', '--pretty=format:...', '--'])
         '1234'
         >>> head.trailer_value_x
         'Supports multi\nline values'
@@ -611,7 +1121,7 @@ class GitCommit(SubGitObjectMixin):
 
         >>> head = GitCommit(repos, "HEAD")
         >>> head.trailer_co_authored_by
-        Called gitRepos.swrap('git log -n 1 HEAD --pretty=format:...')
+        Called gitRepos.swrap(['git', 'log', '-n', '1', 'HEAD', '--pretty=format:...', '--'])
         ['Bob', 'Alice', 'Jack']
 
 
@@ -630,7 +1140,7 @@ class GitCommit(SubGitObjectMixin):
 
         >>> head = GitCommit(repos, "HEAD")
         >>> head.author_names
-        Called gitRepos.swrap('git log -n 1 HEAD --pretty=format:...')
+        Called gitRepos.swrap(['git', 'log', '-n', '1', 'HEAD', '--pretty=format:...', '--'])
         ['Alice', 'Bob', 'Jack', 'John Smith']
 
     Notice that they are printed in alphabetical order.
@@ -655,31 +1165,49 @@ class GitCommit(SubGitObjectMixin):
                 ## to look through body for additional RFC822's header keys
                 pass
 
-        identifier = self.identifier
-        if identifier == "LAST":
-            identifier = self.swrap(
-                "git rev-list --first-parent --max-parents=0 HEAD")
-
         ## Compute only missing information
         missing_attrs = [l for l in attrs if not l in self.__dict__]
-        ## some commit can be already fully specified (see ``mk_commit``)
-        if missing_attrs:
-            aformat = "%x00".join(GIT_FORMAT_KEYS[l]
-                                  for l in missing_attrs)
-            try:
-                ret = self.swrap("git log -n 1 %s --pretty=format:%s --"
-                                 % (identifier, aformat))
-            except ShellError:
-                raise ValueError("Given commit identifier %s doesn't exists"
-                                 % self.identifier)
-            attr_values = ret.split("\x00")
-            for attr, value in zip(missing_attrs, attr_values):
-                setattr(self, attr, value.strip())
-
-        ## Let's interpret RFC822-like header keys that could be in the body
-        match = re.search(REGEX_RFC822_POSTFIX, self.body)
-        if match is not None:
-            pos = match.start()
+        ## some commit can be already fully specified (see ``mk_commit``),
+        ## and ``body`` is all that is required to parse trailers.
+        if label in missing_attrs or "body" in missing_attrs:
+            identifier = self.identifier
+            if identifier == "LAST":
+                identifier = self.swrap(
+                    ["git", "rev-list", "--first-parent", "--max-parents=0",
+                     "HEAD"])
+
+            ## Cheap read through the repository's long lived reader
+            dct = self._repos.read_commit(identifier)
+            if dct:
+                for attr in missing_attrs:
+                    if attr in dct:
+                        setattr(self, attr, dct[attr].strip())
+                missing_attrs = [l for l in missing_attrs
+                                 if not l in self.__dict__]
+
+            ## Fallback on ``git log`` for anything still missing
+            if label in missing_attrs or "body" in missing_attrs:
+                aformat = "%x00".join(GIT_FORMAT_KEYS[l]
+                                      for l in missing_attrs)
+                try:
+                    ret = self.swrap(["git", "log", "-n", "1", identifier,
+                                      "--pretty=format:%s" % aformat, "--"])
+                except ShellError:
+                    raise ValueError(
+                        "Given commit identifier %s doesn't exists"
+                        % self.identifier)
+                attr_values = ret.split("\x00")
+                for attr, value in zip(missing_attrs, attr_values):
+                    setattr(self, attr, value.strip())
+
+        if not self._trailer_parsed:
+            self._parse_trailers()
+        return getattr(self, label)
+
+    def _parse_trailers(self):
+        """Interpret RFC822-like header keys that could be in the body"""
+        pos = trailers_start(self.body)
+        if pos is not None:
             postfix = self.body[pos:]
             self.body = self.body[:pos]
             if postfix:
@@ -701,10 +1229,31 @@ class GitCommit(SubGitObjectMixin):
                                 if isinstance(prev_value, list)
                                 else [prev_value, value, ])
         self._trailer_parsed = True
-        return getattr(self, label)
+
+    def _record(self):
+        """Return parsed values of the commit to be stored in a cache"""
+        if not self._trailer_parsed:
+            self._parse_trailers()
+        return {
+            "fields": dict((k, self.__dict__[k]) for k in GIT_FORMAT_KEYS
+                           if k in self.__dict__ and
+                           k not in GIT_VOLATILE_KEYS),
+            "trailers": dict((k, v) for k, v in self.__dict__.items()
+                             if k.startswith("trailer_")),
+            "author_names": self.author_names,
+        }
+
+    def _load_record(self, record):
+        """Set values of the commit from a record made by ``_record()``"""
+        self.__dict__.update(record["fields"])
+        self.__dict__.update(record["trailers"])
+        self._author_names = record["author_names"]
+        self._trailer_parsed = True
 
     @property
     def author_names(self):
+        if "_author_names" in self.__dict__:
+            return self._author_names
         return [re.sub(r'^([^<]+)<[^>]+>\s*$', r'\1', author).strip()
                 for author in self.authors]
 
@@ -723,12 +1272,7 @@ class GitCommit(SubGitObjectMixin):
     def __le__(self, value):
         if not isinstance(value, GitCommit):
             value = self._repos.commit(value)
-        try:
-            self.swrap("git merge-base --is-ancestor '%s' '%s'"
-                       % (self.sha1, value.sha1))
-            return True
-        except ShellError:
-            return False
+        return self._repos.is_ancestor(self.sha1, value.sha1)
 
     def __lt__(self, value):
         if not isinstance(value, GitCommit):
@@ -758,6 +1302,41 @@ def normpath(path, cwd=None):
     return os.path.normpath(os.path.join(cwd, path))
 
 
+def config_key(label):
+    """Return canonical form of a git config key
+
+    Section and variable names are case insensitive, but not subsections:
+
+        >>> config_key("i18n.logOuputEncoding")
+        'i18n.logouputencoding'
+        >>> config_key("Remote.Origin.URL")
+        'remote.Origin.url'
+
+    """
+    section, _, rest = label.partition(".")
+    subsection, _, name = rest.rpartition(".")
+    return ".".join(part for part in (section.lower(), subsection,
+                                      name.lower()) if part)
+
+
+def parse_config_list(out):
+    r"""Return a dict of values lists by key from ``git config -z`` output
+
+        >>> sorted(parse_config_list(
+        ...     "a.b\nfoo\x00a.b\nbar\nbaz\x00a.c\x00").items())
+        [('a.b', ['foo', 'bar\nbaz']), ('a.c', [''])]
+
+    Keys without ``=`` in config files have an empty value.
+
+    """
+    values = {}
+    for record in out.split("\0"):
+        if record:
+            key, _, value = record.partition("\n")
+            values.setdefault(key, []).append(value)
+    return values
+
+
 class GitConfig(SubGitObjectMixin):
     """Interface to config values of git
 
@@ -774,16 +1353,16 @@ class GitConfig(SubGitObjectMixin):
 
         >>> repos.swrap.mock_returns = "bar"
         >>> cfg.foo
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
         'bar'
         >>> cfg["foo"]
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
         'bar'
         >>> cfg.get("foo")
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
         'bar'
         >>> cfg["foo.wiz"]
-        Called gitRepos.swrap("git config 'foo.wiz'")
+        Called gitRepos.swrap(['git', 'config', 'foo.wiz'])
         'bar'
 
     Notice that you can't use attribute search in subsection as ``cfg.foo.wiz``
@@ -793,7 +1372,7 @@ class GitConfig(SubGitObjectMixin):
     Nevertheless, you can do:
 
         >>> getattr(cfg, "foo.wiz")
-        Called gitRepos.swrap("git config 'foo.wiz'")
+        Called gitRepos.swrap(['git', 'config', 'foo.wiz'])
         'bar'
 
     Default values
@@ -806,7 +1385,7 @@ class GitConfig(SubGitObjectMixin):
         ...                                      errlvl=1, out="", err="")
 
         >>> getattr(cfg, "foo", "default")
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
         'default'
 
         >>> cfg["foo"]  ## doctest: +ELLIPSIS
@@ -820,22 +1399,79 @@ class GitConfig(SubGitObjectMixin):
         AttributeError...
 
         >>> cfg.get("foo", "default")
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
         'default'
 
         >>> print("%r" % cfg.get("foo"))
-        Called gitRepos.swrap("git config 'foo'")
+        Called gitRepos.swrap(['git', 'config', 'foo'])
+        None
+
+    Snapshot
+    --------
+
+    In snapshot mode, the whole configuration is read once, on first
+    lookup. Keys are case insensitive, and the last value of multi-valued
+    keys is returned, as ``git config`` does:
+
+        >>> repos.swrap.mock_raises = None
+        >>> repos.swrap.mock_returns = (
+        ...     "foo.bar\\nfirst\\x00foo.bar\\nlast\\x00"
+        ...     "foo.Sub.flag\\x00")
+        >>> cfg = GitConfig(repos, snapshot=True)
+        >>> cfg.get("FOO.bar")
+        Called gitRepos.swrap(['git', 'config', '--list', '-z'])
+        'last'
+        >>> cfg.get_all("foo.bar")
+        ['first', 'last']
+        >>> cfg["foo.Sub.FLAG"]
+        ''
+        >>> print("%r" % cfg.get("foo.sub.flag"))
         None
 
     """
 
-    def __init__(self, repos):
+    def __init__(self, repos, snapshot=False):
         super(GitConfig, self).__init__(repos)
+        self._snapshot = snapshot
+        self._loaded = False
+        self._values = {}  ## canonical key -> list of values
+
+    def load(self):
+        """Read the whole effective configuration in one ``git`` call"""
+        self._values = parse_config_list(
+            self.swrap(["git", "config", "--list", "-z"]))
+        self._loaded = True
+
+    def _known_values(self, label):
+        """Return values of ``label`` if they are already read, or None"""
+        if self._snapshot and not self._loaded:
+            self.load()
+        if not self._loaded:
+            return None
+        return self._values.get(config_key(label), [])
+
+    def get_all(self, label):
+        """Return all values of ``label``, as ``git config --get-all``"""
+        values = self._known_values(label)
+        if values is not None:
+            return list(values)
+        try:
+            out = self.swrap(["git", "config", "-z", "--get-all", str(label)])
+        except ShellError as e:
+            if e.errlvl == 1 and e.out == "":
+                return []
+            raise
+        return out.split("\0")[:-1]
 
     def __getattr__(self, label):
-        cmd = "git config %r" % str(label)
+        values = self._known_values(label)
+        if values is not None:
+            if not values:
+                raise AttributeError("key %r is not found in git config."
+                                     % label)
+            return values[-1]  ## last value wins, as ``git config``
         try:
-            res = self.swrap(cmd)
+            res = self.swrap(["git", "config", str(label)])
         except ShellError as e:
             if e.errlvl == 1 and e.out == "":
                 raise AttributeError("key %r is not found in git config."
@@ -853,219 +1489,2092 @@ class GitConfig(SubGitObjectMixin):
             raise KeyError(label)
 
 
-class GitRepos(object):
+class GitCatFile(object):
+    """Long lived ``git cat-file --batch`` process to read git objects
+
+    Objects are requested one at a time through a pipe, so reading N
+    objects costs only one process. Requests are serialized so that an
+    instance can be shared between threads.
+
+    The process is started on first read, and stopped with ``close()``.
+
+    """
 
     def __init__(self, path):
+        self._path = path
+        self._proc = None
+        self._lock = threading.Lock()
 
-        ## Saving this original path to ensure all future git commands
-        ## will be done from this location.
-        self._orig_path = os.path.abspath(path)
+    def _start(self):
+        self._devnull = open(os.devnull, "w")
+        self._proc = Popen(["git", "cat-file", "--batch"], cwd=self._path,
+                           stdin=PIPE, stdout=PIPE, stderr=self._devnull,
+                           close_fds=PLT_CFG['close_fds'])
 
-        ## verify ``git`` command is accessible:
-        try:
-            self._git_version = self.swrap("git version")
-        except ShellError:
-            if DEBUG:
-                raise
-            raise EnvironmentError(
-                "Required ``git`` command not found or broken in $PATH. "
-                "(calling ``git version`` failed.)")
+    def read(self, name):
+        """Return ``(sha1, type, content)`` of object, or None if missing
 
-        ## verify that we are in a git repository
-        try:
-            self.swrap("git remote")
-        except ShellError:
-            if DEBUG:
-                raise
-            raise EnvironmentError(
-                "Not in a git repository. (calling ``git remote`` failed.)")
+        ``name`` is any object name understood by ``git rev-parse``.
 
-        self.bare = self.swrap("git rev-parse --is-bare-repository") == "true"
-        self.toplevel = None if self.bare else \
-                        self.swrap("git rev-parse --show-toplevel")
-        self.gitdir = normpath(
-            os.path.join(self._orig_path,
-                         self.swrap("git rev-parse --git-dir")))
+        """
+        if "\n" in name:
+            return None
+        with self._lock:
+            if self._proc is None:
+                self._start()
+            try:
+                self._proc.stdin.write(name.encode("utf-8") + b"\n")
+                self._proc.stdin.flush()
+                header = self._proc.stdout.readline().decode("utf-8")
+            except (IOError, OSError):
+                self._close()
+                return None
+            parts = header.split()
+            if len(parts) != 3:  ## missing, ambiguous or process died
+                if not header:
+                    self._close()
+                return None
+            sha1, otype, size = parts
+            size = int(size)
+            chunks = []
+            while size > 0:
+                chunk = self._proc.stdout.read(size)
+                if not chunk:
+                    self._close()
+                    return None
+                chunks.append(chunk)
+                size -= len(chunk)
+            self._proc.stdout.read(1)  ## trailing newline
+            return sha1, otype, b"".join(chunks)
+
+    def _close(self):
+        if self._proc is None:
+            return
+        for f in (self._proc.stdin, self._proc.stdout):
+            try:
+                f.close()
+            except (IOError, OSError):
+                pass
+        self._proc.wait()
+        self._devnull.close()
+        self._proc = None
 
-    @classmethod
-    def create(cls, dir, *args, **kwargs):
-        os.mkdir(dir)
-        return cls.init(dir, *args, **kwargs)
+    def close(self):
+        with self._lock:
+            self._close()
 
-    @classmethod
-    def init(cls, dir, user=None, email=None):
-        with set_cwd(dir):
-            wrap("git init .")
-            if user:
-                wrap("git config user.email '%s'" % user)
-            if email:
-                wrap("git config user.name '%s'" % user)
-        return cls(dir)
 
-    def commit(self, identifier):
-        return GitCommit(self, identifier)
+def open_sqlite_db(path):
+    """Return a connection to sqlite database ``path``, shared by threads
 
-    @property
-    def config(self):
-        return GitConfig(self)
+    Missing directories are created.
 
-    def swrap(self, command, **kwargs):
-        """Essential force the CWD of the command to be in self._orig_path"""
-        old_dir = os.path.curdir
-        os.chdir(self._orig_path)
+    """
+    ## imported only when used, to keep startup fast
+    try:
+        import sqlite3
+    except ImportError:  ## pragma: no cover
+        raise EnvironmentError(
+            "Required 'sqlite3' python module not found.")
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
         try:
-            command = "%s" % (command,)
-            return swrap(command, **kwargs)
-        finally:
-            os.chdir(old_dir)
+            os.makedirs(dirname)
+        except OSError:  ## created meanwhile by a concurrent process
+            if not os.path.isdir(dirname):
+                raise
+    db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.DatabaseError:  ## pragma: no cover
+        pass  ## not supported by all file systems, default is fine
+    return db
 
-    def tags(self, contains=None):
-        """String list of repository's tag names
 
-        Current tag order is committer date timestamp of tagged commit.
-        No firm reason for that, and it could change in future version.
+class CommitCache(object):
+    """On-disk cache of parsed commit records keyed by sha1
 
-        """
-        if contains:
-            tags = self.swrap("git tag -l --contains \"%s\"" % contains).split("\n")
-        else:
-            tags = self.swrap('git tag -l').split("\n")
-        ## Should we use new version name sorting ?  refering to :
-        ## ``git tags --sort -v:refname`` in git version >2.0.
-        ## Sorting and reversing with command line is not available on
-        ## git version <2.0
-        return sorted([self.commit(tag) for tag in tags if tag != ''],
-                      key=lambda x: int(x.committer_date_timestamp))
+    Commits are immutable, so once parsed (attributes and trailers),
+    records can be reused by all later runs. Records are stored per
+    log encoding as it changes the decoded values. Values depending on
+    the repository or its config (``GIT_VOLATILE_KEYS``) are not stored.
 
-    def log(self, includes=["HEAD", ], excludes=[], include_merge=True,
-            encoding=_preferred_encoding):
-        """Reverse chronological list of git repository's commits
+    Storage is a sqlite database, which takes care of concurrent access
+    from several processes (as CI jobs sharing a checkout) and threads.
 
-        Note: rev lists can be GitCommit instance list or identifier list.
+    """
 
-        """
+    ## Bump if the content of records changes
+    TABLE = "commits_v2"
 
-        refs = {'includes': includes,
-                'excludes': excludes}
-        for ref_type in ('includes', 'excludes'):
-            for idx, ref in enumerate(refs[ref_type]):
-                if not isinstance(ref, GitCommit):
-                    refs[ref_type][idx] = self.commit(ref)
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = open_sqlite_db(path)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS %s ("
+                "  sha1 TEXT NOT NULL, encoding TEXT NOT NULL,"
+                "  record TEXT NOT NULL,"
+                "  PRIMARY KEY (sha1, encoding))" % self.TABLE)
+
+    def _select(self, columns, sha1s, encoding):
+        ## Keep below sqlite's maximum number of host parameters
+        for idx in range(0, len(sha1s), 500):
+            chunk = sha1s[idx:idx + 500]
+            for row in self._db.execute(
+                    "SELECT %s FROM %s WHERE encoding = ? AND sha1 IN (%s)"
+                    % (columns, self.TABLE, ", ".join("?" * len(chunk))),
+                    [encoding] + list(chunk)):
+                yield row
+
+    def known(self, sha1s, encoding):
+        """Return the set of given sha1 that have a record"""
+        with self._lock:
+            return set(row[0] for row in self._select("sha1", sha1s,
+                                                      encoding))
+
+    def get(self, sha1s, encoding):
+        """Return a dict of records of given sha1s if in cache"""
+        import json
+        with self._lock:
+            return dict((sha1, json.loads(record))
+                        for sha1, record in self._select(
+                            "sha1, record", sha1s, encoding))
+
+    def put(self, commits, encoding):
+        """Store records of given ``GitCommit`` list"""
+        import json
+        rows = [(commit.sha1, encoding, json.dumps(commit._record()))
+                for commit in commits]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO %s (sha1, encoding, record) "
+                    "VALUES (?, ?, ?)" % self.TABLE, rows)
 
-        ## --topo-order: don't mix commits from separate branches.
-        plog = Proc("git log --stdin -z --topo-order --pretty=format:%s %s --"
-                    % (GIT_FULL_FORMAT_STRING,
-                       '--no-merges' if not include_merge else ''),
-                    encoding=encoding)
-        for ref in refs["includes"]:
-            plog.stdin.write("%s\n" % ref.sha1)
-
-        for ref in refs["excludes"]:
-            plog.stdin.write("^%s\n" % ref.sha1)
-        plog.stdin.close()
+    def close(self):
+        with self._lock:
+            self._db.close()
 
-        def mk_commit(dct):
-            """Creates an already set commit from a dct"""
-            c = self.commit(dct["sha1"])
-            for k, v in dct.items():
-                setattr(c, k, v)
-            return c
 
-        values = plog.stdout.read("\x00")
+class TextCache(object):
+    """On-disk cache of text processing results
 
-        try:
-            while True:  ## next(values) will eventualy raise a StopIteration
-                yield mk_commit(dict([(key, next(values))
-                                      for key in GIT_FORMAT_KEYS]))
-        finally:
-            plog.stdout.close()
-            plog.stderr.close()
+    Results are stored by the sha1 of the processed text, and by a
+    ``key`` identifying the processing (see ``MemoizedTextProc``).
 
+    """
 
-def first_matching(section_regexps, string):
-    for section, regexps in section_regexps:
-        if regexps is None:
-            return section
-        for regexp in regexps:
-            if re.search(regexp, string) is not None:
-                return section
+    ## Bump if the content of results changes
+    TABLE = "texts_v1"
 
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = open_sqlite_db(path)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS %s ("
+                "  key TEXT NOT NULL, digest TEXT NOT NULL,"
+                "  result TEXT NOT NULL,"
+                "  PRIMARY KEY (key, digest))" % self.TABLE)
+
+    def get(self, key, digests):
+        """Return a dict of results of given digests if in cache"""
+        import json
+        results = {}
+        digests = list(digests)
+        with self._lock:
+            ## Keep below sqlite's maximum number of host parameters
+            for idx in range(0, len(digests), 500):
+                chunk = digests[idx:idx + 500]
+                for digest, result in self._db.execute(
+                        "SELECT digest, result FROM %s "
+                        "WHERE key = ? AND digest IN (%s)"
+                        % (self.TABLE, ", ".join("?" * len(chunk))),
+                        [key] + chunk):
+                    results[digest] = json.loads(result)
+        return results
+
+    def put(self, key, results):
+        """Store ``results``, a dict of results by digest"""
+        import json
+        rows = [(key, digest, json.dumps(result))
+                for digest, result in results.items()]
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO %s (key, digest, result) "
+                    "VALUES (?, ?, ?)" % self.TABLE, rows)
 
-def ensure_template_file_exists(label, template_name):
-    """Return template file path given a label hint and the template name
+    def close(self):
+        with self._lock:
+            self._db.close()
 
-    Template name can be either a filename with full path,
-    if this is the case, the label is of no use.
 
-    If ``template_name`` does not refer to an existing file,
-    then ``label`` is used to find a template file in the
-    the bundled ones.
+##
+## Pure python git object access
+##
 
-    """
+GIT_OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+GIT_OFS_DELTA = 6
+GIT_REF_DELTA = 7
 
-    if os.path.isfile(template_name):
-        return template_name
 
-    template_dir = os.path.join(
-        os.path.dirname(os.path.realpath(__file__)),
-        "templates", label)
+def _read_delta_size(delta, pos):
+    size = shift = 0
+    while True:
+        c = delta[pos]
+        pos += 1
+        size |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return size, pos
 
-    template_path = os.path.join(template_dir, "%s.tpl" % template_name)
 
-    if not os.path.exists(template_path):
-        templates = glob.glob(os.path.join(template_dir, "*.tpl"))
-        if len(templates) > 0:
-            msg = ("These are the available %s templates:" % label)
-            msg += "\n - " + \
-                   "\n - ".join(os.path.basename(f).split(".")[0]
-                                for f in templates)
-            msg += "\nTemplates are located in %r" % template_dir
-        else:
-            msg = "No available %s templates found in %r." \
-                  % (label, template_dir)
-        die("Error: Invalid %s template name %r.\n" % (label, template_name) +
-            "%s" % msg)
+def apply_git_delta(base, delta):
+    r"""Return the object built by applying a packfile ``delta`` on ``base``
 
-    return template_path
+        >>> print(apply_git_delta(b"hello world",
+        ...                       b"\x0b\x07\x91\x06\x05\x02!!").decode())
+        world!!
 
+    """
+    delta = bytearray(delta)
+    src_size, pos = _read_delta_size(delta, 0)
+    if src_size != len(base):
+        raise ValueError("Corrupted git delta (base size mismatch).")
+    dst_size, pos = _read_delta_size(delta, pos)
+    out = bytearray()
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:  ## copy from base
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            size = size or 0x10000
+            out += base[offset:offset + size]
+        elif op:       ## insert literal data
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise ValueError("Corrupted git delta (reserved opcode 0).")
+    if len(out) != dst_size:
+        raise ValueError("Corrupted git delta (result size mismatch).")
+    return bytes(out)
 
-##
-## Output Engines
-##
 
-@available_in_config
-def rest_py(data, opts={}):
-    """Returns ReStructured Text changelog content from data"""
+def _mmap_file(path):
+    import mmap
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-    def rest_title(label, char="="):
-        return (label.strip() + "\n") + (char * len(label) + "\n")
 
-    def render_version(version):
-        title = "%s (%s)" % (version["tag"], version["date"]) \
-                if version["tag"] else \
-                opts["unreleased_version_label"]
-        s = rest_title(title, char="-")
+class GitPack(object):
+    """Read objects of a git packfile through its ``.idx`` index
 
-        sections = version["sections"]
-        nb_sections = len(sections)
-        for section in sections:
+    Both files are memory mapped, so only the pages holding the
+    requested objects are read. Version 1 and 2 indexes are supported,
+    and deltified objects (``OFS_DELTA`` and ``REF_DELTA``) are resolved
+    with a small cache of recently used delta bases.
 
-            section_label = section["label"] if section.get("label", None) \
-                            else "Other"
+    """
+
+    BASE_CACHE_SIZE = 256
+
+    def __init__(self, idx_path):
+        import struct
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-len(".idx")] + ".pack"
+        self._idx = idx = _mmap_file(idx_path)
+        self._pack = None
+        self._lock = threading.Lock()
+        self._bases = collections.OrderedDict()
+
+        if idx[:4] == b"\377tOc":
+            version = struct.unpack(">I", idx[4:8])[0]
+            if version != 2:
+                raise ValueError("Unsupported pack index version %d in %r."
+                                 % (version, idx_path))
+            self._fanout = struct.unpack(">256I", idx[8:8 + 1024])
+            self.count = self._fanout[255]
+            self._sha_at = 8 + 1024
+            self._sha_step = 20
+            self._ofs_at = self._sha_at + 24 * self.count  ## after crc32s
+            self._large_ofs_at = self._ofs_at + 4 * self.count
+        else:
+            self._fanout = struct.unpack(">256I", idx[:1024])
+            self.count = self._fanout[255]
+            self._sha_at = 1024 + 4
+            self._sha_step = 24
+            self._ofs_at = None
+
+    def _sha(self, i):
+        pos = self._sha_at + i * self._sha_step
+        return self._idx[pos:pos + 20]
+
+    def bisect(self, sha):
+        """Index of binary ``sha`` in the pack, or where it would be"""
+        return _sha_table_bisect(self._idx, self._fanout, self._sha_at,
+                                 self._sha_step, sha)
+
+    def find(self, sha):
+        """Index of binary ``sha`` in the pack, or None"""
+        i = self.bisect(sha)
+        return i if i < self.count and self._sha(i) == sha else None
+
+    def neighbours(self, sha):
+        """Binary sha1s sorted just before and after ``sha`` in the pack"""
+        i = self.bisect(sha)
+        j = i + 1 if i < self.count and self._sha(i) == sha else i
+        return [self._sha(k) for k in (i - 1, j) if 0 <= k < self.count]
+
+    def offset(self, i):
+        import struct
+        if self._ofs_at is None:
+            pos = 1024 + 24 * i
+            return struct.unpack(">I", self._idx[pos:pos + 4])[0]
+        pos = self._ofs_at + 4 * i
+        offset = struct.unpack(">I", self._idx[pos:pos + 4])[0]
+        if offset & 0x80000000:
+            pos = self._large_ofs_at + 8 * (offset & 0x7fffffff)
+            offset = struct.unpack(">Q", self._idx[pos:pos + 8])[0]
+        return offset
+
+    def read(self, sha, store):
+        """Return ``(type, content)`` of binary ``sha``, or None"""
+        i = self.find(sha)
+        if i is None:
+            return None
+        return self.read_at(self.offset(i), store)
+
+    def _inflate(self, pos, size):
+        import zlib
+        if size == 0:
+            return b""
+        pack = self._pack
+        d = zlib.decompressobj()
+        chunks = []
+        total = 0
+        step = 4096
+        while total < size:
+            data = pack[pos:pos + step]
+            if not data:
+                raise ValueError("Truncated git pack %r." % self.pack_path)
+            pos += step
+            step *= 2
+            chunk = d.decompress(data)
+            chunks.append(chunk)
+            total += len(chunk)
+        return b"".join(chunks)
+
+    def _read_base(self, offset, store):
+        with self._lock:
+            obj = self._bases.get(offset)
+            if obj is not None:
+                return obj
+        obj = self.read_at(offset, store)
+        with self._lock:
+            self._bases[offset] = obj
+            if len(self._bases) > self.BASE_CACHE_SIZE:
+                self._bases.popitem(last=False)
+        return obj
+
+    def read_at(self, offset, store):
+        """Return ``(type, content)`` of the object stored at ``offset``"""
+        import binascii
+        if self._pack is None:
+            with self._lock:
+                if self._pack is None:
+                    self._pack = _mmap_file(self.pack_path)
+        pack = self._pack
+        c = ord(pack[offset:offset + 1])
+        otype = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = ord(pack[pos:pos + 1])
+            pos += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+
+        if otype == GIT_OFS_DELTA:
+            c = ord(pack[pos:pos + 1])
+            pos += 1
+            base_offset = c & 0x7f
+            while c & 0x80:
+                c = ord(pack[pos:pos + 1])
+                pos += 1
+                base_offset = ((base_offset + 1) << 7) | (c & 0x7f)
+            btype, base = self._read_base(offset - base_offset, store)
+            return btype, apply_git_delta(base, self._inflate(pos, size))
+        if otype == GIT_REF_DELTA:
+            base_sha = pack[pos:pos + 20]
+            obj = store.read(binascii.hexlify(base_sha).decode("ascii"))
+            if obj is None:
+                raise ValueError("Missing delta base %s in git pack %r."
+                                 % (binascii.hexlify(base_sha),
+                                    self.pack_path))
+            btype, base = obj
+            return btype, apply_git_delta(base, self._inflate(pos + 20, size))
+        if otype not in GIT_OBJECT_TYPES:
+            raise ValueError("Unknown object type %d in git pack %r."
+                             % (otype, self.pack_path))
+        return GIT_OBJECT_TYPES[otype], self._inflate(pos, size)
+
+
+class GitObjectStore(object):
+    """Read git objects from an ``objects`` directory
+
+    Objects are looked up in packfiles then as loose objects, in the
+    given directory and in the ones listed in ``info/alternates``.
+    Packs are listed once, and listed again only when an object can't
+    be found (as after a ``git gc`` running concurrently).
+
+    """
+
+    def __init__(self, path):
+        self.dirs = [path]
+        alternates = os.path.join(path, "info", "alternates")
+        if os.path.isfile(alternates):
+            with open(alternates) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        self.dirs.append(normpath(line, cwd=path))
+        self._packs = None
+
+    @property
+    def packs(self):
+        if self._packs is None:
+            packs = []
+            for d in self.dirs:
+                for idx_path in sorted(glob.glob(
+                        os.path.join(d, "pack", "pack-*.idx"))):
+                    if os.path.exists(idx_path[:-len(".idx")] + ".pack"):
+                        packs.append(GitPack(idx_path))
+            self._packs = packs
+        return self._packs
+
+    def _read_loose(self, sha1):
+        import zlib
+        for d in self.dirs:
+            path = os.path.join(d, sha1[:2], sha1[2:])
+            try:
+                with open(path, "rb") as f:
+                    data = zlib.decompress(f.read())
+            except (IOError, OSError):
+                continue
+            header, _, content = data.partition(b"\x00")
+            return header.split(b" ")[0].decode("ascii"), content
+        return None
+
+    def read(self, sha1):
+        """Return ``(type, content)`` of object ``sha1``, or None"""
+        import binascii
+        sha = binascii.unhexlify(sha1)
+        for retry in (False, True):
+            if retry:
+                self._packs = None
+            for pack in self.packs:
+                obj = pack.read(sha, self)
+                if obj is not None:
+                    return obj
+            obj = self._read_loose(sha1)
+            if obj is not None:
+                return obj
+        return None
+
+    def abbrev(self, sha1):
+        """Return the shortest unambiguous prefix of ``sha1``
+
+        Same value than ``git log --pretty=format:%h``: the minimum
+        length depends on the number of packed objects, and grows until
+        no other object starts with the same prefix.
+
+        """
+        import binascii
+        count = sum(pack.count for pack in self.packs)
+        length = max(7, (max(1, count.bit_length()) + 1) // 2)
+        others = []
+        sha = binascii.unhexlify(sha1)
+        for pack in self.packs:
+            others.extend(binascii.hexlify(other).decode("ascii")
+                          for other in pack.neighbours(sha))
+        for d in self.dirs:
+            try:
+                names = os.listdir(os.path.join(d, sha1[:2]))
+            except OSError:
+                continue
+            others.extend(sha1[:2] + name for name in names
+                          if len(name) == 38)
+        for other in others:
+            if other == sha1:
+                continue
+            common = 0
+            while common < 40 and other[common] == sha1[common]:
+                common += 1
+            length = max(length, common + 1)
+        return sha1[:length]
+
+
+GIT_SHA1_REGEX = re.compile(r"^[0-9a-f]{40}$")
+
+
+class GitRefs(object):
+    """Read refs from loose ref files and ``packed-refs``
+
+    ``gitdir`` holds per worktree refs (as ``HEAD``), other refs are
+    in ``commondir``, which is the same directory apart for linked
+    worktrees.
+
+    """
+
+    def __init__(self, gitdir, commondir):
+        self.gitdir = gitdir
+        self.commondir = commondir
+        self._packed = None
+
+    @property
+    def packed(self):
+        """Dict of ``packed-refs`` as ``{name: (sha1, peeled sha1)}``"""
+        if self._packed is None:
+            packed = collections.OrderedDict()
+            path = os.path.join(self.commondir, "packed-refs")
+            if os.path.isfile(path):
+                name = None
+                with open(path, "rb") as f:
+                    for line in f:
+                        line = line.decode("utf-8").rstrip("\n")
+                        if not line or line.startswith("#"):
+                            continue
+                        if line.startswith("^"):
+                            if name is not None:
+                                packed[name] = (packed[name][0], line[1:])
+                            continue
+                        sha1, _, name = line.partition(" ")
+                        packed[name] = (sha1, None)
+            self._packed = packed
+        return self._packed
+
+    def _ref_path(self, name):
+        per_worktree = "/" not in name or name.startswith(
+            ("refs/bisect/", "refs/worktree/", "refs/rewritten/"))
+        return os.path.join(self.gitdir if per_worktree else self.commondir,
+                            *name.split("/"))
+
+    def resolve(self, name, depth=0):
+        """Return the sha1 a ref points to, or None if it doesn't exist"""
+        if depth > 5:  ## same limit than git on symbolic refs
+            return None
+        try:
+            with open(self._ref_path(name), "rb") as f:
+                content = f.read().decode("utf-8").strip()
+        except (IOError, OSError):
+            packed = self.packed.get(name)
+            return packed[0] if packed else None
+        if content.startswith("ref:"):
+            return self.resolve(content[4:].strip(), depth + 1)
+        return content if GIT_SHA1_REGEX.match(content) else None
+
+    def list(self, prefix):
+        """Sorted ``[(name, sha1)]`` of refs whose name starts with ``prefix``"""
+        refs = dict((name, value[0]) for name, value in self.packed.items()
+                    if name.startswith(prefix))
+        root = os.path.join(self.commondir, *prefix.rstrip("/").split("/"))
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(".lock"):
+                    continue
+                name = "/".join(os.path.relpath(
+                    os.path.join(dirpath, filename),
+                    self.commondir).split(os.sep))
+                sha1 = self.resolve(name)
+                if sha1:
+                    refs[name] = sha1
+        return sorted(refs.items())
+
+
+def _is_git_dir(path):
+    return os.path.isfile(os.path.join(path, "HEAD")) and \
+        os.path.isdir(os.path.join(path, "refs")) and \
+        (os.path.isdir(os.path.join(path, "objects")) or
+         os.path.isfile(os.path.join(path, "commondir")))
+
+
+def find_git_dir(path):
+    """Return ``(gitdir, toplevel)`` of the repository containing ``path``
+
+    ``toplevel`` is None for bare repositories. As git does, ``GIT_DIR``
+    is honored and ``.git`` files (of submodules and linked worktrees)
+    are followed. Raises EnvironmentError if ``path`` is not in a git
+    repository.
+
+    """
+    if os.environ.get("GIT_DIR"):
+        toplevel = os.environ.get("GIT_WORK_TREE")
+        return (normpath(os.environ["GIT_DIR"], cwd=path),
+                normpath(toplevel, cwd=path) if toplevel else path)
+    current = path
+    while True:
+        dotgit = os.path.join(current, ".git")
+        if os.path.isdir(dotgit) and _is_git_dir(dotgit):
+            return dotgit, current
+        if os.path.isfile(dotgit):
+            with open(dotgit) as f:
+                content = f.read().strip()
+            if content.startswith("gitdir:"):
+                return normpath(content[len("gitdir:"):].strip(),
+                                cwd=current), current
+        if _is_git_dir(current):
+            return current, None
+        parent = os.path.dirname(current)
+        if parent == current:
+            raise EnvironmentError(
+                "Not in a git repository. (no '.git' found in %r "
+                "or its parents.)" % path)
+        current = parent
+
+
+def parse_commit_header(raw):
+    r"""Return ``(committer timestamp, parents)`` of a raw commit object
+
+        >>> parse_commit_header(
+        ...     b"tree 4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+        ...     b"parent 1111111111111111111111111111111111111111\n"
+        ...     b"author Bob <bob@example.com> 946724400 +0100\n"
+        ...     b"committer Bob <bob@example.com> 946724500 +0100\n"
+        ...     b"\nsubject\n") == (
+        ...     946724500, ["1111111111111111111111111111111111111111"])
+        True
+
+    """
+    timestamp = 0
+    parents = []
+    for line in raw.split(b"\n\n", 1)[0].split(b"\n"):
+        if line.startswith(b"parent "):
+            parents.append(line[7:].decode("ascii"))
+        elif line.startswith(b"committer "):
+            try:
+                timestamp = int(line.rsplit(b" ", 2)[1])
+            except (IndexError, ValueError):
+                pass
+    return timestamp, parents
+
+
+def _sha_table_bisect(table, fanout, offset, step, sha):
+    """Position of binary ``sha`` in a sorted table of sha1, or where it
+    would be (tables of pack indexes and commit-graph files)"""
+    first = ord(sha[0:1])
+    lo = fanout[first - 1] if first else 0
+    hi = fanout[first]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos = offset + mid * step
+        if table[pos:pos + 20] < sha:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def git_common_dir(gitdir):
+    """Return the directory holding objects and shared refs of ``gitdir``
+
+    It is ``gitdir`` itself apart for linked worktrees.
+
+    """
+    commondir_file = os.path.join(gitdir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as f:
+            return normpath(f.read().strip(), cwd=gitdir)
+    return gitdir
+
+
+class CommitGraph(object):
+    """Read a git ``commit-graph`` file, or a chain of them
+
+    Gives parents and generation numbers (topological levels) of the
+    commits it holds without reading commit objects (see git's
+    ``Documentation/technical/commit-graph-format.txt``). A commit-graph
+    holds all the ancestors of its commits.
+
+    """
+
+    NO_PARENT = 0x70000000
+    EXTRA_EDGES = 0x80000000
+
+    def __init__(self, paths):
+        import struct
+        self._layers = []
+        self.count = 0
+        for path in paths:
+            graph = _mmap_file(path)
+            if graph[:4] != b"CGPH" or graph[4:6] != b"\x01\x01":
+                raise ValueError("Unsupported commit-graph file %r." % path)
+            chunks = {}
+            for i in range(ord(graph[6:7])):
+                pos = 8 + 12 * i
+                chunks[graph[pos:pos + 4]] = struct.unpack(
+                    ">Q", graph[pos + 4:pos + 12])[0]
+            if not all(c in chunks for c in (b"OIDF", b"OIDL", b"CDAT")):
+                raise ValueError("Missing chunks in commit-graph file %r."
+                                 % path)
+            fanout = struct.unpack(
+                ">256I", graph[chunks[b"OIDF"]:chunks[b"OIDF"] + 1024])
+            self._layers.append((self.count, fanout, graph, chunks))
+            self.count += fanout[255]
+
+    @classmethod
+    def open(cls, objects_dir):
+        """Return the commit-graph of an objects directory, or None"""
+        import struct
+        path = os.path.join(objects_dir, "info", "commit-graph")
+        chain = os.path.join(objects_dir, "info", "commit-graphs",
+                             "commit-graph-chain")
+        if os.path.isfile(path):
+            paths = [path]
+        elif os.path.isfile(chain):
+            with open(chain) as f:
+                paths = [os.path.join(objects_dir, "info", "commit-graphs",
+                                      "graph-%s.graph" % line.strip())
+                         for line in f if line.strip()]
+        else:
+            return None
+        try:
+            return cls(paths)
+        except (IOError, OSError, ValueError, struct.error):
+            return None  ## unreadable graphs are ignored, as git does
+
+    def _layer(self, pos):
+        for layer in reversed(self._layers):
+            if pos >= layer[0]:
+                return layer
+        raise ValueError("Invalid commit-graph position %d." % pos)
+
+    def _sha1(self, pos):
+        import binascii
+        base, _, graph, chunks = self._layer(pos)
+        at = chunks[b"OIDL"] + 20 * (pos - base)
+        return binascii.hexlify(graph[at:at + 20]).decode("ascii")
+
+    def lookup(self, sha1):
+        """Return position of commit ``sha1`` in the graph, or None"""
+        import binascii
+        sha = binascii.unhexlify(sha1)
+        for base, fanout, graph, chunks in self._layers:
+            i = _sha_table_bisect(graph, fanout, chunks[b"OIDL"], 20, sha)
+            at = chunks[b"OIDL"] + 20 * i
+            if i < fanout[255] and graph[at:at + 20] == sha:
+                return base + i
+        return None
+
+    def get(self, sha1):
+        """Return ``(generation, parents)`` of commit ``sha1``, or None"""
+        import struct
+        pos = self.lookup(sha1)
+        if pos is None:
+            return None
+        base, _, graph, chunks = self._layer(pos)
+        at = chunks[b"CDAT"] + 36 * (pos - base) + 20
+        parent1, parent2, generation, _ = struct.unpack(
+            ">IIII", graph[at:at + 16])
+        parents = []
+        if parent1 != self.NO_PARENT:
+            parents.append(self._sha1(parent1))
+        if parent2 & self.EXTRA_EDGES:
+            edge = chunks[b"EDGE"] + 4 * (parent2 & ~self.EXTRA_EDGES)
+            while True:
+                value = struct.unpack(">I", graph[edge:edge + 4])[0]
+                parents.append(self._sha1(value & ~self.EXTRA_EDGES))
+                if value & self.EXTRA_EDGES:
+                    break
+                edge += 4
+        elif parent2 != self.NO_PARENT:
+            parents.append(self._sha1(parent2))
+        return generation >> 2, parents
+
+
+## Generation numbers of commit-graph are capped to this value
+GENERATION_NUMBER_MAX = 0x3FFFFFFF
+
+
+class AncestryIndex(object):
+    """Answer in memory if a commit is an ancestor of another one
+
+    Parents and generation numbers are read from the commit-graph
+    file of the repository if there's one. Otherwise, parents of all
+    commits reachable from refs are listed once through
+    ``repository.parent_map()``, and generation numbers are computed
+    from them. Commits out of the index (created after it) get their
+    parents from ``repository.commit_parents()``.
+
+    As an ancestor has always a lower generation number than its
+    descendants, walks stop as soon as they get below the generation
+    of the searched commit.
+
+    """
+
+    def __init__(self, repository):
+        self._repository = repository
+        self._graph = CommitGraph.open(
+            os.path.join(repository.commondir, "objects"))
+        self._map = None    ## sha1 -> (generation, parents) without graph
+        self._extra = {}    ## sha1 -> parents of commits out of the index
+
+    def _build_map(self):
+        parent_map = self._repository.parent_map()
+        generations = {}
+        for sha1 in parent_map:
+            stack = [sha1]
+            while stack:
+                current = stack[-1]
+                if current in generations:
+                    stack.pop()
+                    continue
+                parents = [p for p in parent_map[current] if p in parent_map]
+                todo = [p for p in parents if p not in generations]
+                if todo:
+                    stack.extend(todo)
+                    continue
+                generations[current] = 1 + max(
+                    [generations[p] for p in parents] or [0])
+                stack.pop()
+        return dict((sha1, (generations[sha1], parents))
+                    for sha1, parents in parent_map.items())
+
+    def _indexed(self, sha1):
+        """Return ``(generation, parents)`` of ``sha1`` if indexed"""
+        if self._graph is not None:
+            return self._graph.get(sha1)
+        if self._map is None:
+            self._map = self._build_map()
+        return self._map.get(sha1)
+
+    def parents(self, sha1):
+        entry = self._indexed(sha1)
+        if entry is not None:
+            return entry[1]
+        parents = self._extra.get(sha1)
+        if parents is None:
+            parents = self._extra[sha1] = \
+                self._repository.commit_parents(sha1)
+        return parents
+
+    def reaching(self, target, heads):
+        """Return the set of ``heads`` from which ``target`` is reachable"""
+        target_entry = self._indexed(target)
+        floor = target_entry[0] if target_entry is not None and \
+            0 < target_entry[0] < GENERATION_NUMBER_MAX else None
+
+        def unreachable(sha1):
+            entry = self._indexed(sha1)
+            if entry is None:
+                return False
+            if target_entry is None:
+                ## index holds all ancestors of its commits
+                return True
+            return floor is not None and 0 < entry[0] <= floor
+
+        memo = {target: True}
+        for head in heads:
+            stack = [head]
+            while stack:
+                sha1 = stack[-1]
+                if sha1 in memo:
+                    stack.pop()
+                    continue
+                if unreachable(sha1):
+                    memo[sha1] = False
+                    stack.pop()
+                    continue
+                parents = self.parents(sha1)
+                if any(memo.get(p) for p in parents):
+                    memo[sha1] = True
+                    stack.pop()
+                    continue
+                todo = [p for p in parents if p not in memo]
+                if todo:
+                    stack.extend(todo)
+                    continue
+                memo[sha1] = False
+                stack.pop()
+        return set(head for head in heads if memo[head])
+
+    def is_ancestor(self, ancestor, descendant):
+        return descendant in self.reaching(ancestor, [descendant])
+
+    def learn(self, parent_map):
+        """Record parents of commits already read by a history walk"""
+        self._extra.update(parent_map)
+
+
+class GitRepos(object):
+
+    def __init__(self, path):
+
+        ## Saving this original path to ensure all future git commands
+        ## will be done from this location.
+        self._orig_path = os.path.abspath(path)
+
+        self.bare, self.gitdir, self.toplevel = self._find_git_dir()
+        self.commondir = git_common_dir(self.gitdir)
+        self._git_version = None
+        self._config = None
+        self._default_date_format = None
+
+        self.cat_file = GitCatFile(self._orig_path)
+        self.commit_cache = None
+        self._ancestry = None
+
+    def _find_git_dir(self):
+        """Return ``(bare, gitdir, toplevel)`` of the repository
+
+        ``toplevel`` is None if there is no work tree.
+
+        """
+        ## Only one ``git`` process to check that ``git`` is accessible,
+        ## that we are in a git repository, and to get its directories.
+        try:
+            out = wrap(["git", "rev-parse", "--is-bare-repository",
+                        "--git-dir", "--show-cdup"], cwd=self._orig_path)
+        except ShellError as e:
+            if DEBUG:
+                raise
+            if e.errlvl == 127:
+                raise EnvironmentError(
+                    "Required ``git`` command not found or broken in $PATH. "
+                    "(calling ``git rev-parse`` failed.)")
+            raise EnvironmentError(
+                "Not in a git repository. (calling ``git rev-parse`` failed.)")
+
+        ## ``--show-cdup`` outputs a line only when in a work tree, it is
+        ## relative to the current directory with symlinks resolved (as
+        ## ``--show-toplevel``, which fails in bare repositories).
+        lines = out.splitlines()
+        toplevel = None if len(lines) < 3 else \
+                   normpath(lines[2], cwd=os.path.realpath(self._orig_path))
+        return (lines[0] == "true",
+                normpath(lines[1], cwd=self._orig_path),
+                toplevel)
+
+    def close(self):
+        """Stop long lived git processes"""
+        self.cat_file.close()
+        if self.commit_cache is not None:
+            self.commit_cache.close()
+
+    def use_config_snapshot(self):
+        """Answer config lookups from one read of the whole configuration
+
+        Changes made to the configuration afterwards won't be seen.
+
+        """
+        self._config = GitConfig(self, snapshot=True)
+
+    @property
+    def default_date_format(self):
+        """True if ``git log`` gives dates in git's default format
+
+        That is if ``log.date`` is not set in git config.
+
+        """
+        if self._default_date_format is None:
+            try:
+                log_date = self.config.get("log.date")
+            except ShellError:
+                log_date = None
+            self._default_date_format = log_date in (None, "default")
+        return self._default_date_format
+
+    def use_commit_cache(self, path=None):
+        """Store and reuse parsed commits with a ``CommitCache``
+
+        Default location is in a ``gitchangelog`` directory in the
+        git directory of the repository.
+
+        """
+        if path is None:
+            path = os.path.join(self.gitdir, "gitchangelog", "commits.db")
+        self.commit_cache = CommitCache(path)
+
+    @classmethod
+    def create(cls, dir, *args, **kwargs):
+        os.mkdir(dir)
+        return cls.init(dir, *args, **kwargs)
+
+    @classmethod
+    def init(cls, dir, user=None, email=None):
+        wrap(["git", "init", "."], cwd=dir)
+        if user:
+            wrap(["git", "config", "user.email", user], cwd=dir)
+        if email:
+            wrap(["git", "config", "user.name", user], cwd=dir)
+        return cls(dir)
+
+    def commit(self, identifier):
+        return GitCommit(self, identifier)
+
+    def read_commit(self, identifier):
+        """Return attributes of a commit read through ``git cat-file``
+
+        Annotated tags are peeled to their commit. Returns None if
+        the commit can't be read this way.
+
+        """
+        obj = self.cat_file.read("%s^{commit}" % identifier)
+        if obj is None:
+            return None
+        sha1, otype, raw = obj
+        if otype != "commit":
+            return None
+        return parse_commit_object(sha1, raw,
+                                   dates=self.default_date_format)
+
+    @property
+    def ancestry(self):
+        """``AncestryIndex`` of the repository, built on first use"""
+        if self._ancestry is None:
+            self._ancestry = AncestryIndex(self)
+        return self._ancestry
+
+    def is_ancestor(self, ancestor, descendant):
+        """Tell if commit ``ancestor`` is reachable from ``descendant``"""
+        return self.ancestry.is_ancestor(ancestor, descendant)
+
+    def parent_map(self):
+        """Dict of parents' sha1 of all commits reachable from refs"""
+        return dict((line.split()[0], line.split()[1:])
+                    for line in self.swrap(
+                        ["git", "rev-list", "--parents", "--all"]).split("\n")
+                    if line)
+
+    def commit_parents(self, sha1):
+        """Parents' sha1 of commit ``sha1``
+
+        Missing commits (as beyond the limit of a shallow clone) have
+        no parents.
+
+        """
+        obj = self.cat_file.read(sha1)
+        if obj is None or obj[1] != "commit":
+            return []
+        return parse_commit_header(obj[2])[1]
+
+    @property
+    def git_version(self):
+        """Output of ``git version``, only read when first used"""
+        if self._git_version is None:
+            self._git_version = self.swrap(["git", "version"])
+        return self._git_version
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = GitConfig(self)
+        return self._config
+
+    def swrap(self, command, **kwargs):
+        """Run ``command`` in the repository (see ``swrap(..)``)
+
+        The command is given its working directory instead of changing
+        the one of the whole process, so several commands can be run at
+        once from different threads. Prefer lists of arguments to
+        strings, they don't require quoting and don't start a shell.
+
+        """
+        kwargs.setdefault("cwd", self._orig_path)
+        return swrap(command, **kwargs)
+
+    def tags(self, contains=None):
+        """String list of repository's tag names
+
+        Current tag order is committer date timestamp of tagged commit.
+        No firm reason for that, and it could change in future version.
+
+        If ``contains`` is given, only tags from which this commit is
+        reachable are listed (as ``git tag --contains``), this is
+        computed once for all tags with the ``AncestryIndex``.
+
+        """
+        tags = self._tag_commits()
+
+        if contains:
+            reaching = self.ancestry.reaching(self.commit(contains).sha1,
+                                              [tag.sha1 for tag in tags])
+            tags = [tag for tag in tags if tag.sha1 in reaching]
+
+        ## Should we use new version name sorting ?  refering to :
+        ## ``git tags --sort -v:refname`` in git version >2.0.
+        ## Sorting and reversing with command line is not available on
+        ## git version <2.0
+        return sorted(tags, key=lambda x: int(x.committer_date_timestamp))
+
+    def _tag_commits(self):
+        """``GitCommit`` of all tags, with their main attributes set"""
+        ## Getting all tags and their commit's dates in one call to avoid
+        ## resolving each tag's attributes with its own ``git log``.
+        tags = []
+        for name, dct in parse_tag_refs(self.swrap(
+                ["git", "for-each-ref",
+                 "--format=%s" % GIT_TAG_REFS_FORMAT_STRING, "refs/tags"])):
+            tag = self.commit(name)
+            for k, v in dct.items():
+                setattr(tag, k, v)
+            tags.append(tag)
+        return tags
+
+    def log(self, includes=["HEAD", ], excludes=[], include_merge=True,
+            encoding=_preferred_encoding, with_parents=False, fields=None):
+        """Reverse chronological list of git repository's commits
+
+        Note: rev lists can be GitCommit instance list or identifier list.
+
+        If ``with_parents`` is set, each commit will also get a
+        ``parents`` attribute holding the list of its parents' sha1.
+
+        If ``fields`` is given, only these ``GIT_FORMAT_KEYS`` are
+        requested to ``git log`` (see ``git_format_keys(..)``), others
+        are read on first access.
+
+        """
+
+        def sha1(ref):
+            return (ref if isinstance(ref, GitCommit) else self.commit(ref)).sha1
+
+        revs = [sha1(ref) for ref in includes] + \
+               ["^%s" % sha1(ref) for ref in excludes]
+
+        if self.commit_cache is not None:
+            return self._cached_log(revs, include_merge=include_merge,
+                                    encoding=encoding,
+                                    with_parents=with_parents)
+
+        ## --topo-order: don't mix commits from separate branches.
+        return self._git_log(
+            ["--topo-order"] + ([] if include_merge else ["--no-merges"]),
+            revs, encoding=encoding, with_parents=with_parents,
+            fields=fields)
+
+    def boundary(self, includes, excludes):
+        """Return the set of sha1 of excluded parents of ``log(..)`` commits
+
+        These are the boundary commits of ``git rev-list --boundary``,
+        parents that ``log(includes=includes, excludes=excludes)`` never
+        outputs.
+
+        """
+        if not excludes:
+            return set()
+
+        def sha1(ref):
+            return (ref if isinstance(ref, GitCommit) else self.commit(ref)).sha1
+
+        prl = Proc(["git", "rev-list", "--stdin", "--boundary"],
+                   cwd=self._orig_path)
+        for rev in [sha1(ref) for ref in includes] + \
+                   ["^%s" % sha1(ref) for ref in excludes]:
+            prl.stdin.write("%s\n" % rev)
+        prl.stdin.close()
+        try:
+            return set(line[1:] for line in prl.stdout.read("\n")
+                       if line.startswith("-"))
+        finally:
+            prl.stdout.close()
+            prl.wait()
+
+    def _git_log(self, options, revs, encoding=_preferred_encoding,
+                 with_parents=False, fields=None):
+        """Iterate on commits output by ``git log`` given ``revs`` on stdin"""
+
+        keys = git_format_keys(fields)
+        aformat = "%x00".join(GIT_FORMAT_KEYS[key] for key in keys)
+        if with_parents:
+            keys.append("parents")
+            aformat += "%x00" + GIT_PARENTS_FORMAT
+
+        plog = Proc(["git", "log", "--stdin", "-z"] + options +
+                    ["--pretty=format:%s" % aformat, "--"],
+                    encoding=encoding, cwd=self._orig_path)
+        for rev in revs:
+            plog.stdin.write("%s\n" % rev)
+        plog.stdin.close()
+
+        def mk_commit(dct):
+            """Creates an already set commit from a dct"""
+            c = self.commit(dct["sha1"])
+            for k, v in dct.items():
+                setattr(c, k, v)
+            if with_parents:
+                c.parents = dct["parents"].split()
+            return c
+
+        values = plog.stdout.read("\x00")
+
+        try:
+            while True:
+                try:
+                    dct = dict([(key, next(values)) for key in keys])
+                except StopIteration:
+                    return  ## end of ``git log`` output
+                yield mk_commit(dct)
+        finally:
+            plog.stdout.close()
+            plog.wait()
+
+    def _cached_log(self, revs, include_merge=True,
+                    encoding=_preferred_encoding, with_parents=False):
+        """Same as ``log(..)`` but reusing records of ``commit_cache``
+
+        Only the commit graph is walked (``git rev-list``), commits
+        missing from the cache are then read with only one ``git log``,
+        and their records are stored for next runs.
+
+        """
+        ## abbreviated sha1s are given along, as they are not cached
+        prl = Proc(["git", "rev-list", "--stdin", "--topo-order", "--parents",
+                    "--format=%h"] +
+                   ([] if include_merge else ["--no-merges"]),
+                   encoding=encoding, cwd=self._orig_path)
+        for rev in revs:
+            prl.stdin.write("%s\n" % rev)
+        prl.stdin.close()
+        lines = (line for line in prl.stdout.read("\n") if line)
+        graph = []
+        sha1_shorts = {}
+        for line in lines:
+            ## ``commit <sha1> <parents>`` then the formatted line
+            node = line.split()[1:]
+            sha1_shorts[node[0]] = next(lines)
+            graph.append(node)
+        prl.stdout.close()
+        prl.wait()
+
+        cache = self.commit_cache
+        cached = cache.known([node[0] for node in graph], encoding)
+        missing = [node[0] for node in graph if node[0] not in cached]
+        fetched = self._git_log(["--no-walk=unsorted"], missing,
+                                encoding=encoding) \
+                  if missing else iter([])
+
+        for idx in range(0, len(graph), 500):
+            chunk = graph[idx:idx + 500]
+            records = cache.get([node[0] for node in chunk
+                                 if node[0] in cached], encoding)
+            new_commits = []
+            for node in chunk:
+                sha1 = node[0]
+                if sha1 in cached:
+                    commit = self.commit(sha1)
+                    if sha1 in records:
+                        commit._load_record(records[sha1])
+                else:
+                    ## a ``StopIteration`` would end this generator
+                    commit = next(fetched, None)
+                    if commit is None or commit.sha1 != sha1:
+                        raise ShellError(
+                            "'git log --no-walk' didn't output commit %s "
+                            "(got %s)."
+                            % (sha1, "nothing" if commit is None
+                               else commit.sha1),
+                            command="git log --no-walk=unsorted")
+                    new_commits.append(commit)
+                commit.sha1_short = sha1_shorts[sha1]
+                if with_parents:
+                    commit.parents = node[1:]
+                yield commit
+            cache.put(new_commits, encoding)
+
+    def tagged_log(self, tags, excludes=[], include_merge=True,
+                   encoding=_preferred_encoding, fields=None):
+        """Iterate through ``(tag, commits)`` with only one history walk
+
+        ``tags`` is a newest first list of ``GitCommit`` (as prepared by
+        ``versions_data_iter(..)``). Each commit is attributed to the
+        oldest tag it is reachable from, so ``commits`` is the same set
+        that ``log(includes=[tag], excludes=<older tags> + excludes)``
+        would return, but there is only one ``git log`` process for the
+        whole list of tags.
+
+        Attribution is computed while the log streams: ``git log
+        --topo-order`` outputs children before parents, so the oldest
+        tag reaching a commit is known once its children are all seen,
+        and is passed down to its parents. A tag is yielded as soon as
+        no pending commit can still be attributed to it or to any older
+        tag.
+
+        Commits of a tag are then sorted as ``log(..)`` would give them
+        (see ``range_topo_order(..)``), as the order of the global walk
+        differs on branchy histories.
+
+        """
+        nb = len(tags)
+
+        ## rank 0 is the oldest tag, the lowest rank reaching a commit wins
+        counts = [0] * nb     ## number of pending commits per rank
+        pending = {}          ## sha1 -> lowest rank seen from children
+
+        ## parents out of the walk are never output, they would keep
+        ## their rank pending until the end of the log
+        excluded = self.boundary(list(tags), list(excludes))
+
+        def push(sha1, rank):
+            if sha1 in excluded:
+                return
+            prev = pending.get(sha1)
+            if prev is not None:
+                if prev <= rank:
+                    return
+                counts[prev] -= 1
+            pending[sha1] = rank
+            counts[rank] += 1
+
+        for idx, tag in enumerate(tags):
+            push(tag.sha1, nb - 1 - idx)
+
+        buckets = [[] for _ in range(nb)]
+        next_rank = nb - 1    ## rank of the next tag to be yielded
+
+        def bucket(rank):
+            commits = dict((commit.sha1, commit) for commit in buckets[rank])
+            buckets[rank] = None
+            order = range_topo_order(
+                tags[nb - 1 - rank].sha1,
+                dict((sha1, (int(commit.committer_date_timestamp),
+                             commit.parents))
+                     for sha1, commit in commits.items()))
+            return [commits[sha1] for sha1 in order
+                    if include_merge or len(commits[sha1].parents) < 2]
+
+        ## commit dates are needed to sort commits of each tag
+        if fields is not None and "committer_date_timestamp" not in fields:
+            fields = list(fields) + ["committer_date_timestamp"]
+        commits = self.log(includes=list(tags), excludes=list(excludes),
+                           include_merge=True, encoding=encoding,
+                           with_parents=True, fields=fields)
+        for commit in commits:
+            rank = pending.pop(commit.sha1)
+            counts[rank] -= 1
+            buckets[rank].append(commit)
+            for parent in commit.parents:
+                push(parent, rank)
+
+            ## Only ranks lower or equal to the highest pending one can
+            ## still receive commits.
+            while next_rank >= 0 and counts[next_rank] == 0:
+                yield tags[nb - 1 - next_rank], bucket(next_rank)
+                next_rank -= 1
+
+        ## remaining ranks, as when the log is empty
+        while next_rank >= 0:
+            yield tags[nb - 1 - next_rank], bucket(next_rank)
+            next_rank -= 1
+
+
+def range_topo_order(tip, nodes):
+    """Return sha1s of ``nodes`` reachable from ``tip`` in ``git log`` order
+
+    ``nodes`` maps the sha1 of each commit of the range to its
+    ``(committer timestamp, parents)``, parents out of ``nodes`` being
+    excluded. Commits are first popped in commit date order from
+    ``tip`` (see ``limit_list()`` of git's ``revision.c``), then sorted
+    with ``topo_order(..)``. Given all commits of ``tip ^<excludes>``,
+    this is the order of ``git log --topo-order tip ^<excludes>`` when
+    commit dates are not skewed.
+
+    """
+    import heapq
+    if tip not in nodes:  ## then ``nodes`` is empty
+        return []
+    newlist = []
+    queue = [(-nodes[tip][0], 0, tip)]  ## ties are popped first in first
+    seen = set([tip])
+    order = itertools.count(1)
+    while queue:
+        _, _, sha1 = heapq.heappop(queue)
+        newlist.append(sha1)
+        for parent in nodes[sha1][1]:
+            if parent in nodes and parent not in seen:
+                seen.add(parent)
+                heapq.heappush(queue, (-nodes[parent][0], next(order), parent))
+    return topo_order(newlist, lambda sha1: nodes[sha1][1])
+
+
+def topo_order(newlist, parents):
+    """Return sha1s of ``newlist`` sorted as ``git log --topo-order``
+
+    ``newlist`` is in the order of git's commit date walk, and
+    ``parents(sha1)`` gives the parents' sha1 of a commit. As in
+    ``sort_in_topological_order()`` of git's ``commit.c``, children come
+    before their parents, tips keep their order, and commits of a
+    branch are not mixed with the ones of another branch:
+
+        >>> graph = {"m": ["a2", "b2"], "a2": ["a1"], "a1": ["o"],
+        ...          "b2": ["b1"], "b1": ["o"], "o": []}
+        >>> topo_order(["m", "a2", "b2", "a1", "b1", "o"], graph.get)
+        ['m', 'b2', 'b1', 'a2', 'a1', 'o']
+
+    """
+    indegree = dict((sha1, 1) for sha1 in newlist)
+    for sha1 in newlist:
+        for parent in parents(sha1):
+            if indegree.get(parent):
+                indegree[parent] += 1
+
+    result = []
+    stack = [sha1 for sha1 in newlist if indegree[sha1] == 1]
+    stack.reverse()
+    while stack:
+        sha1 = stack.pop()
+        for parent in parents(sha1):
+            if not indegree.get(parent):
+                continue
+            indegree[parent] -= 1
+            if indegree[parent] == 1:
+                stack.append(parent)
+        indegree[sha1] = 0
+        result.append(sha1)
+    return result
+
+
+class PyGitRepos(GitRepos):
+    """``GitRepos`` reading the repository without ``git`` processes
+
+    Refs, commits, tags and history walks are read directly from the
+    git directory (loose objects, packfiles and refs), so the usual
+    queries of gitchangelog don't start any process. The ``git``
+    command is still used for the less common queries (``git config``,
+    revision expressions as ``HEAD~3``) through the inherited methods.
+
+    History walks reproduce the walk of ``git log --topo-order``
+    without a commit-graph file (see ``_walk(..)``). With a commit-graph
+    file, as written by default by ``git gc``, git walks with generation
+    numbers instead: order and commits are still the same when no
+    commit is older than its parents, but can differ when committer
+    dates are skewed. Note also that replace refs and grafts are not
+    honored, and that ``commit_cache`` is not used as reading objects
+    directly is as cheap as reading the cache.
+
+    """
+
+    def __init__(self, path):
+        super(PyGitRepos, self).__init__(path)
+
+        self.objects = GitObjectStore(os.path.join(self.commondir, "objects"))
+        self.refs = GitRefs(self.gitdir, self.commondir)
+        self.shallow = set()
+        shallow_file = os.path.join(self.commondir, "shallow")
+        if os.path.isfile(shallow_file):
+            with open(shallow_file) as f:
+                self.shallow = set(line.strip() for line in f)
+        self._nodes = {}  ## sha1 -> (committer timestamp, parents)
+
+    def _find_git_dir(self):
+        ## no ``git`` process
+        gitdir, toplevel = find_git_dir(self._orig_path)
+        return toplevel is None, gitdir, toplevel
+
+    def resolve(self, name):
+        """Return the sha1 of a ref name or full sha1, or None
+
+        Refs are searched with the same rules than ``git rev-parse``.
+
+        """
+        if GIT_SHA1_REGEX.match(name):
+            return name
+        for pattern in ("%s", "refs/%s", "refs/tags/%s", "refs/heads/%s",
+                        "refs/remotes/%s", "refs/remotes/%s/HEAD"):
+            sha1 = self.refs.resolve(pattern % name)
+            if sha1:
+                return sha1
+        return None
+
+    def _peel(self, sha1):
+        """Return ``(sha1, raw)`` of commit pointed by object ``sha1``"""
+        while True:
+            obj = self.objects.read(sha1)
+            if obj is None:
+                return None
+            otype, raw = obj
+            if otype == "commit":
+                return sha1, raw
+            if otype != "tag" or not raw.startswith(b"object "):
+                return None
+            sha1 = raw[len(b"object "):raw.index(b"\n")].decode("ascii")
+
+    def _commit_dict(self, sha1, raw):
+        dct = parse_commit_object(sha1, raw, dates=self.default_date_format)
+        dct["sha1_short"] = self.objects.abbrev(sha1)
+        if sha1 in self.shallow:
+            dct["parents"] = []
+        return dct
+
+    def read_commit(self, identifier):
+        sha1 = self.resolve(identifier)
+        if sha1 is None:  ## revision expression
+            return super(PyGitRepos, self).read_commit(identifier)
+        commit = self._peel(sha1)
+        if commit is None:
+            return None
+        return self._commit_dict(*commit)
+
+    def _node(self, sha1):
+        """Return ``(committer timestamp, parents)`` of commit ``sha1``"""
+        node = self._nodes.get(sha1)
+        if node is None:
+            obj = self.objects.read(sha1)
+            if obj is None or obj[0] != "commit":
+                raise ValueError("Commit %s is missing from the repository."
+                                 % sha1)
+            node = parse_commit_header(obj[1])
+            if sha1 in self.shallow:
+                node = (node[0], [])
+            self._nodes[sha1] = node
+        return node
+
+    def parent_map(self):
+        heads = [sha1 for _, sha1 in self.refs.list("refs/")]
+        head = self.resolve("HEAD")
+        if head:
+            heads.append(head)
+        parent_map = {}
+        stack = []
+        for sha1 in heads:
+            commit = self._peel(sha1)
+            if commit is not None:
+                stack.append(commit[0])
+        while stack:
+            sha1 = stack.pop()
+            if sha1 in parent_map:
+                continue
+            parents = parent_map[sha1] = self.commit_parents(sha1)
+            stack.extend(parents)
+        return parent_map
+
+    def commit_parents(self, sha1):
+        try:
+            return self._node(sha1)[1]
+        except ValueError:
+            return []
+
+    def _tag_commits(self):
+        tags = []
+        for name, sha1 in self.refs.list("refs/tags/"):
+            commit = self._peel(sha1)
+            if commit is None:  ## tag of a tree or a blob
+                continue
+            tag = self.commit(name[len("refs/tags/"):])
+            dct = self._commit_dict(*commit)
+            for key in GIT_FORMAT_KEYS:
+                if key in dct:  ## dates are lazy if ``log.date`` is set
+                    setattr(tag, key, dct[key])
+            tags.append(tag)
+        return tags
+
+    def log(self, includes=["HEAD", ], excludes=[], include_merge=True,
+            encoding=_preferred_encoding, with_parents=False, fields=None):
+        ## ``fields`` are all parsed at once from the commit object
+
+        def sha1(ref):
+            return (ref if isinstance(ref, GitCommit) else self.commit(ref)).sha1
+
+        return self._py_log([sha1(ref) for ref in includes],
+                            [sha1(ref) for ref in excludes],
+                            include_merge=include_merge,
+                            with_parents=with_parents)
+
+    def boundary(self, includes, excludes):
+        if not excludes:
+            return set()
+
+        def sha1(ref):
+            return (ref if isinstance(ref, GitCommit) else self.commit(ref)).sha1
+
+        walked, parents = set(), set()
+        for commit, commit_parents, _ in self._walk(
+                [sha1(ref) for ref in includes],
+                [sha1(ref) for ref in excludes]):
+            walked.add(commit)
+            parents.update(commit_parents)
+        return parents - walked
+
+    def _py_log(self, includes, excludes, include_merge=True,
+                with_parents=False):
+        for sha1, parents, raw in self._walk(includes, excludes):
+            if not include_merge and len(parents) > 1:
+                continue
+            dct = self._commit_dict(sha1, raw)
+            commit = self.commit(sha1)
+            for key in GIT_FORMAT_KEYS:
+                if key in dct:
+                    setattr(commit, key, dct[key])
+            if with_parents:
+                commit.parents = parents
+            yield commit
+
+    def _walk(self, includes, excludes):
+        """Yield ``(sha1, parents, raw)`` of commits in ``git log`` order
+
+        Commits are the ones reachable from ``includes`` and not from
+        ``excludes``, and are given in the order of ``git log
+        --topo-order``: as git does, commits are first popped in commit
+        date order while propagating exclusion to parents (see
+        ``limit_list()`` of git's ``revision.c``), then sorted in
+        topological order keeping the order of the tips (see
+        ``sort_in_topological_order()`` of git's ``commit.c``). So,
+        as git without a commit-graph file, a commit reachable from
+        ``excludes`` can be listed when committer dates are skewed.
+
+        """
+        import heapq
+        SLOP = 5  ## extra commits git walks to cope with clock skews
+
+        nodes = {}            ## sha1 -> (timestamp, parents, raw)
+        uninteresting = set()
+        seen = set()
+        queue = []            ## heap of (-timestamp, insertion order, sha1)
+        order = itertools.count()
+
+        def parse(sha1):
+            node = nodes.get(sha1)
+            if node is None:
+                obj = self.objects.read(sha1)
+                if obj is None or obj[0] != "commit":
+                    raise ValueError(
+                        "Commit %s is missing from the repository." % sha1)
+                timestamp, parents = parse_commit_header(obj[1])
+                if sha1 in self.shallow:
+                    parents = []
+                node = nodes[sha1] = (timestamp, parents, obj[1])
+            return node
+
+        def push(sha1):
+            seen.add(sha1)
+            heapq.heappush(queue, (-nodes[sha1][0], next(order), sha1))
+
+        def mark_parents_uninteresting(sha1):
+            stack = list(nodes[sha1][1])
+            while stack:
+                parent = stack.pop()
+                if parent in uninteresting:
+                    continue
+                uninteresting.add(parent)
+                if parent in nodes:
+                    stack.extend(nodes[parent][1])
+
+        tips = []
+        for sha1, excluded in [(sha1, False) for sha1 in includes] + \
+                              [(sha1, True) for sha1 in excludes]:
+            parse(sha1)
+            if excluded:
+                uninteresting.add(sha1)
+                mark_parents_uninteresting(sha1)
+            if sha1 not in seen:
+                seen.add(sha1)
+                tips.append(sha1)
+        tips.sort(key=lambda sha1: -nodes[sha1][0])  ## stable
+        for sha1 in tips:
+            heapq.heappush(queue, (-nodes[sha1][0], next(order), sha1))
+
+        newlist = []
+        date = None
+        slop = SLOP
+        interesting_cache = None
+        while queue:
+            _, _, sha1 = heapq.heappop(queue)
+            if sha1 == interesting_cache:
+                interesting_cache = None
+            timestamp, parents, _ = nodes[sha1]
+
+            if sha1 in uninteresting:
+                for parent in parents:
+                    uninteresting.add(parent)
+                    parse(parent)
+                    mark_parents_uninteresting(parent)
+                    if parent not in seen:
+                        push(parent)
+
+                ## stop when all pending commits are uninteresting
+                if not queue:
+                    break
+                if date is not None and date <= -queue[0][0]:
+                    slop = SLOP
+                    continue
+                if interesting_cache is None or \
+                       interesting_cache in uninteresting:
+                    interesting_cache = next(
+                        (item[2] for item in queue
+                         if item[2] not in uninteresting), None)
+                if interesting_cache is not None:
+                    slop = SLOP
+                    continue
+                slop -= 1
+                if slop:
+                    continue
+                break
+
+            for parent in parents:
+                parse(parent)
+                if parent not in seen:
+                    push(parent)
+            date = timestamp
+            newlist.append(sha1)
+
+        for sha1 in topo_order(newlist, lambda sha1: nodes[sha1][1]):
+            if sha1 not in uninteresting:
+                yield sha1, nodes[sha1][1], nodes[sha1][2]
+
+
+GIT_BACKENDS = {
+    "git": GitRepos,
+    "python": PyGitRepos,
+}
+
+
+def mergeable_regexp(regexp):
+    r"""Return True if ``regexp`` can be an alternative of a bigger regexp
+
+    Numbered back references would change, and inline flags would
+    apply to the whole regexp:
+
+        >>> mergeable_regexp(r'^[fF]ix\s*:\s*((dev|usr)\s*:\s*)?')
+        True
+        >>> mergeable_regexp(r'(a)\1')
+        False
+        >>> mergeable_regexp(r'(?i)fix')
+        False
+
+    """
+    if not isinstance(regexp, basestring):
+        return False
+    return re.search(r"\\[0-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)",
+                     regexp) is None
+
+
+def anchored_regexp(regexp):
+    r"""Return True if ``regexp`` can only match at start of string
+
+        >>> anchored_regexp(r'^[nN]ew\s*:\s*((dev|usr)\s*:\s*)?')
+        True
+        >>> anchored_regexp(r'^new|fix')
+        False
+        >>> anchored_regexp(r'^[|]new')
+        True
+        >>> anchored_regexp(r'new')
+        False
+
+    """
+    if not (regexp.startswith("^") or regexp.startswith("\\A")):
+        return False
+    depth = 0
+    idx = 1
+    while idx < len(regexp):
+        char = regexp[idx]
+        if char == "\\":
+            idx += 1
+        elif char == "[":
+            ## ``]`` is a literal as first char of a set
+            idx += 2 if regexp[idx + 1:idx + 2] == "^" else 1
+            if regexp[idx:idx + 1] == "]":
+                idx += 1
+            while idx < len(regexp) and regexp[idx] != "]":
+                idx += 2 if regexp[idx] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return False
+        idx += 1
+    return True
+
+
+class CommitClassifier(object):
+    r"""Decide if a commit subject is ignored and in which section it goes
+
+    Regexps are compiled once, and merged when possible: the ones that
+    can only match at start of subject in one regexp tried only there,
+    the others in one regexp used to know if any of them matches. So a
+    subject is usually scanned only once for each decision, and the
+    result is the same as with ``re.search`` on each regexp in turn:
+
+        >>> classifier = CommitClassifier(
+        ...     ignore_regexps=[r'!minor', r'@wip'],
+        ...     section_regexps=[('New', [r'^new:']),
+        ...                      ('Fix', [r'^fix:', r'bug']),
+        ...                      ('Other', None)])
+        >>> classifier.ignored("fix: typo !minor")
+        True
+        >>> classifier.section("fix: new: typo")
+        'Fix'
+        >>> classifier.section("new: no bug")
+        'New'
+        >>> classifier.section("some bug")
+        'Fix'
+        >>> classifier.section("other")
+        'Other'
+
+    The number of subjects decided by each regexp is kept:
+
+        >>> for stat in classifier.stats():
+        ...     print(stat)
+        ('ignore', None, '!minor', 1)
+        ('ignore', None, '@wip', 0)
+        ('section', 'New', '^new:', 1)
+        ('section', 'Fix', '^fix:', 1)
+        ('section', 'Fix', 'bug', 1)
+        ('section', 'Other', None, 1)
+
+    """
+
+    ## how regexps are tried
+    ANCHORED, FLOATING, ALONE = "anchored", "floating", "alone"
+
+    def __init__(self, ignore_regexps=[], section_regexps=[(None, '')]):
+        self.ignore_regexps = ignore_regexps
+        self.section_regexps = section_regexps
+
+        self._ignores, self._ignore_anchored, self._ignore_floating = \
+            self._compile(ignore_regexps, "i")
+
+        ## flattened regexps of sections, up to the first catch all one
+        self._labels = []
+        self._default = None
+        regexps = []
+        for label, section in section_regexps:
+            if section is None:
+                self._default = len(self._labels)
+                self._labels.append(label)
+                regexps.append(None)
+                break
+            for regexp in section:
+                self._labels.append(label)
+                regexps.append(regexp)
+        self._section_list = regexps
+        self._sections, self._section_anchored, self._section_floating = \
+            self._compile(regexps, "s")
+
+        self._ignore_hits = [0] * len(self._ignores)
+        self._section_hits = [0] * len(self._sections)
+
+    @classmethod
+    def _compile(cls, regexps, prefix):
+        """Return compiled regexps and their merged regexps
+
+        First value is a list of ``(compiled, kind)`` for each regexp.
+        Merged regexps are None when there are no regexps of their
+        kind, or when they can't be compiled (as with same group names
+        in 2 regexps), their regexps are then of kind ``ALONE``.
+
+        """
+        compiled = []
+        kinds = []
+        for regexp in regexps:
+            if regexp is None:  ## catch all section
+                compiled.append(None)
+                kinds.append(cls.ALONE)
+                continue
+            compiled.append(re.compile(regexp))
+            if not mergeable_regexp(regexp):
+                kinds.append(cls.ALONE)
+            elif anchored_regexp(regexp):
+                kinds.append(cls.ANCHORED)
+            else:
+                kinds.append(cls.FLOATING)
+
+        def merge(kind, template):
+            indexes = [idx for idx, k in enumerate(kinds) if k == kind]
+            if not indexes:
+                return None
+            try:
+                return re.compile("|".join(
+                    template % {"name": "_%s%d" % (prefix, idx),
+                                "regexp": regexps[idx]}
+                    for idx in indexes))
+            except re.error:
+                for idx in indexes:
+                    kinds[idx] = cls.ALONE
+                return None
+
+        ## The group wrapping a regexp is the last one to close, so it is
+        ## given by ``lastgroup``. Named groups would prevent ``re`` from
+        ## looking for literal prefixes, which is much slower when
+        ## searching.
+        anchored = merge(cls.ANCHORED, "(?P<%(name)s>%(regexp)s)")
+        floating = merge(cls.FLOATING, "(?:%(regexp)s)")
+        return list(zip(compiled, kinds)), anchored, floating
+
+    def ignored(self, subject):
+        """Return True if ``subject`` matches any ignore regexp
+
+        The first matching regexp, in the given order, gets the hit.
+
+        """
+        found = None
+        if self._ignore_anchored is not None:
+            ## alternatives are tried in order, this is the first one
+            match = self._ignore_anchored.match(subject)
+            if match is not None:
+                found = int(match.lastgroup[2:])
+        floating = self._ignore_floating is not None and \
+                   self._ignore_floating.search(subject) is not None
+        for idx, (compiled, kind) in enumerate(self._ignores):
+            if idx == found:
+                break
+            if kind == self.ANCHORED or \
+                   (kind == self.FLOATING and not floating):
+                continue
+            if compiled.search(subject) is not None:
+                found = idx
+                break
+        if found is None:
+            return False
+        self._ignore_hits[found] += 1
+        return True
+
+    def section(self, subject):
+        """Return the label of the first section matching ``subject``"""
+        found = None
+        if self._section_anchored is not None:
+            ## alternatives are tried in order, this is the first one
+            match = self._section_anchored.match(subject)
+            if match is not None:
+                found = int(match.lastgroup[2:])
+        floating = self._section_floating is not None and \
+                   self._section_floating.search(subject) is not None
+        for idx, (compiled, kind) in enumerate(self._sections):
+            if idx == found or idx == self._default:
+                break
+            if kind == self.ANCHORED or \
+                   (kind == self.FLOATING and not floating):
+                continue
+            if compiled.search(subject) is not None:
+                found = idx
+                break
+        else:
+            return None
+        if found is None:
+            found = self._default
+        self._section_hits[found] += 1
+        return self._labels[found]
+
+    def stats(self):
+        """Return ``(kind, label, regexp, hits)`` for each regexp
+
+        ``kind`` is ``"ignore"`` or ``"section"``, the catch all section
+        has a None ``regexp``.
+
+        """
+        return [("ignore", None, regexp, hits)
+                for regexp, hits in zip(self.ignore_regexps,
+                                        self._ignore_hits)] + \
+               [("section", label, regexp, hits)
+                for label, regexp, hits in zip(self._labels,
+                                               self._section_list,
+                                               self._section_hits)]
+
+
+def ensure_template_file_exists(label, template_name):
+    """Return template file path given a label hint and the template name
+
+    Template name can be either a filename with full path,
+    if this is the case, the label is of no use.
+
+    If ``template_name`` does not refer to an existing file,
+    then ``label`` is used to find a template file in the
+    the bundled ones.
+
+    """
+
+    if os.path.isfile(template_name):
+        return template_name
+
+    template_dir = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "templates", label)
+
+    template_path = os.path.join(template_dir, "%s.tpl" % template_name)
+
+    if not os.path.exists(template_path):
+        templates = glob.glob(os.path.join(template_dir, "*.tpl"))
+        if len(templates) > 0:
+            msg = ("These are the available %s templates:" % label)
+            msg += "\n - " + \
+                   "\n - ".join(os.path.basename(f).split(".")[0]
+                                for f in templates)
+            msg += "\nTemplates are located in %r" % template_dir
+        else:
+            msg = "No available %s templates found in %r." \
+                  % (label, template_dir)
+        die("Error: Invalid %s template name %r.\n" % (label, template_name) +
+            "%s" % msg)
+
+    return template_path
+
+
+##
+## Output Engines
+##
+
+## Size of chunks yielded by ``rest_py``
+REST_PY_CHUNK_SIZE = 64 * 1024
+
+
+@available_in_config
+def rest_py(data, opts={}):
+    """Yields ReStructured Text changelog content from data
+
+    Content is yielded in chunks of about ``REST_PY_CHUNK_SIZE``
+    characters, so it is already streamed: ``rest_py.chunks`` is
+    ``rest_py`` itself.
+
+    """
+    def rest_title(label, char="="):
+        return (label.strip() + "\n") + (char * len(label) + "\n")
+
+    def render_version(version):
+        title = "%s (%s)" % (version["tag"], version["date"]) \
+                if version["tag"] else \
+                opts["unreleased_version_label"]
+        yield rest_title(title, char="-")
+
+        sections = version["sections"]
+        nb_sections = len(sections)
+        for section in sections:
+
+            section_label = section["label"] if section.get("label", None) \
+                            else "Other"
 
             if not (section_label == "Other" and nb_sections == 1):
-                s += "\n" + rest_title(section_label, "~")
+                yield "\n" + rest_title(section_label, "~")
 
             for commit in section["commits"]:
-                s += render_commit(commit)
-        return s
+                yield render_commit(commit)
 
     def render_commit(commit, opts=opts):
         subject = commit["subject"]
         subject += " [%s]" % (", ".join(commit["authors"]), )
 
-        entry = indent('\n'.join(textwrap.wrap(subject)),
-                       first="- ").strip() + "\n"
+        ## same as ``indent('\n'.join(textwrap.wrap(subject)), first="- ")``
+        lines = wrap_lines(subject)
+        entry = "\n  ".join(
+            [("- " + (lines[0] if lines else "")).rstrip()] +
+            [line.rstrip() for line in lines[1:]]
+        ).strip() + "\n"
 
         if commit["body"]:
             entry += "\n" + indent(commit["body"])
@@ -1073,104 +3582,540 @@ def rest_py(data, opts={}):
 
         return entry
 
-    if data["title"]:
-        yield rest_title(data["title"], char="=") + "\n\n"
-
-    for version in data["versions"]:
-        if len(version["sections"]) > 0:
-            yield render_version(version) + "\n\n"
+    def chunks():
+        if data["title"]:
+            yield rest_title(data["title"], char="=") + "\n\n"
+
+        for version in data["versions"]:
+            if len(version["sections"]) > 0:
+                for chunk in render_version(version):
+                    yield chunk
+                yield "\n\n"
+
+    buf = []
+    size = 0
+    for chunk in chunks():
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= REST_PY_CHUNK_SIZE:
+            yield "".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf)
+
+rest_py.chunks = rest_py
+## Only values of the changelog data structure are used
+rest_py.log_fields = ()
 
 ## formatter engines
 
-if pystache:
+def split_mustache_section(template, name):
+    r"""Split ``template`` around its top level ``name`` section
 
-    @available_in_config
-    def mustache(template_name):
-        """Return a callable that will render a changelog data structure
+    Returns ``(before, inner, after)`` templates: rendering ``before``,
+    then ``inner`` for each element of the list ``name``, and ``after``
+    gives the same output than rendering ``template``.
 
-        returned callable must take 2 arguments ``data`` and ``opts``.
+        >>> split_mustache_section(
+        ...     "{{#t}}{{t}}{{/t}}\n{{#v}}\n- {{x}}\n{{/v}}\nEnd\n", "v")
+        ('{{#t}}{{t}}{{/t}}\n', '- {{x}}\n', 'End\n')
+
+    Returns None if there is no such section, or if ``name`` is used
+    elsewhere in the template:
+
+        >>> split_mustache_section("{{#a}}{{#v}}{{/v}}{{/a}}", "v") is None
+        True
+
+    """
+    if "{{=" in template:  ## changing delimiters is not supported
+        return None
+
+    tags = list(re.finditer(r"\{\{[{&#^/!]?\s*([^}\s]*)\s*\}?\}\}", template))
+    if len([tag for tag in tags if tag.group(1) == name]) != 2:
+        return None
+
+    def section_tag(tag):
+        c = tag.group(0)[2]
+        return c if c in "#^/" else None
+
+    ## find the opening tag and its closing one at depth 0
+    depth = 0
+    start = end = None
+    for tag in tags:
+        kind = section_tag(tag)
+        if kind in ("#", "^"):
+            if tag.group(1) == name and kind == "#" and depth == 0:
+                start = tag
+            depth += 1
+        elif kind == "/":
+            depth -= 1
+            if tag.group(1) == name and depth == 0 and start is not None:
+                end = tag
+    if start is None or end is None:
+        return None
+
+    def standalone_span(tag):
+        """Span of ``tag`` including its line if it is alone on it
+
+        As ``pystache`` does, only blanks before the tag are allowed.
 
         """
-        template_path = ensure_template_file_exists("mustache", template_name)
-
-        with open(template_path) as f:
-            template = f.read()
-
-        def stuffed_versions(versions, opts):
-            for version in versions:
-                title = "%s (%s)" % (version["tag"], version["date"]) \
-                        if version["tag"] else \
-                        opts["unreleased_version_label"]
-                version["label"] = title
-                version["label_chars"] = list(version["label"])
-                for section in version["sections"]:
-                    section["label_chars"] = list(section["label"])
-                    section["display_label"] = \
-                        not (section["label"] == "Other" and
-                             len(version["sections"]) == 1)
-                    for commit in section["commits"]:
-                        commit["author_names_joined"] = ", ".join(
-                            commit["authors"])
-                        commit["body_indented"] = indent(commit["body"])
-                yield version
+        begin, end = tag.start(), tag.end()
+        while begin > 0 and template[begin - 1] in " \t":
+            begin -= 1
+        if (begin == 0 or template[begin - 1] in "\r\n") and \
+               (end == len(template) or template[end] in "\r\n"):
+            if template.startswith("\r", end):
+                end += 1
+            if template.startswith("\n", end):
+                end += 1
+            return begin, end
+        return tag.start(), tag.end()
 
-        def renderer(data, opts):
+    start_span, end_span = standalone_span(start), standalone_span(end)
+    return (template[:start_span[0]],
+            template[start_span[1]:end_span[0]],
+            template[end_span[1]:])
 
-            ## mustache is very simple so we need to add some intermediate
-            ## values
-            data["general_title"] = True if data["title"] else False
-            data["title_chars"] = list(data["title"]) if data["title"] else []
 
-            data["versions"] = stuffed_versions(data["versions"], opts)
+## Parsed mustache templates by path, see ``mustache_template()``
+_mustache_templates = {}
 
-            return pystache.render(template, data)
 
-        return renderer
+def mustache_template(template_path):
+    """Return parsed mustache template at ``template_path``
 
-else:
+    Returns ``(parsed, parts)``, with ``parts`` the parsed templates
+    given by ``split_mustache_section(.., "versions")``, and ``parsed``
+    the whole parsed template only if there are no ``parts``.
+
+    Results are kept and reused as long as the file is not modified.
 
-    @available_in_config
-    def mustache(template_name):
+    """
+    import pystache
+
+    stat = os.stat(template_path)
+    key = os.path.realpath(template_path)
+    stamp = (getattr(stat, "st_mtime_ns", stat.st_mtime), stat.st_size)
+    cached = _mustache_templates.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(template_path) as f:
+        template = f.read()
+
+    parts = split_mustache_section(template, "versions")
+    if parts is None:
+        result = (pystache.parse(template), None)
+    else:
+        result = (None, [pystache.parse(part) for part in parts])
+    _mustache_templates[key] = (stamp, result)
+    return result
+
+
+@available_in_config
+def mustache(template_name):
+    """Return a callable that will render a changelog data structure
+
+    returned callable must take 2 arguments ``data`` and ``opts``. Its
+    ``chunks`` attribute takes the same arguments and yields the
+    content version by version when the template allows it.
+
+    """
+    ## imported only when used, to keep startup fast
+    try:
+        import pystache
+    except ImportError:
         die("Required 'pystache' python module not found.")
 
+    template_path = ensure_template_file_exists("mustache", template_name)
+
+    ## versions are rendered, and output, one after the other if
+    ## ``parts`` is not None
+    parsed, parts = mustache_template(template_path)
+
+    def stuffed_versions(versions, opts):
+        for version in versions:
+            title = "%s (%s)" % (version["tag"], version["date"]) \
+                    if version["tag"] else \
+                    opts["unreleased_version_label"]
+            version["label"] = title
+            version["label_chars"] = list(version["label"])
+            for section in version["sections"]:
+                section["label_chars"] = list(section["label"])
+                section["display_label"] = \
+                    not (section["label"] == "Other" and
+                         len(version["sections"]) == 1)
+                for commit in section["commits"]:
+                    commit["author_names_joined"] = ", ".join(
+                        commit["authors"])
+                    commit["body_indented"] = indent(commit["body"])
+            yield version
+
+    def chunks(data, opts):
+        """Yield rendered template with one chunk per version"""
+
+        ## mustache is very simple so we need to add some intermediate
+        ## values
+        data["general_title"] = True if data["title"] else False
+        data["title_chars"] = list(data["title"]) if data["title"] else []
+
+        data["versions"] = stuffed_versions(data["versions"], opts)
+
+        renderer = pystache.Renderer()
+        if parts is None:
+            yield renderer.render(parsed, data)
+            return
+        before, inner, after = parts
+        yield renderer.render(before, data)
+        for version in data["versions"]:
+            yield renderer.render(inner, data, version)
+        yield renderer.render(after, data)
+
+    def renderer(data, opts):
+        return "".join(chunks(data, opts))
+
+    renderer.chunks = chunks
+    if not os.path.isfile(template_name):
+        ## bundled templates don't use the ``commit`` objects
+        renderer.log_fields = ()
+    return renderer
+
+
+class _RenderAborted(Exception):
+    pass
+
+
+def threaded_chunks(render, size=65536, maxsize=16):
+    """Iterate on the output written by ``render(out)`` in a thread
+
+    ``out`` is a file like object, what is written to it is given by
+    chunks of about ``size`` characters. At most ``maxsize`` chunks are
+    waiting to be consumed, so memory use doesn't depend on the size of
+    the whole output:
+
+        >>> def render(out):
+        ...     for i in range(5):
+        ...         out.write("%d," % i)
+        >>> list(threaded_chunks(render, size=4))
+        ['0,1,', '2,3,', '4,']
+
+    Exceptions of ``render`` are raised by the iterator, and ``render``
+    is stopped at its next write if the iterator is closed.
+
+    """
+    chunks = queue.Queue(maxsize)
+    aborted = []
+
+    class Out(object):
+
+        def __init__(self):
+            self.buf = []
+            self.length = 0
+
+        def write(self, text):
+            if aborted:
+                raise _RenderAborted()
+            self.buf.append(text)
+            self.length += len(text)
+            if self.length >= size:
+                self.flush()
+
+        def flush(self):
+            if self.buf:
+                chunks.put((None, "".join(self.buf)))
+                self.buf = []
+                self.length = 0
+
+    def run():
+        try:
+            out = Out()
+            render(out)
+            out.flush()
+            chunks.put((None, None))
+        except _RenderAborted:
+            pass
+        except BaseException as e:  ## pylint: disable=broad-except
+            chunks.put((e, None))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            exc, chunk = chunks.get()
+            if exc is not None:
+                raise exc
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        aborted.append(True)
+        ## make room for a ``render`` waiting to put a chunk
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.05)
+            except queue.Empty:
+                pass
 
-if mako:
 
-    import mako.template
+mako_env = dict((f.__name__, f) for f in (ucfirst, indent, textwrap,
+                                          paragraph_wrap))
 
-    mako_env = dict((f.__name__, f) for f in (ucfirst, indent, textwrap,
-                                              paragraph_wrap))
 
-    @available_in_config
-    def makotemplate(template_name):
-        """Return a callable that will render a changelog data structure
+def user_cache_dir(*path):
+    """Return path of ``gitchangelog`` cache directory of the user
 
-        returned callable must take 2 arguments ``data`` and ``opts``.
+    As given by the XDG base directory specification.
 
-        """
-        template_path = ensure_template_file_exists("mako", template_name)
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or \
+           os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "gitchangelog", *path)
 
-        template = mako.template.Template(filename=template_path)
 
-        def renderer(data, opts):
-            kwargs = mako_env.copy()
-            kwargs.update({"data": data,
-                           "opts": opts})
-            return template.render(**kwargs)
+@available_in_config
+def makotemplate(template_name, module_directory=None):
+    """Return a callable that will render a changelog data structure
 
-        return renderer
+    returned callable must take 2 arguments ``data`` and ``opts``. Its
+    ``chunks`` attribute takes the same arguments and yields the
+    content while the template is rendered.
 
-else:
+    Templates are compiled in memory, unless ``module_directory`` is
+    given: compiled python modules are then stored in this directory,
+    and templates are only compiled again when modified. ``True`` stands
+    for a directory in ``user_cache_dir()``. Templates are compiled in
+    memory if the directory can't be written.
 
-    @available_in_config
-    def makotemplate(template_name):
+    """
+    ## imported only when used, to keep startup fast
+    try:
+        import mako.runtime
+        import mako.template
+    except ImportError:
         die("Required 'mako' python module not found.")
 
+    template_path = ensure_template_file_exists("mako", template_name)
+
+    if module_directory is True:
+        module_directory = user_cache_dir("mako-py%d" % sys.version_info[0])
+    try:
+        template = mako.template.Template(
+            filename=template_path, module_directory=module_directory or None)
+    except (IOError, OSError):
+        if not module_directory:
+            raise
+        ## cache directory is not writable, compile in memory
+        template = mako.template.Template(filename=template_path)
+
+    def template_kwargs(data, opts):
+        kwargs = mako_env.copy()
+        kwargs.update({"data": data,
+                       "opts": opts})
+        return kwargs
+
+    def renderer(data, opts):
+        return template.render(**template_kwargs(data, opts))
+
+    def chunks(data, opts):
+        kwargs = template_kwargs(data, opts)
+        ## rendering is done in a thread, to stream its output
+        return threaded_chunks(lambda out: template.render_context(
+            mako.runtime.Context(out, **kwargs)))
+
+    renderer.chunks = chunks
+    if not os.path.isfile(template_name):
+        ## bundled templates don't use the ``commit`` objects
+        renderer.log_fields = ()
+    return renderer
+
 
 ##
 ## Data Structure
 ##
 
+class ChangelogSnapshot(object):
+    """Versions data of a previous run, to be reused by next runs
+
+    A snapshot stores the refs it was computed from (the ``HEAD`` sha1
+    and the list of version tags with their sha1) along with the data of
+    each version. A version can be reused as long as its tag and all the
+    older version tags are unchanged, as these are all that define the
+    commits of a version.
+
+    ``key`` identifies everything else that has an impact on the
+    versions data (mainly configuration). A snapshot made with a
+    different key is ignored.
+
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+
+    def load(self):
+        """Return stored snapshot as a dict, or None if not usable"""
+        import json
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if snapshot.get("key") != self.key:
+            return None
+        return snapshot
+
+    def save(self, head, tags, versions):
+        """Atomically store a new snapshot
+
+        :param head: sha1 of ``HEAD`` or None if not part of the versions
+        :param tags: list of ``[tag_name, sha1]`` of tags, oldest first
+        :param versions: dict of versions data by tag name (``HEAD``
+            included)
+
+        """
+        import json
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".snapshot-")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": self.key, "head": head, "tags": tags,
+                       "versions": versions}, f)
+        getattr(os, "replace", os.rename)(tmp_path, self.path)
+
+
+def version_to_json(version):
+    """Return a json serializable copy of a version data structure"""
+    return {
+        "date": version["date"],
+        "tag": version["tag"],
+        "sections": [
+            {"label": section["label"],
+             "commits": [dict([(k, v) for k, v in commit.items()
+                               if k != "commit"] +
+                              [("sha1", commit["commit"].sha1)])
+                         for commit in section["commits"]]}
+            for section in version["sections"]],
+    }
+
+
+def version_from_json(repository, version):
+    """Return a version data structure from ``version_to_json()`` output"""
+    for section in version["sections"]:
+        for commit in section["commits"]:
+            commit["commit"] = repository.commit(commit.pop("sha1"))
+    return version
+
+
+def ordered_imap(fun, iterable, workers):
+    """Same as ``imap(..)`` but computing results in a pool of threads
+
+    At most ``2 * workers`` results are computed ahead of the one being
+    consumed, and results are given in the order of ``iterable``.
+
+        >>> list(ordered_imap(lambda x: x * 2, range(10), workers=3))
+        [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+
+    """
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(workers)
+    try:
+        pending = collections.deque()
+        for item in iterable:
+            pending.append(pool.apply_async(fun, (item, )))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def tags_until(repository, tags, max_rev):
+    """Oldest first ``tags`` that don't contain commit ``max_rev``
+
+    ``tags`` are cut at the first one from which ``max_rev`` is
+    reachable, this one being kept only if it is ``max_rev`` itself.
+
+    """
+    descendants = repository.ancestry.reaching(
+        max_rev, [tag.sha1 for tag in tags])
+    new_tags = []
+    for tag in tags:
+        if tag.sha1 in descendants and tag.sha1 != max_rev:
+            break
+        new_tags.append(tag)
+    return new_tags
+
+
+def process_texts(process, texts):
+    """Return ``process`` applied to each of ``texts``
+
+    ``TextProc`` pipelines process them all at once.
+
+    """
+    if isinstance(process, TextProc):
+        return process.map(texts)
+    return [process(text) for text in texts]
+
+
+def version_data(tag, commits,
+                 ignore_regexps=[],
+                 section_regexps=[(None, '')],
+                 body_process=lambda x: x,
+                 subject_process=lambda x: x,
+                 classifier=None):
+    """Return the version data structure of ``commits`` of ``tag``
+
+    ``sections`` of the result is empty if all commits were ignored.
+    ``classifier`` is a ``CommitClassifier``, built from
+    ``ignore_regexps`` and ``section_regexps`` if not given.
+
+    """
+    if classifier is None:
+        classifier = CommitClassifier(ignore_regexps, section_regexps)
+    version = {"date": tag.date}
+    version["tag"] = tag.identifier \
+                     if tag.identifier != "HEAD" else \
+                     None
+
+    sections = collections.defaultdict(list)
+
+    ## Authors first: reading trailers removes them from the body
+    kept = [(classifier.section(commit.subject), commit,
+             commit.author_name, commit.author_names)
+            for commit in commits
+            if not classifier.ignored(commit.subject)]
+
+    ## Texts of the version are processed together
+    subjects = process_texts(subject_process,
+                             [commit.subject for _s, commit, _a, _n in kept])
+    bodies = process_texts(body_process,
+                           [commit.body for _s, commit, _a, _n in kept])
+
+    for (matched_section, commit, author, authors), subject, body in \
+            zip(kept, subjects, bodies):
+
+        ## Finally storing the commit in the matching section
+
+        sections[matched_section].append({
+            "author": author,
+            "authors": authors,
+            "subject": subject,
+            "body": body,
+            "commit": commit,
+        })
+
+    version["sections"] = [{"label": k, "commits": sections[k]}
+                           for k, _v in classifier.section_regexps
+                           if k in sections]
+    return version
+
+
 def versions_data_iter(repository, revlist=None,
                        ignore_regexps=[],
                        section_regexps=[(None, '')],
@@ -1179,6 +4124,11 @@ def versions_data_iter(repository, revlist=None,
                        body_process=lambda x: x,
                        subject_process=lambda x: x,
                        log_encoding=DEFAULT_GIT_LOG_ENCODING,
+                       single_pass_log=False,
+                       incremental=None,
+                       log_workers=1,
+                       log_fields=None,
+                       classifier=None,
                        warn=warn,        ## Mostly used for test
                        ):
     """Returns an iterator through versions data structures
@@ -1194,6 +4144,23 @@ def versions_data_iter(repository, revlist=None,
     :param body_process: text processing object to apply to body
     :param subject_process: text processing object to apply to subject
     :param log_encoding: the encoding used in git logs
+    :param single_pass_log: whether to use only one ``git log`` for all
+        versions instead of one per tag (see ``GitRepos.tagged_log(..)``)
+    :param incremental: if not None, a string identifying the
+        configuration used (as a hash of config files). Versions
+        computed by the previous run with the same ``incremental``
+        value are reused when their tags didn't change, and only
+        new commits and tags are read (see ``ChangelogSnapshot``).
+    :param log_workers: number of versions whose commits are read and
+        parsed concurrently, each with its own ``git log``. Versions are
+        still given in order. Not used with ``single_pass_log``.
+    :param log_fields: ``GIT_FORMAT_KEYS`` of commits used by the
+        caller, in addition to ``VERSION_DATA_FIELDS``. Only these are
+        requested to ``git log``, others are read on first access.
+        Default is to request all of them.
+    :param classifier: ``CommitClassifier`` to use instead of one
+        built from ``ignore_regexps`` and ``section_regexps``, as to
+        read its hit statistics afterwards.
     :param warn: callable to output warnings, mocked by tests
 
     :returns: iterator of versions data_structures
@@ -1201,21 +4168,30 @@ def versions_data_iter(repository, revlist=None,
     """
 
     revlist = revlist or []
-
-    ## Hash to speedup lookups
-    versions_done = {}
+    fields = None if log_fields is None else \
+             set(log_fields) | set(VERSION_DATA_FIELDS)
+    if classifier is None:
+        classifier = CommitClassifier(ignore_regexps, section_regexps)
 
     excludes = [rev[1:]
-                for rev in swrap("git rev-parse --rev-only %s --"
-                                 % " ".join(protect_rev(rev)
-                                            for rev in revlist)).split("\n")
+                for rev in repository.swrap(
+                    ["git", "rev-parse", "--rev-only"] + revlist + ["--"]
+                ).split("\n")
                 if rev.startswith("^")] if revlist else []
-    ## Note that ``--reverse -n 1`` still returns the first and not
-    ## the last element
-    contains = swrap("git rev-list %s"
-                     % " ".join(protect_rev(rev)
-                                for rev in revlist)
-                     ).split("\n")[-1] if revlist else None
+
+    contains = max_rev = None
+    if revlist:
+        ## Only one walk of the revlist to get its newest and oldest
+        ## commits, parents it gives are kept for ancestry queries.
+        walk = [line.split()
+                for line in repository.swrap(
+                    ["git", "rev-list", "--parents"] + revlist + ["--"]
+                ).split("\n")
+                if line]
+        repository.ancestry.learn(dict((node[0], node[1:])
+                                       for node in walk))
+        if walk:
+            max_rev, contains = walk[0][0], walk[-1][0]
 
     tags = [tag
             for tag in repository.tags(contains=contains)
@@ -1230,65 +4206,111 @@ def versions_data_iter(repository, revlist=None,
     tags.append(repository.commit("HEAD"))
 
     if revlist:
-        max_rev = repository.commit(swrap(
-            "git rev-list -n 1 %s"
-            % " ".join(protect_rev(rev)
-                       for rev in revlist))) if revlist else None
-        new_tags = []
-        for tag in tags:
-            if max_rev < tag:
+        ## Revlists holding only excludes (as ``^1.2``) stop at ``HEAD``
+        tags = tags_until(repository, tags,
+                          max_rev or repository.commit("HEAD").sha1)
+
+    ## Versions reused from the previous incremental run, oldest first
+    reused = []
+    if incremental is not None:
+        key = hashlib.sha1(repr((
+            incremental, revlist, excludes, classifier.ignore_regexps,
+            classifier.section_regexps,
+            tag_filter_regexp, include_merge, log_encoding, __version__,
+        )).encode("utf-8")).hexdigest()
+        snapshot = ChangelogSnapshot(
+            os.path.join(repository.gitdir, "gitchangelog", "snapshot.json"),
+            key)
+        previous = snapshot.load() or {"head": None, "tags": [],
+                                       "versions": {}}
+        for idx, tag in enumerate(tags):
+            if tag.identifier == "HEAD":
+                ## Only if there was no other change
+                if len(reused) != len(previous["tags"]) or \
+                       previous["head"] != tag.sha1:
+                    break
+            elif idx >= len(previous["tags"]) or \
+                     previous["tags"][idx] != [tag.identifier, tag.sha1]:
                 break
-            new_tags.append(tag)
-        tags = new_tags
-
-    section_order = [k for k, _v in section_regexps]
+            if tag.identifier not in previous["versions"]:
+                break
+            reused.append(tag)
+        snapshot_versions = {}
 
     tags = list(reversed(tags))
+    fresh_tags = tags[:len(tags) - len(reused)]
 
     ## Get the changes between tags (releases)
-    for idx, tag in enumerate(tags):
-
-        ## New version
-        current_version = {"date": tag.date}
-        current_version["tag"] = tag.identifier \
-                                 if tag.identifier != "HEAD" else \
-                                 None
-
-        sections = collections.defaultdict(list)
-        commits = repository.log(
-            includes=[tag],
-            excludes=tags[idx + 1:] + excludes,
+    if single_pass_log:
+        tagged_commits = repository.tagged_log(
+            fresh_tags, excludes=tags[len(fresh_tags):] + excludes,
             include_merge=include_merge,
-            encoding=log_encoding)
-
-        for commit in commits:
-            if any(re.search(pattern, commit.subject) is not None
-                   for pattern in ignore_regexps):
-                continue
-
-            matched_section = first_matching(section_regexps, commit.subject)
-
-            ## Finally storing the commit in the matching section
-
-            sections[matched_section].append({
-                "author": commit.author_name,
-                "authors": commit.author_names,
-                "subject": subject_process(commit.subject),
-                "body": body_process(commit.body),
-                "commit": commit,
-            })
+            encoding=log_encoding,
+            fields=fields)
+    elif log_workers > 1:
+        def fetch(idx):
+            commits = list(repository.log(
+                includes=[tags[idx]],
+                excludes=tags[idx + 1:] + excludes,
+                include_merge=include_merge,
+                encoding=log_encoding,
+                fields=fields))
+            ## parsing trailers is also done in the worker
+            for commit in commits:
+                if not commit._trailer_parsed:
+                    commit._parse_trailers()
+            return tags[idx], commits
+
+        tagged_commits = ordered_imap(fetch, range(len(fresh_tags)),
+                                      workers=log_workers)
+    else:
+        tagged_commits = (
+            (tag, repository.log(
+                includes=[tag],
+                excludes=tags[idx + 1:] + excludes,
+                include_merge=include_merge,
+                encoding=log_encoding,
+                fields=fields))
+            for idx, tag in enumerate(fresh_tags))
+
+    if reused:
+        tagged_commits = itertools.chain(
+            tagged_commits,
+            ((tag, None) for tag in reversed(reused)))
+
+    for tag, commits in tagged_commits:
+
+        if commits is None:  ## reused from previous incremental run
+            version = previous["versions"][tag.identifier]
+            snapshot_versions[tag.identifier] = version
+            version = version_from_json(repository, copy.deepcopy(version))
+            if len(version["sections"]) != 0:
+                yield version
+            continue
 
-        ## Flush current version
-        current_version["sections"] = [{"label": k, "commits": sections[k]}
-                                       for k in section_order
-                                       if k in sections]
+        current_version = version_data(
+            tag, commits,
+            body_process=body_process,
+            subject_process=subject_process,
+            classifier=classifier)
+        if incremental is not None:
+            snapshot_versions[tag.identifier] = \
+                version_to_json(current_version)
         if len(current_version["sections"]) != 0:
             yield current_version
-        versions_done[tag] = current_version
+
+    if incremental is not None:
+        head = [tag.sha1 for tag in tags if tag.identifier == "HEAD"]
+        snapshot.save(
+            head=head[0] if head else None,
+            tags=[[tag.identifier, tag.sha1] for tag in reversed(tags)
+                  if tag.identifier != "HEAD"],
+            versions=snapshot_versions)
 
 
 def changelog(output_engine=rest_py,
               unreleased_version_label="unreleased",
+              stream=False,
               warn=warn,        ## Mostly used for test
               **kwargs):
     """Returns a string containing the changelog of given repository
@@ -1302,13 +4324,21 @@ def changelog(output_engine=rest_py,
     ``versions_data_iter(..)``.
 
     :param unreleased_version_label: version label for untagged commits
-    :param output_engine: callable to render the changelog data
+    :param output_engine: callable to render the changelog data. Its
+        ``log_fields`` attribute, if any, is the default value of
+        ``log_fields``.
+    :param stream: if True, use the ``chunks`` attribute of
+        ``output_engine``, if any, to render the changelog data
     :param warn: callable to output warnings, mocked by tests
 
-    :returns: content of changelog
+    :returns: output of ``output_engine``, the content of changelog or
+        an iterator on its chunks
 
     """
 
+    if "log_fields" not in kwargs:
+        kwargs["log_fields"] = getattr(output_engine, "log_fields", None)
+
     opts = {
         'unreleased_version_label': unreleased_version_label,
     }
@@ -1329,6 +4359,8 @@ def changelog(output_engine=rest_py,
     else:
         changelog["versions"] = itertools.chain([first_version], versions)
 
+    if stream:
+        output_engine = getattr(output_engine, "chunks", output_engine)
     return output_engine(data=changelog, opts=opts)
 
 ##
@@ -1405,6 +4437,12 @@ def parse_cmd_line(usage, description, epilog, exname, version):
     parser.add_argument('-d', '--debug',
                         help="Enable debug mode (show full tracebacks).",
                         action="store_true", dest="debug")
+    parser.add_argument('-o', '--output',
+                        help="Write changelog in FILE (utf-8 encoded) "
+                        "instead of\nstandard output. FILE is only "
+                        "replaced once the changelog\nis complete, and "
+                        "is left untouched if already up to date.",
+                        action="store", dest="output", metavar="FILE")
     parser.add_argument('revlist', nargs='*', action="store", default=[])
 
     ## Remove "show" as first argument for compatibility reason.
@@ -1447,12 +4485,26 @@ def get_revision(repository, config, opts):
             die("Invalid type for revision in revs list from config file. "
                 "'str' type is required, and a %r was given."
                 % type(rev).__name__)
+
+    ## All revisions are checked at once, only on failure are they
+    ## checked one by one to report the invalid one.
+    if revs:
         try:
-            repository.swrap("git rev-parse --rev-only %s --" % protect_rev(rev))
-        except ShellError:
+            repository.swrap(["git", "rev-parse", "--rev-only"] + revs + ["--"])
+        except ShellError as e:
+            for rev in revs:
+                try:
+                    repository.swrap(
+                        ["git", "rev-parse", "--rev-only", rev, "--"])
+                except ShellError:
+                    if DEBUG:
+                        raise
+                    die("Revision %r is not valid." % rev)
+            ## each one is valid, but not all of them together
             if DEBUG:
                 raise
-            die("Revision %r is not valid." % rev)
+            die("Revisions %r are not valid together: %s"
+                % (" ".join(revs), str(e)))
 
     if revs == ["HEAD", ]:
         return []
@@ -1475,6 +4527,54 @@ def get_log_encoding(repository, config):
     return log_encoding or DEFAULT_GIT_LOG_ENCODING
 
 
+def write_file_atomically(path, chunks, encoding="utf-8",
+                          buffersize=1024 * 1024):
+    """Write text ``chunks`` to ``path`` unless it has already this content
+
+    Content is written to a temporary file in the same directory, that
+    then replaces ``path``: readers never see a partial file, and
+    ``path`` is left untouched on errors. Returns False if ``path`` had
+    already the same content, and was not written.
+
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=dirname, prefix=".%s-" % os.path.basename(path))
+    try:
+        digest = hashlib.sha1()
+        size = 0
+        with os.fdopen(fd, "wb", buffersize) as f:
+            for chunk in chunks:
+                data = chunk.encode(encoding)
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+
+        if os.path.isfile(path) and os.path.getsize(path) == size:
+            previous = hashlib.sha1()
+            with open(path, "rb") as f:
+                for data in iter(lambda: f.read(buffersize), b""):
+                    previous.update(data)
+            if previous.digest() == digest.digest():
+                os.remove(tmp_path)
+                return False
+
+        ## ``mkstemp`` creates files only readable by their owner
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o7777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        getattr(os, "replace", os.rename)(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
 ##
 ## Config Manager
 ##
@@ -1516,6 +4616,9 @@ def main():
                           version=__version__)
     DEBUG = DEBUG or opts.debug
 
+    ## relative to the current directory, before moving to the toplevel
+    output_path = os.path.abspath(opts.output) if opts.output else None
+
     try:
         repository = GitRepos(".")
     except EnvironmentError as e:
@@ -1527,6 +4630,8 @@ def main():
             die(repr(e2))
 
     try:
+        ## One ``git config`` call for all keys read before rendering
+        repository.use_config_snapshot()
         gc_rc = repository.config.get("gitchangelog.rc-path")
     except ShellError as e:
         stderr(
@@ -1568,10 +4673,118 @@ def main():
 
     config = Config(config)
 
+    git_backend = config.get("git_backend", "git")
+    if git_backend not in GIT_BACKENDS:
+        die("Invalid value %r for 'git_backend' option, "
+            "supported values are: %s."
+            % (git_backend, ", ".join(sorted(GIT_BACKENDS))))
+    if not isinstance(repository, GIT_BACKENDS[git_backend]):
+        repository.close()
+        git_config = repository.config  ## keeps the config snapshot
+        try:
+            repository = GIT_BACKENDS[git_backend](repository._orig_path)
+        except EnvironmentError as e:
+            if DEBUG:
+                raise
+            die(str(e))
+        repository._config = git_config
+
+    log_workers = config.get("log_workers", 1)
+    if not isinstance(log_workers, int) or log_workers < 1:
+        die("Invalid value %r for 'log_workers' option, "
+            "a positive integer is required." % (log_workers, ))
+
+    ## Default is given by the output engine
+    log_fields = {}
+    if config.get("log_fields", None) is not None:
+        log_fields["log_fields"] = config["log_fields"]
+        unknown = [f for f in log_fields["log_fields"]
+                   if f not in GIT_FORMAT_KEYS]
+        if unknown:
+            die("Invalid value %r for 'log_fields' option, "
+                "supported fields are: %s."
+                % (unknown[0], ", ".join(sorted(GIT_FORMAT_KEYS))))
+
     log_encoding = get_log_encoding(repository, config)
     revlist = get_revision(repository, config, opts)
     manage_obsolete_options(config)
 
+    config_hash = hashlib.sha1()
+    for fname in (reference_config, changelogrc):
+        if fname and os.path.isfile(os.path.expanduser(fname)):
+            with open(os.path.expanduser(fname), "rb") as f:
+                config_hash.update(f.read())
+    config_hash = config_hash.hexdigest()
+
+    ## Previous incremental run is reusable if config files didn't change
+    incremental = None
+    if config.get("incremental", False):
+        incremental = config_hash
+
+    text_cache_size = config.get("text_cache_size", 0)
+    if not isinstance(text_cache_size, int) or text_cache_size < 0:
+        die("Invalid value %r for 'text_cache_size' option, "
+            "a positive integer or 0 is required." % (text_cache_size, ))
+    text_cache = None
+    if config.get("text_cache", False):
+        try:
+            text_cache = TextCache(os.path.join(
+                repository.gitdir, "gitchangelog", "texts.db"))
+        except EnvironmentError as e:
+            if DEBUG:
+                raise
+            die(str(e))
+
+    text_procs = [("body_process", config.get("body_process", noop)),
+                  ("subject_process", config.get("subject_process", noop))]
+    if DEBUG:
+        for _label, proc in text_procs:
+            if isinstance(proc, TextProc):
+                proc.enable_timing()
+    if text_cache_size or text_cache is not None:
+        ## Stored results are only reusable with the same config files
+        text_procs = [
+            (label, MemoizedTextProc(
+                proc, size=text_cache_size, store=text_cache,
+                key=hashlib.sha1(("%s:%s:%s" % (
+                    config_hash, label, __version__)).encode("utf-8")
+                ).hexdigest()))
+            for label, proc in text_procs]
+
+    compat_encode = lambda str: str if PY3 else str.encode(_preferred_encoding)
+
+    def output(chunk):
+        try:
+            print(compat_encode(chunk), end='')
+        except UnicodeEncodeError:
+            if DEBUG:
+                raise
+            stderr("""\
+UnicodeEncodeError:
+  There was a problem outputing the resulting changelog to your console.
+
+  This probably means that the changelog contains characters that can't
+  be translated to characters in your current charset (%s).
+""" % sys.stdout.encoding)
+            if WIN32 and PY_VERSION < 3.6 and sys.stdout.encoding != 'utf-8':
+                ## As of PY 3.6, encoding is now ``utf-8`` regardless of
+                ## PYTHONIOENCODING
+                ## https://www.python.org/dev/peps/pep-0528/
+                stderr("  You might want to try to fix that by setting "
+                       "PYTHONIOENCODING to 'utf-8'.")
+            exit(1)
+
+    ## opened last, as closed only once the changelog is output
+    if config.get("commit_cache", False):
+        try:
+            repository.use_commit_cache()
+        except EnvironmentError as e:
+            if text_cache is not None:
+                text_cache.close()
+            if DEBUG:
+                raise
+            die(str(e))
+
     try:
         content = changelog(
             repository=repository, revlist=revlist,
@@ -1580,11 +4793,37 @@ def main():
             unreleased_version_label=config['unreleased_version_label'],
             tag_filter_regexp=config['tag_filter_regexp'],
             output_engine=config.get("output_engine", rest_py),
+            stream=True,
             include_merge=config.get("include_merge", True),
-            body_process=config.get("body_process", noop),
-            subject_process=config.get("subject_process", noop),
+            single_pass_log=config.get("single_pass_log", False),
+            incremental=incremental,
+            log_workers=log_workers,
+            body_process=text_procs[0][1],
+            subject_process=text_procs[1][1],
             log_encoding=log_encoding,
+            **log_fields
         )
+
+        ## Versions are read and rendered while being output
+        if not isinstance(content, Iterator):
+            content = [content]
+        if output_path is not None:
+            if not write_file_atomically(output_path, content) and DEBUG:
+                stderr("%r is already up to date." % output_path)
+        else:
+            for chunk in content:
+                output(chunk)
+
+        if DEBUG:
+            for label, proc in text_procs:
+                if isinstance(proc, TextProc):
+                    stderr("Time spent in %s stages:" % label)
+                    for name, texts, seconds in proc.timings():
+                        stderr("  %8.3fs %7d texts  %s"
+                               % (seconds, texts, name))
+                if isinstance(proc, MemoizedTextProc):
+                    stderr("  %d cached results used, %d computed"
+                           % (proc.hits, proc.misses))
     except KeyboardInterrupt:
         if DEBUG:
             err("Keyboard interrupt received while running '%s':"
@@ -1605,32 +4844,11 @@ def main():
                    "or use ``--debug`` to see full traceback)" %
                    (debug_varname, ))
         exit(255)
-
-    compat_encode = lambda str: str if PY3 else str.encode(_preferred_encoding)
-
-    try:
-        if isinstance(content, collections.Iterator):
-            for chunk in content:
-                print(compat_encode(chunk), end='')
-        else:
-            print(compat_encode(content), end='')
-    except UnicodeEncodeError:
-        if DEBUG:
-            raise
-        stderr("""\
-UnicodeEncodeError:
-  There was a problem outputing the resulting changelog to your console.
-
-  This probably means that the changelog contains characters that can't
-  be translated to characters in your current charset (%s).
-""" % sys.stdout.encoding)
-        if WIN32 and PY_VERSION < 3.6 and sys.stdout.encoding != 'utf-8':
-            ## As of PY 3.6, encoding is now ``utf-8`` regardless of
-            ## PYTHONIOENCODING
-            ## https://www.python.org/dev/peps/pep-0528/
-            stderr("  You might want to try to fix that by setting "
-                   "PYTHONIOENCODING to 'utf-8'.")
-        exit(1)
+    finally:
+        ## stops the ``git cat-file`` process and closes the commit cache
+        repository.close()
+        if text_cache is not None:
+            text_cache.close()
 
 ##
 ## Launch program
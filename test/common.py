@@ -124,6 +124,7 @@ class BaseGitReposTest(BaseTmpDirTest):
             "repos",
             email="committer@example.com",
             user="The Committer")
+        os.chdir("repos")
 
     @property
     def raw_changelog(self):
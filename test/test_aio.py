@@ -0,0 +1,163 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``gitchangelog.aio`` asyncio API
+
+Changelogs must be the same than the ones of ``changelog(..)``, and
+no ``git`` command must be run in the thread of the event loop.
+
+"""
+
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from .common import BaseGitReposTest, w, simple_renderer
+from gitchangelog import gitchangelog
+
+try:
+    import asyncio
+    from gitchangelog import aio
+except (ImportError, SyntaxError):  ## python < 3.7
+    aio = None
+
+
+@unittest.skipIf(aio is None, "asyncio API requires python 3.7")
+class TestAsyncChangelog(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestAsyncChangelog, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second
+
+Co-Authored-By: Bob <bob@example.com>' --allow-empty
+            git tag 0.2
+            git commit -m 'chg: ignored !minor' --allow-empty
+            git tag 0.3
+
+            git checkout -b side
+            git commit -m 'new: on side' --allow-empty
+            git checkout master
+            git commit -m 'fix: third' --allow-empty
+            git merge -q --no-ff -m 'merge side' side
+            git tag 0.4
+            git commit -m 'chg: unreleased' --allow-empty
+
+        """)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        super(TestAsyncChangelog, self).tearDown()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def changelog_async(self, **kwargs):
+        return self.run_async(aio.changelog_async(
+            repository=self.repos, output_engine=simple_renderer,
+            ignore_regexps=[r"!minor"], **kwargs))
+
+    def test_same_changelog(self):
+        for revlist in (None, ["0.2..0.4"], ["^0.2"], ["0.3"]):
+            reference = self.simple_changelog(
+                revlist=revlist, ignore_regexps=[r"!minor"])
+            self.assertEqual(self.changelog_async(revlist=revlist),
+                             reference)
+            self.assertEqual(
+                self.changelog_async(revlist=revlist, log_workers=3),
+                reference)
+
+    def test_same_commit_values(self):
+        reference = list(gitchangelog.versions_data_iter(self.repos))
+
+        async def versions():
+            return [version async for version in
+                    aio.versions_data_aiter(self.repos)]
+
+        for version, ref in zip(self.run_async(versions()), reference):
+            self.assertEqual(version["tag"], ref["tag"])
+            self.assertEqual(version["date"], ref["date"])
+            commits = [c for s in version["sections"] for c in s["commits"]]
+            refs = [c for s in ref["sections"] for c in s["commits"]]
+            self.assertEqual(len(commits), len(refs))
+            for commit, ref_commit in zip(commits, refs):
+                self.assertEqual(commit["authors"], ref_commit["authors"])
+                self.assertEqual(commit["body"], ref_commit["body"])
+                self.assertEqual(commit["commit"].sha1_short,
+                                 ref_commit["commit"].sha1_short)
+
+    def test_concurrent_changelogs(self):
+        reference = self.changelog_async()
+
+        async def many():
+            return await asyncio.gather(*[
+                aio.changelog_async(
+                    repository=self.repos, output_engine=simple_renderer,
+                    ignore_regexps=[r"!minor"])
+                for _ in range(5)])
+
+        self.assertEqual(self.run_async(many()), [reference] * 5)
+
+    def test_loop_is_not_blocked(self):
+        loop_thread = threading.current_thread()
+        blocking_calls = []
+        orig_cmd = gitchangelog.cmd
+        orig_read = gitchangelog.GitCatFile.read
+
+        def checking_cmd(command, *args, **kwargs):
+            if threading.current_thread() is loop_thread:
+                blocking_calls.append(command)
+            return orig_cmd(command, *args, **kwargs)
+
+        def checking_read(cat_file, name):
+            if threading.current_thread() is loop_thread:
+                blocking_calls.append(name)
+            return orig_read(cat_file, name)
+
+        gitchangelog.cmd = checking_cmd
+        gitchangelog.GitCatFile.read = checking_read
+        try:
+            self.changelog_async()
+            self.changelog_async(revlist=["0.2..0.4"])
+            self.run_async(aio.changelog_async(
+                repository=self.repos, output_engine=gitchangelog.rest_py))
+        finally:
+            gitchangelog.cmd = orig_cmd
+            gitchangelog.GitCatFile.read = orig_read
+        self.assertEqual(blocking_calls, [])
+
+    def test_log_fields(self):
+        commands = []
+        orig_exec = asyncio.create_subprocess_exec
+
+        def recording_exec(*command, **kwargs):
+            commands.append(command)
+            return orig_exec(*command, **kwargs)
+
+        async def log():
+            repository = aio.AsyncGitRepos(self.repos)
+            return [commit async for commit in repository.log(
+                includes=["0.2"], fields=["subject", "author_name"])]
+
+        asyncio.create_subprocess_exec = recording_exec
+        try:
+            commits = self.run_async(log())
+        finally:
+            asyncio.create_subprocess_exec = orig_exec
+        self.assertEqual([c for c in commands if "log" in c][-1][-2],
+                         "--pretty=format:%H%x00%s%x00%an")
+        self.assertEqual([commit.subject for commit in commits],
+                         ["fix: second", "new: first"])
+        for commit in commits:
+            self.assertEqual(
+                sorted(k for k in ("sha1", "subject", "author_name", "body")
+                       if k in commit.__dict__),
+                ["author_name", "sha1", "subject"])
+
+    def test_failing_git_command(self):
+        with self.assertRaises(gitchangelog.ShellError):
+            self.changelog_async(revlist=["doesnotexist"])
@@ -0,0 +1,196 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``AncestryIndex`` in memory ancestry queries
+
+Answers must be the same than ``git merge-base --is-ancestor``, with
+or without ``commit-graph`` files.
+
+"""
+
+from __future__ import unicode_literals
+
+import itertools
+
+from .common import BaseGitReposTest, w
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import (
+    AncestryIndex, CommitGraph, PyGitRepos, ShellError)
+
+
+class TestAncestryIndex(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestAncestryIndex, self).setUp()
+
+        w("""
+
+            git commit -m 'a' --allow-empty
+            git tag a
+
+            git checkout -b b1
+            git commit -m 'b1' --allow-empty
+            git tag b1
+
+            git checkout -b b2 a
+            git commit -m 'b2' --allow-empty
+            git tag b2
+
+            git checkout -b b3 a
+            GIT_COMMITTER_DATE='2000-01-01 10:00:00' \
+                git commit -m 'b3 skewed' --allow-empty
+            git tag b3
+
+            git checkout master
+            git merge -q --no-ff -m 'octopus' b1 b2 b3
+            git tag octopus
+
+        """)
+
+    def sha1s(self):
+        return [self.repos.commit(name).sha1
+                for name in ("a", "b1", "b2", "b3", "octopus", "HEAD")]
+
+    def assertSameAsGit(self, repos=None):
+        repos = repos or self.repos
+        index = AncestryIndex(repos)
+        for ancestor, descendant in itertools.product(self.sha1s(),
+                                                      repeat=2):
+            try:
+                self.repos.swrap("git merge-base --is-ancestor %s %s"
+                                 % (ancestor, descendant))
+                expected = True
+            except ShellError:
+                expected = False
+            self.assertEqual(
+                index.is_ancestor(ancestor, descendant), expected,
+                msg="is_ancestor(%s, %s) should be %s"
+                % (ancestor, descendant, expected))
+        return index
+
+    def test_without_commit_graph(self):
+        index = self.assertSameAsGit()
+        self.assertTrue(index._graph is None)
+
+    def test_with_commit_graph(self):
+        w("git commit-graph write --reachable")
+        index = self.assertSameAsGit()
+        self.assertTrue(index._graph is not None)
+
+    def test_with_split_commit_graph(self):
+        w("""
+            git commit-graph write --reachable --split
+            git commit -m 'c' --allow-empty
+            git commit-graph write --reachable --split=no-merge
+        """)
+        index = self.assertSameAsGit()
+        self.assertEqual(len(index._graph._layers), 2)
+        self.assertEqual(index._graph.count, 6)
+
+    def test_commits_newer_than_commit_graph(self):
+        w("""
+            git commit-graph write --reachable
+            git commit -m 'c' --allow-empty
+        """)
+        self.assertSameAsGit()
+
+    def test_python_backend(self):
+        self.assertSameAsGit(PyGitRepos("."))
+        w("git commit-graph write --reachable")
+        self.assertSameAsGit(PyGitRepos("."))
+
+    def test_commit_graph_parents(self):
+        w("git commit-graph write --reachable")
+        graph = CommitGraph.open(".git/objects")
+        for line in self.repos.swrap(
+                "git rev-list --parents --all").split("\n"):
+            sha1, parents = line.split()[0], line.split()[1:]
+            self.assertEqual(graph.get(sha1)[1], parents)
+        self.assertEqual(graph.get("0" * 40), None)
+
+    def test_commit_comparison(self):
+        self.assertTrue(self.repos.commit("a") <= self.repos.commit("HEAD"))
+        self.assertTrue(self.repos.commit("b3") < self.repos.commit("HEAD"))
+        self.assertFalse(self.repos.commit("b1") <= self.repos.commit("b2"))
+
+
+class TestRevlistTags(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestRevlistTags, self).setUp()
+
+        w("""
+
+            git commit -m 'a' --allow-empty
+            git tag 0.1
+            git commit -m 'b' --allow-empty
+            git tag 0.2
+
+            git checkout -b side
+            git commit -m 'side' --allow-empty
+            git tag 0.3
+
+            git checkout master
+            git commit -m 'c' --allow-empty
+            git tag 0.4
+            git commit -m 'd' --allow-empty
+            git tag 0.5
+            git commit -m 'e' --allow-empty
+
+        """)
+
+    def expected_tags(self, revlist):
+        """Tags of versions as computed with ``git`` commands"""
+        walk = self.repos.swrap("git rev-list %s" % " ".join(revlist))
+        contains = walk.split("\n")[-1] if walk else None
+        max_rev = walk.split("\n")[0] if walk else self.repos.swrap(
+            "git rev-parse HEAD")
+        names = self.repos.swrap("git tag -l --contains %s" % contains) \
+            if contains else self.repos.swrap("git tag -l")
+        tags = [tag.identifier for tag in self.repos.tags()
+                if tag.identifier in names.split("\n")] + ["HEAD"]
+        expected = []
+        for tag in tags:
+            sha1 = self.repos.swrap("git rev-parse %s^{commit}" % tag)
+            if sha1 != max_rev and gitchangelog.cmd(
+                    "git merge-base --is-ancestor %s %s"
+                    % (max_rev, sha1))[2] == 0:
+                break
+            expected.append(tag)
+
+        ## versions without commits are not listed
+        excludes = [rev for rev in self.repos.swrap(
+            "git rev-parse --revs-only %s --" % " ".join(revlist)).split("\n")
+            if rev.startswith("^")]
+        return [tag for idx, tag in enumerate(expected)
+                if self.repos.swrap("git rev-list %s %s" % (
+                    tag, " ".join(["^%s" % t for t in expected[:idx]] +
+                                  excludes)))]
+
+    def test_same_tags_than_git_tag_contains(self):
+        for revlist in (["HEAD"], ["0.4"], ["0.2..0.4"], ["^0.2"],
+                        ["0.3", "^0.1"], ["0.1..HEAD~1"]):
+            commands = []
+            orig_swrap = gitchangelog.swrap
+
+            def recording_swrap(command, **kwargs):
+                commands.append(" ".join(command)
+                                if isinstance(command, list) else command)
+                return orig_swrap(command, **kwargs)
+
+            gitchangelog.swrap = recording_swrap
+            try:
+                repos = gitchangelog.GitRepos(".")
+                tags = [version["tag"] or "HEAD"
+                        for version in gitchangelog.versions_data_iter(
+                            repos, revlist=revlist)]
+            finally:
+                gitchangelog.swrap = orig_swrap
+            self.assertEqual(
+                list(reversed(tags)), self.expected_tags(revlist),
+                msg="Wrong versions for revlist %r" % revlist)
+            for command in commands:
+                self.assertFalse(command.startswith("git tag") or
+                                 "merge-base" in command,
+                                 msg="Unexpected command %r" % command)
+            self.assertEqual(
+                len([c for c in commands if c.startswith("git rev-list")]),
+                1 + 1)  ## revlist walk and parents of all commits
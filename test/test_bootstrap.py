@@ -0,0 +1,118 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``GitRepos`` startup
+
+Repository facts must be read with only one ``git`` process, and must
+be the same than the ones given by dedicated ``git`` commands.
+
+"""
+
+from __future__ import unicode_literals
+
+import io
+import os
+import os.path
+import sys
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import GitRepos
+
+
+class TestBootstrap(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestBootstrap, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second' --allow-empty
+            mkdir -p sub/dir
+
+        """)
+        self.calls = []
+        self.orig_cmd = gitchangelog.cmd
+
+        def counting_cmd(command, *args, **kwargs):
+            self.calls.append(command)
+            return self.orig_cmd(command, *args, **kwargs)
+
+        gitchangelog.cmd = counting_cmd
+
+    def tearDown(self):
+        gitchangelog.cmd = self.orig_cmd
+        super(TestBootstrap, self).tearDown()
+
+    def assertFacts(self, path):
+        del self.calls[:]
+        repos = GitRepos(path)
+        self.assertEqual(len(self.calls), 1,
+                         msg="Only one git process expected, got %r"
+                         % (self.calls, ))
+
+        git = lambda *args: gitchangelog.swrap(["git"] + list(args), cwd=path)
+        bare = git("rev-parse", "--is-bare-repository") == "true"
+        self.assertEqual(repos.bare, bare)
+        in_work_tree = git("rev-parse", "--is-inside-work-tree") == "true"
+        self.assertEqual(repos.toplevel, git("rev-parse", "--show-toplevel")
+                         if in_work_tree else None)
+        self.assertEqual(
+            repos.gitdir,
+            os.path.normpath(os.path.join(os.path.abspath(path),
+                                          git("rev-parse", "--git-dir"))))
+        self.assertEqual(repos.git_version, git("version"))
+        return repos
+
+    def test_work_tree(self):
+        self.assertFacts(".")
+        self.assertFacts("sub/dir")
+        self.assertFacts(".git")
+
+    def test_symlinked_sub_directory(self):
+        os.symlink(os.path.abspath("sub/dir"), "link")
+        repos = self.assertFacts("link")
+        self.assertEqual(repos.toplevel, os.path.realpath("."))
+
+    def test_bare(self):
+        w("git clone -q --bare . ../bare.git")
+        repos = self.assertFacts("../bare.git")
+        self.assertTrue(repos.bare)
+
+    def test_not_a_repository(self):
+        os.mkdir("../not-a-repos")
+        with self.assertRaises(EnvironmentError):
+            GitRepos("../not-a-repos")
+
+    def test_invalid_revisions(self):
+        file_put_contents(".gitchangelog.rc", "revs = ['0.1', 'nope']\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertNotEqual(errlvl, 0)
+        self.assertContains(err, "'nope' is not valid")
+
+        file_put_contents(".gitchangelog.rc", "revs = ['^0.1', 'HEAD']\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertContains(out, "Second")
+        self.assertNotContains(out, "First")
+
+    def test_revisions_not_valid_together(self):
+        def failing_cmd(command, *args, **kwargs):
+            if command[:3] == ["git", "rev-parse", "--rev-only"] and \
+                   len(command) > 5:
+                return "", "fatal: not together\n", 128
+            return self.orig_cmd(command, *args, **kwargs)
+
+        class Opts(object):
+            revlist = ["0.1", "HEAD"]
+
+        gitchangelog.cmd = failing_cmd
+        orig_stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            with self.assertRaises(SystemExit):
+                gitchangelog.get_revision(
+                    GitRepos("."), gitchangelog.Config(), Opts())
+        finally:
+            err, sys.stderr = sys.stderr.getvalue(), orig_stderr
+        self.assertContains(err, "Revisions '0.1 HEAD' are not valid together")
+        self.assertContains(err, "fatal: not together")
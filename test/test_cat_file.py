@@ -0,0 +1,68 @@
+# -*- encoding: utf-8 -*-
+"""Tests commit resolution through ``git cat-file --batch``
+
+Values must be the same than the ones given by ``git log``.
+
+"""
+
+from __future__ import unicode_literals
+
+from .common import BaseGitReposTest, w
+from gitchangelog.gitchangelog import GIT_FORMAT_KEYS
+
+
+class TestCatFileCommitResolution(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestCatFileCommitResolution, self).setUp()
+
+        w(r"""
+
+            git commit -m 'first commit' --allow-empty \
+                --author 'Bob <bob@example.com>' \
+                --date '2000-01-01 10:00:00 +0100'
+            git tag 0.1
+            git tag -a 0.2 -m 'annotated'
+
+            printf '\n\nsubject with   \nnon-ascii éà  \n \n\nbody\n\nChange-Id: 42\n' | \
+                git commit --cleanup=verbatim -F - --allow-empty \
+                --author 'Alice Wang <alice@example.com>' \
+                --date '2000-06-01 23:30:00 -0530'
+
+        """)
+
+    def assertSameAsGitLog(self, identifier):
+        reference = dict(
+            (commit.identifier, commit)
+            for commit in self.repos.log(includes=[identifier]))
+        dct = self.repos.read_commit(identifier)
+        self.assertTrue(dct is not None)
+        ref = reference[dct["sha1"]]
+        for key in GIT_FORMAT_KEYS:
+            if key == "sha1_short":
+                continue
+            self.assertEqual(dct[key], getattr(ref, key),
+                             msg="Mismatch on %r" % key)
+
+    def test_same_values_than_git_log(self):
+        self.assertSameAsGitLog("HEAD")
+        self.assertSameAsGitLog("0.1")
+
+    def test_log_date_config(self):
+        w("git config log.date iso")
+        self.assertEqual(self.repos.commit("0.1").author_date,
+                         "2000-01-01 10:00:00 +0100")
+        self.assertTrue("author_date" not in self.repos.read_commit("0.1"))
+
+    def test_annotated_tags_are_peeled(self):
+        self.assertEqual(self.repos.read_commit("0.2")["sha1"],
+                         self.repos.read_commit("0.1")["sha1"])
+
+    def test_missing_commit(self):
+        self.assertEqual(self.repos.read_commit("doesnotexist"), None)
+
+    def test_lazy_attributes(self):
+        head = self.repos.commit("HEAD")
+        self.assertEqual(head.author_name, "Alice Wang")
+        self.assertEqual(head.trailer_change_id, "42")
+        self.assertEqual(head.sha1_short, head.sha1[:len(head.sha1_short)])
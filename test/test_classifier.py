@@ -0,0 +1,143 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``CommitClassifier``
+
+Decisions must be the same than the ones of ``re.search`` on each
+regexp in turn, whatever regexps could be merged.
+
+"""
+
+from __future__ import unicode_literals
+
+import random
+import re
+
+from .common import BaseGitReposTest, ExtendedTest, w
+from gitchangelog.gitchangelog import CommitClassifier
+
+
+REGEXPS = [
+    r'^[nN]ew\s*:\s*((dev|use?r|pkg|test|doc)\s*:\s*)?([^\n]*)$',
+    r'^[cC]hg\s*:', r'^[fF]ix\s*:', r'^fix|new', r'^[|]x', r'^(a|b)',
+    r'\Ab', r'!minor', r'@wip', r'fix', r'a+b', r'b$', r'^$', r'',
+    r'(a)\1', r'(?P<x>b)(?P=x)', r'(?i)FIX', r'(?P<y>a)', r'(?P<y>b)',
+    r'^(.{3,3}\s*:)?\s*[fF]irst commit.?\s*$', r'[]a]', r'^[^]x]b',
+]
+
+WORDS = ["new:", "fix:", "chg:", "Fix :", "a", "b", "ab", "aab", "bb",
+         "x", "]", "|", "!minor", "@wip", "first commit", "", " "]
+
+
+def reference(ignore_regexps, section_regexps, subject):
+    if any(re.search(regexp, subject) is not None
+           for regexp in ignore_regexps):
+        return "ignored"
+    for section, regexps in section_regexps:
+        if regexps is None:
+            return section
+        for regexp in regexps:
+            if re.search(regexp, subject) is not None:
+                return section
+
+
+class TestClassifier(ExtendedTest):
+
+    def test_random_equivalence(self):
+        rand = random.Random(42)
+        for _ in range(300):
+            ignore_regexps = rand.sample(REGEXPS, rand.randint(0, 4))
+            section_regexps = [
+                ("S%d" % idx, rand.sample(REGEXPS, rand.randint(0, 3)))
+                for idx in range(rand.randint(0, 5))]
+            if rand.random() < 0.5:
+                section_regexps.insert(
+                    rand.randint(0, len(section_regexps)), ("Other", None))
+            classifier = CommitClassifier(ignore_regexps, section_regexps)
+            for _ in range(30):
+                subject = " ".join(rand.choice(WORDS)
+                                   for _ in range(rand.randint(0, 4)))
+                result = "ignored" if classifier.ignored(subject) else \
+                         classifier.section(subject)
+                self.assertEqual(
+                    result,
+                    reference(ignore_regexps, section_regexps, subject),
+                    msg="Mismatch on %r with %r and %r"
+                    % (subject, ignore_regexps, section_regexps))
+
+    def test_merged_regexps(self):
+        classifier = CommitClassifier(
+            [r'!minor', r'@wip', r'(a)\1'],
+            [("New", [r'^new:', r'^(dev|usr):']), ("Fix", [r'fix', r'^fix'])])
+        self.assertEqual([kind for _c, kind in classifier._ignores],
+                         ["floating", "floating", "alone"])
+        self.assertEqual([kind for _c, kind in classifier._sections],
+                         ["anchored", "anchored", "floating", "anchored"])
+        self.assertEqual(classifier.section("new: fix"), "New")
+
+        ## same group names, regexps can't be merged
+        classifier = CommitClassifier(
+            [], [("A", [r'^(?P<x>a)']), ("B", [r'^(?P<x>b)'])])
+        self.assertEqual([kind for _c, kind in classifier._sections],
+                         ["alone", "alone"])
+        self.assertEqual(classifier.section("b"), "B")
+
+    def test_stats(self):
+        classifier = CommitClassifier(
+            [r'!minor'], [("New", [r'^new:']), ("Other", None)])
+        for subject in ["new: a", "new: b !minor", "other", "new: c"]:
+            if not classifier.ignored(subject):
+                classifier.section(subject)
+        self.assertEqual(classifier.stats(), [
+            ("ignore", None, "!minor", 1),
+            ("section", "New", "^new:", 2),
+            ("section", "Other", None, 1),
+        ])
+
+    def test_stats_in_regexps_order(self):
+        rand = random.Random(42)
+        for _ in range(300):
+            ignore_regexps = rand.sample(REGEXPS, rand.randint(0, 4))
+            section_regexps = [("S", rand.sample(REGEXPS,
+                                                 rand.randint(0, 4)))]
+            classifier = CommitClassifier(ignore_regexps, section_regexps)
+            expected = [0] * (len(ignore_regexps) +
+                              len(section_regexps[0][1]))
+            for _ in range(30):
+                subject = " ".join(rand.choice(WORDS)
+                                   for _ in range(rand.randint(0, 4)))
+                if not classifier.ignored(subject):
+                    classifier.section(subject)
+                ## first match in the given order gets the hit
+                for idx, regexp in enumerate(ignore_regexps +
+                                             section_regexps[0][1]):
+                    if re.search(regexp, subject) is not None:
+                        expected[idx] += 1
+                        break
+            self.assertEqual([hits for _k, _l, _r, hits in
+                              classifier.stats()], expected,
+                             msg="Mismatch with %r and %r"
+                             % (ignore_regexps, section_regexps))
+
+
+class TestClassifierInChangelog(BaseGitReposTest):
+
+    def test_given_classifier(self):
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second !minor' --allow-empty
+            git commit -m 'fix: third' --allow-empty
+
+        """)
+        ignore_regexps = [r'!minor']
+        section_regexps = [("New", [r'^new:']), ("Fix", [r'^fix:'])]
+        classifier = CommitClassifier(ignore_regexps, section_regexps)
+        self.assertEqual(
+            self.simple_changelog(classifier=classifier),
+            self.simple_changelog(ignore_regexps=ignore_regexps,
+                                  section_regexps=section_regexps))
+        self.assertEqual(classifier.stats(), [
+            ("ignore", None, "!minor", 1),
+            ("section", "New", "^new:", 1),
+            ("section", "Fix", "^fix:", 1),
+        ])
@@ -0,0 +1,122 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``commit_cache`` option
+
+"""
+
+from __future__ import unicode_literals
+
+import io
+import os.path
+import sys
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog import gitchangelog
+
+
+class TestCommitCache(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestCommitCache, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.0.1
+            git commit -m 'fix: second
+
+Body of second.
+
+Co-Authored-By: Juliet <juliet@example.com>
+Change-Id: 1234' --allow-empty
+
+        """)
+
+    def test_same_output_with_cache(self):
+        reference = self.simple_changelog()
+        self.repos.use_commit_cache()
+        self.assertEqual(self.simple_changelog(), reference)
+        self.assertTrue(os.path.exists(self.repos.commit_cache.path))
+        ## second run uses cached records
+        self.assertEqual(self.simple_changelog(), reference)
+
+    def test_cached_records(self):
+        self.repos.use_commit_cache()
+        list(self.repos.log())
+        commits = list(self.repos.log())
+        self.assertTrue(commits[0]._trailer_parsed)
+        self.assertEqual(commits[0].trailer_change_id, "1234")
+        self.assertEqual(commits[0].author_names,
+                         ["Juliet", "The Committer"])
+        self.assertEqual(commits[0].body.strip(), "Body of second.")
+
+    def test_volatile_values(self):
+        self.repos.use_commit_cache()
+        list(self.repos.log())
+        self.repos.close()
+
+        ## as if the repository grew, and with another date format
+        w("""
+
+            git config core.abbrev 12
+            git config log.date iso
+
+        """)
+        repos = gitchangelog.GitRepos(".")
+        repos.use_commit_cache()
+        try:
+            commits = list(repos.log())
+            self.assertEqual(
+                [(c.sha1_short, c.author_date) for c in commits],
+                [tuple(line.split(" ", 1)) for line in w(
+                    "git log --format='%h %ad'").strip().split("\n")])
+            self.assertEqual(len(commits[0].sha1_short), 12)
+        finally:
+            repos.close()
+
+    def test_new_commits_after_cache(self):
+        self.repos.use_commit_cache()
+        list(self.repos.log())
+        w("""git commit -m 'chg: third' --allow-empty""")
+        self.assertEqual([c.subject for c in self.repos.log()],
+                         ["chg: third", "fix: second", "new: first"])
+
+    def test_cli_option(self):
+        file_put_contents(".gitchangelog.rc", "commit_cache = True\n")
+        reference, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(out, reference)
+        self.assertTrue(os.path.exists(os.path.join(
+            ".git", "gitchangelog", "commits.db")))
+
+    def test_truncated_git_log(self):
+        self.repos.use_commit_cache()
+        orig_git_log = self.repos._git_log
+
+        def truncated_git_log(*args, **kwargs):
+            yield next(orig_git_log(*args, **kwargs))
+
+        self.repos._git_log = truncated_git_log
+        with self.assertRaises(gitchangelog.ShellError) as ctx:
+            list(self.repos.log())
+        self.assertContains(str(ctx.exception), "got nothing")
+
+    def test_closed_by_main(self):
+        file_put_contents(".gitchangelog.rc", "commit_cache = True\n")
+        closed = []
+        orig_close = gitchangelog.GitRepos.close
+
+        def close(repos):
+            closed.append(repos.commit_cache)
+            orig_close(repos)
+
+        gitchangelog.GitRepos.close = close
+        orig_argv, orig_stdout = sys.argv, sys.stdout
+        sys.argv, sys.stdout = ["gitchangelog"], io.StringIO()
+        try:
+            gitchangelog.main()
+        finally:
+            gitchangelog.GitRepos.close = orig_close
+            sys.argv, sys.stdout = orig_argv, orig_stdout
+        self.assertEqual(len(closed), 1)
+        self.assertTrue(closed[0] is not None)
@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``GitConfig`` snapshot mode
+
+Values read from the snapshot must be the same than the ones given by
+one ``git config`` call per key.
+
+"""
+
+from __future__ import unicode_literals
+
+from .common import BaseGitReposTest, w, file_put_contents
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import GitConfig
+
+
+class TestGitConfigSnapshot(BaseGitReposTest):
+
+    KEYS = [
+        "gitchangelog.rc-path", "GitChangelog.RC-Path",
+        "i18n.logOuputEncoding", "multi.value", "MULTI.VALUE",
+        "sub.CaSe.key", "sub.case.key", "Sub.CaSe.KEY",
+        "flag.set", "empty.value", "lines.value", "included.value",
+        "not.set", "not.sub.set",
+    ]
+
+    def setUp(self):
+        super(TestGitConfigSnapshot, self).setUp()
+
+        file_put_contents("../included.cfg", "[included]\n\tvalue = yes\n")
+        w(r"""
+
+            git config gitchangelog.rc-path some/path
+            git config i18n.logOuputEncoding utf-8
+            git config --add multi.value first
+            git config --add multi.value 'second value'
+            git config --add Multi.Value last
+            git config sub.CaSe.key cased
+            git config empty.value ''
+            git config lines.value 'line 1
+line 2'
+            git config include.path ../../included.cfg
+            printf '[flag]\n\tset\n' >> .git/config
+
+        """)
+        self.calls = []
+        self.orig_cmd = gitchangelog.cmd
+
+        def counting_cmd(command, *args, **kwargs):
+            self.calls.append(command)
+            return self.orig_cmd(command, *args, **kwargs)
+
+        gitchangelog.cmd = counting_cmd
+
+    def tearDown(self):
+        gitchangelog.cmd = self.orig_cmd
+        super(TestGitConfigSnapshot, self).tearDown()
+
+    def test_same_values(self):
+        config = GitConfig(self.repos)
+        snapshot = GitConfig(self.repos, snapshot=True)
+        for key in self.KEYS:
+            self.assertEqual(snapshot.get(key), config.get(key),
+                             msg="Mismatch on %r" % key)
+            self.assertEqual(snapshot.get_all(key), config.get_all(key),
+                             msg="Mismatch on %r" % key)
+        self.assertEqual(snapshot.get_all("multi.value"),
+                         ["first", "second value", "last"])
+        self.assertEqual(snapshot["lines.value"], "line 1\nline 2")
+        self.assertEqual(snapshot["included.value"], "yes")
+        self.assertEqual(snapshot["flag.set"], "")
+        with self.assertRaises(KeyError):
+            snapshot["not.set"]
+
+    def test_one_git_process(self):
+        snapshot = GitConfig(self.repos, snapshot=True)
+        del self.calls[:]
+        for key in self.KEYS:
+            snapshot.get(key)
+            snapshot.get_all(key)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_cached_on_repository(self):
+        self.assertTrue(self.repos.config is self.repos.config)
+        self.repos.use_config_snapshot()
+        config = self.repos.config
+        self.assertTrue(config is self.repos.config)
+        del self.calls[:]
+        self.assertEqual(self.repos.config.get("multi.value"), "last")
+        self.assertEqual(self.repos.config.get("user.name"), "The Committer")
+        self.assertEqual(len(self.calls), 1)
@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+"""Tests git commands runner
+
+Commands are run with their own working directory, without changing
+the one of the process, so a ``GitRepos`` can be used from threads.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import sys
+import threading
+
+from .common import BaseGitReposTest, w
+from gitchangelog import gitchangelog
+
+
+class TestGitRunner(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestGitRunner, self).setUp()
+
+        w("""
+
+            git commit -m 'a' --allow-empty
+            git tag 0.1
+            git commit -m 'b' --allow-empty
+            git tag 0.2
+
+        """)
+
+    def test_cwd_is_not_changed(self):
+        os.chdir("..")
+        cwd = os.getcwd()
+        self.assertEqual(self.repos.swrap(["git", "tag", "-l"]), "0.1\n0.2")
+        self.assertEqual([tag.identifier for tag in self.repos.tags()],
+                         ["0.1", "0.2"])
+        self.assertEqual(os.getcwd(), cwd)
+
+    def test_concurrent_commands(self):
+        expected = dict((name, self.repos.swrap(["git", "rev-parse", name]))
+                        for name in ("0.1", "0.2", "HEAD"))
+        results = []
+        errors = []
+
+        def query(name):
+            try:
+                for _ in range(10):
+                    results.append(
+                        (name, self.repos.swrap(["git", "rev-parse", name])))
+            except Exception as e:  ## pylint: disable=broad-except
+                errors.append(e)
+
+        threads = [threading.Thread(target=query, args=(name, ))
+                   for name in expected for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 90)
+        for name, sha1 in results:
+            self.assertEqual(sha1, expected[name])
+
+    def test_arguments_are_not_interpreted(self):
+        out = self.repos.swrap(["git", "log", "--format=%s $HOME 'x'", "-1"])
+        self.assertEqual(out, "b $HOME 'x'")
+
+    def test_missing_executable(self):
+        out, err, errlvl = gitchangelog.cmd(["/tmp/doesnotexist-gitchangelog"])
+        self.assertEqual(errlvl, 127)
+        with self.assertRaises(gitchangelog.ShellError):
+            gitchangelog.wrap(["/tmp/doesnotexist-gitchangelog"])
+
+    def test_large_stderr_does_not_block(self):
+        proc = gitchangelog.Proc(
+            [sys.executable, "-c",
+             "import sys; sys.stderr.write('x' * 1000000); print('done')"])
+        self.assertEqual(list(proc.stdout.read()), ["done", ""])
+        self.assertEqual(len(proc.stderr_output()), 1000000)
+        self.assertEqual(proc.wait(), 0)
@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+"""Tests cold start of ``gitchangelog``
+
+Output engines modules must only be imported when used, neither by
+``import gitchangelog`` nor by a run that doesn't use them. Same for
+modules only needed by the caches and the python git backend.
+
+"""
+
+from __future__ import unicode_literals
+
+import os.path
+import sys
+import unittest
+
+from .common import BaseGitReposTest, BASE_PATH, w, file_put_contents
+from gitchangelog import gitchangelog
+
+try:
+    import pystache
+except ImportError:
+    pystache = None
+
+
+ENGINE_MODULES = ("pystache", "mako")
+
+## not already imported by the standard library modules we use
+OPTIONAL_MODULES = ("sqlite3", "json", "mmap")
+
+SCRIPT = """
+import sys
+sys.path.insert(0, %(src)r)
+from gitchangelog import gitchangelog
+sys.stderr.write("imported: %%s\\n" %% ",".join(
+    m for m in %(engines)r if m in sys.modules))
+sys.argv = ["gitchangelog"] + %(args)r
+try:
+    gitchangelog.main()
+except SystemExit:
+    pass
+sys.stderr.write("engines: %%s\\n" %% ",".join(
+    m for m in %(engines)r if m in sys.modules))
+"""
+
+
+class TestImport(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestImport, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second' --allow-empty
+
+        """)
+
+    def run_gitchangelog(self, *args, **kwargs):
+        """Return engine modules imported by the import and by a run"""
+        file_put_contents("script.py", SCRIPT % {
+            "src": os.path.join(BASE_PATH, "src"),
+            "args": list(args),
+            "engines": kwargs.get("modules", ENGINE_MODULES),
+        })
+        out, err, errlvl = gitchangelog.cmd(
+            [sys.executable, "script.py"])
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        values = dict(line.split(": ", 1) for line in err.splitlines()
+                      if line.startswith(("imported: ", "engines: ")))
+        return ([m for m in values["imported"].split(",") if m],
+                [m for m in values["engines"].split(",") if m])
+
+    def test_engines_not_imported(self):
+        imported, engines = self.run_gitchangelog()
+        self.assertEqual(imported, [])
+        self.assertEqual(engines, [])
+
+    @unittest.skipIf(pystache is None, "pystache is not installed")
+    def test_engine_imported_when_used(self):
+        file_put_contents(".gitchangelog.rc",
+                          "output_engine = mustache('markdown')\n")
+        imported, engines = self.run_gitchangelog()
+        self.assertEqual(imported, [])
+        self.assertEqual(engines, ["pystache"])
+
+    def test_optional_modules_not_imported(self):
+        imported, used = self.run_gitchangelog(modules=OPTIONAL_MODULES)
+        self.assertEqual(imported, [])
+        self.assertEqual(used, [])
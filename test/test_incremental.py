@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``incremental`` option
+
+"""
+
+from __future__ import unicode_literals
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+
+
+class TestIncremental(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestIncremental, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.0.1
+            git commit -m 'fix: second' --allow-empty
+            git tag 0.0.2
+            git commit -m 'chg: third' --allow-empty
+
+        """)
+
+        ## Count log walks
+        self.walks = []
+        log = self.repos.log
+
+        def counting_log(includes=["HEAD", ], **kwargs):
+            self.walks.append(includes[0].identifier)
+            return log(includes=includes, **kwargs)
+
+        self.repos.log = counting_log
+
+    def incremental_changelog(self, **kwargs):
+        self.walks[:] = []
+        return self.simple_changelog(incremental="key", **kwargs)
+
+    def test_unchanged_repository(self):
+        reference = self.simple_changelog()
+        self.assertEqual(self.incremental_changelog(), reference)
+        self.assertEqual(self.walks, ["HEAD", "0.0.2", "0.0.1"])
+        self.assertEqual(self.incremental_changelog(), reference)
+        self.assertEqual(self.walks, [])
+
+    def test_new_commits_and_tags(self):
+        self.incremental_changelog()
+        w("""
+
+            git commit -m 'new: fourth' --allow-empty
+            git tag 0.0.3
+            git commit -m 'new: fifth' --allow-empty
+
+        """)
+        changelog = self.incremental_changelog()
+        self.assertEqual(self.walks, ["HEAD", "0.0.3"])
+        self.assertEqual(changelog, self.simple_changelog())
+
+    def test_moved_tag(self):
+        self.incremental_changelog()
+        w("""git tag -f 0.0.2 HEAD""")
+        changelog = self.incremental_changelog()
+        self.assertEqual(self.walks, ["HEAD", "0.0.2"])
+        self.assertEqual(changelog, self.simple_changelog())
+
+    def test_other_key(self):
+        self.incremental_changelog()
+        self.walks[:] = []
+        self.simple_changelog(incremental="other")
+        self.assertEqual(self.walks, ["HEAD", "0.0.2", "0.0.1"])
+
+    def test_single_pass_log(self):
+        reference = self.simple_changelog()
+        self.incremental_changelog(single_pass_log=True)
+        w("""
+
+            git commit -m 'new: fourth' --allow-empty
+            git tag 0.0.3
+
+        """)
+        self.assertEqual(self.incremental_changelog(single_pass_log=True),
+                         "0.0.3\n  None:\n    * new: fourth [The Committer]\n"
+                         "    * chg: third [The Committer]\n\n" +
+                         reference.split("\n\n", 1)[1])
+
+    def test_cli_option(self):
+        file_put_contents(".gitchangelog.rc", "incremental = True\n")
+        reference, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(out, reference)
@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``log_fields`` projection of commit attributes
+
+Commits read with only some fields requested must give the same
+values, and the same changelogs.
+
+"""
+
+from __future__ import unicode_literals
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import GIT_FORMAT_KEYS
+
+
+class TestLogFields(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestLogFields, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second
+
+Some body.
+
+Co-Authored-By: Bob <bob@example.com>' --allow-empty
+            git tag 0.2
+            git commit -m 'chg: third' --allow-empty
+
+        """)
+
+    def record_git_log_keys(self):
+        requested = []
+        orig_keys = gitchangelog.git_format_keys
+
+        def recording_keys(fields=None):
+            keys = orig_keys(fields)
+            requested.append(keys)
+            return keys
+
+        gitchangelog.git_format_keys = recording_keys
+        self.addCleanup(setattr, gitchangelog, "git_format_keys", orig_keys)
+        return requested
+
+    def test_same_values(self):
+        reference = list(self.repos.log())
+        commits = list(self.repos.log(fields=["subject", "body"]))
+        self.assertEqual([c.sha1 for c in commits],
+                         [c.sha1 for c in reference])
+        self.assertEqual(sorted(k for k in commits[1].__dict__
+                                if k in GIT_FORMAT_KEYS),
+                         ["body", "sha1", "subject"])
+        for commit, ref in zip(commits, reference):
+            ## also parses trailers out of ``body``
+            self.assertEqual(commit.author_names, ref.author_names)
+            for key in GIT_FORMAT_KEYS:
+                ## values read on access are stripped
+                self.assertEqual(getattr(commit, key).strip(),
+                                 getattr(ref, key).strip(),
+                                 msg="Mismatch on %r" % key)
+
+    def test_trailers_without_other_fields(self):
+        commit = list(self.repos.log(fields=["body"]))[1]
+        self.repos.read_commit = None  ## must not be called
+        self.assertEqual(commit.trailer_co_authored_by,
+                         "Bob <bob@example.com>")
+        self.assertEqual(commit.body, "Some body.\n")
+
+    def test_engine_fields(self):
+        requested = self.record_git_log_keys()
+        reference = "".join(gitchangelog.changelog(
+            repository=self.repos, log_fields=None))
+        self.assertTrue(requested)
+        self.assertTrue(all(len(keys) == len(GIT_FORMAT_KEYS)
+                            for keys in requested))
+
+        requested[:] = []
+        changelog = "".join(gitchangelog.changelog(repository=self.repos))
+        self.assertEqual(changelog, reference)
+        self.assertTrue(requested)
+        for keys in requested:
+            self.assertEqual(sorted(keys), sorted(
+                gitchangelog.VERSION_DATA_FIELDS))
+
+        requested[:] = []
+        gitchangelog.changelog(repository=self.repos,
+                               output_engine=lambda data, opts: None)
+        self.assertTrue(all(len(keys) == len(GIT_FORMAT_KEYS)
+                            for keys in requested),
+                        msg="Unknown engines get all fields.")
+
+    def test_config_option(self):
+        reference, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+
+        file_put_contents(".gitchangelog.rc",
+                          "log_fields = ['sha1_short', 'author_date']\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertEqual(out, reference)
+
+        file_put_contents(".gitchangelog.rc", "log_fields = ['sha2']\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertNotEqual(errlvl, 0)
+        self.assertContains(err, "log_fields")
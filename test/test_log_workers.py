@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``log_workers`` option
+
+Versions read concurrently must give the very same changelog.
+
+"""
+
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog import gitchangelog
+
+
+class TestLogWorkers(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestLogWorkers, self).setUp()
+
+        w("""
+
+            for i in 1 2 3 4 5 6 7 8; do
+                git commit -m "new: feature $i" --allow-empty
+                git commit -m "fix: bug $i
+
+Body of $i.
+
+Co-Authored-By: Bob <bob@example.com>" --allow-empty
+                git tag 0.$i
+            done
+            git commit -m 'chg: unreleased' --allow-empty
+
+        """)
+
+    def changelog(self, **kwargs):
+        return "".join(gitchangelog.changelog(repository=self.repos,
+                                              **kwargs))
+
+    def test_same_changelog(self):
+        reference = self.changelog()
+        self.assertEqual(self.changelog(log_workers=4), reference)
+        self.assertEqual(self.changelog(log_workers=2, revlist=["^0.3"]),
+                         self.changelog(revlist=["^0.3"]))
+
+    def test_logs_are_concurrent(self):
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+        orig_log = self.repos.log
+
+        def slow_log(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            try:
+                time.sleep(0.05)
+                return list(orig_log(*args, **kwargs))
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        self.repos.log = slow_log
+        changelog = self.changelog(log_workers=4)
+        self.assertTrue(max_running[0] > 1,
+                        msg="Versions should be read concurrently.")
+        self.assertContains(changelog, "fix: bug 8 [Bob, The Committer]")
+
+    def test_cli_option(self):
+        reference, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+
+        file_put_contents(".gitchangelog.rc", "log_workers = 3\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertEqual(out, reference)
+
+        file_put_contents(".gitchangelog.rc", "log_workers = 0\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertNotEqual(errlvl, 0)
+        self.assertContains(err, "log_workers")
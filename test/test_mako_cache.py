@@ -0,0 +1,111 @@
+# -*- encoding: utf-8 -*-
+"""Tests compiled templates cache of ``makotemplate``
+
+Templates must be compiled once in the cache directory when one is
+asked for, and compiled again only when modified.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import os.path
+import unittest
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog.gitchangelog import makotemplate, user_cache_dir
+
+try:
+    import mako
+except ImportError:
+    mako = None
+
+
+DATA = {"title": "Changelog", "versions": []}
+
+OPTS = {"unreleased_version_label": "unreleased"}
+
+
+def compiled_files(directory):
+    return [os.path.join(dirpath, fname)
+            for dirpath, _dirnames, fnames in os.walk(directory)
+            for fname in fnames if fname.endswith(".tpl.py")]
+
+
+@unittest.skipIf(mako is None, "mako is not installed")
+class TestMakoCache(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestMakoCache, self).setUp()
+
+        self.orig_cache_home = os.environ.get("XDG_CACHE_HOME")
+        self.cache_home = os.path.join(self.tmpdir, "cache")
+        os.environ["XDG_CACHE_HOME"] = self.cache_home
+
+    def tearDown(self):
+        if self.orig_cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.orig_cache_home
+        super(TestMakoCache, self).tearDown()
+
+    def render(self, template_name, **kwargs):
+        return makotemplate(template_name, **kwargs)(DATA, OPTS)
+
+    def test_compiled_once(self):
+        file_put_contents("tpl.tpl", "first ${data['title']}")
+        self.assertEqual(self.render("tpl.tpl", module_directory=True),
+                         "first Changelog")
+        compiled = compiled_files(user_cache_dir())
+        self.assertEqual(len(compiled), 1)
+
+        os.utime(compiled[0], (1000000000, 1000000000))
+        os.utime("tpl.tpl", (900000000, 900000000))
+        self.assertEqual(self.render("tpl.tpl", module_directory=True),
+                         "first Changelog")
+        self.assertEqual(os.stat(compiled[0]).st_mtime, 1000000000)
+
+        ## modified templates are compiled again
+        file_put_contents("tpl.tpl", "second ${data['title']}")
+        self.assertEqual(self.render("tpl.tpl", module_directory=True),
+                         "second Changelog")
+        self.assertNotEqual(os.stat(compiled[0]).st_mtime, 1000000000)
+
+    def test_module_directory(self):
+        file_put_contents("tpl.tpl", "${data['title']}")
+        self.assertEqual(self.render("tpl.tpl", module_directory="mods"),
+                         "Changelog")
+        self.assertEqual(len(compiled_files("mods")), 1)
+
+        ## no cache by default
+        self.assertEqual(self.render("tpl.tpl"), "Changelog")
+        self.assertEqual(self.render("tpl.tpl", module_directory=False),
+                         "Changelog")
+        self.assertFalse(os.path.exists(self.cache_home))
+        self.assertEqual(len(compiled_files(".")), 1)
+
+    def test_unusable_cache_directory(self):
+        file_put_contents(self.cache_home, "not a directory")
+        file_put_contents("tpl.tpl", "${data['title']}")
+        self.assertEqual(self.render("tpl.tpl", module_directory=True),
+                         "Changelog")
+        self.assertEqual(
+            self.render("tpl.tpl", module_directory=os.path.join(
+                self.cache_home, "mods")),
+            "Changelog")
+
+    def test_bundled_template(self):
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+
+        """)
+        file_put_contents(".gitchangelog.rc",
+                          "output_engine = makotemplate('restructuredtext', "
+                          "module_directory=True)")
+        first, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertEqual(len(compiled_files(self.cache_home)), 1)
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(out, first)
@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+"""Tests cache of parsed mustache templates
+
+Templates must only be parsed again when their file changes, with the
+same rendering than parsing them each time.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import unittest
+
+from .common import BaseGitReposTest, file_put_contents
+from gitchangelog.gitchangelog import mustache
+
+try:
+    import pystache
+except ImportError:
+    pystache = None
+
+
+DATA = {
+    "title": "Changelog",
+    "versions": [{
+        "tag": "0.1", "date": "2000-01-01",
+        "sections": [{"label": "Fix", "commits": [{
+            "subject": "Fix something.", "authors": ["Bob"], "body": "",
+        }]}],
+    }],
+}
+
+OPTS = {"unreleased_version_label": "unreleased"}
+
+
+@unittest.skipIf(pystache is None, "pystache is not installed")
+class TestMustacheCache(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestMustacheCache, self).setUp()
+
+        self.parsed = []
+        self.orig_parse = pystache.parse
+
+        def counting_parse(template, *args, **kwargs):
+            self.parsed.append(template)
+            return self.orig_parse(template, *args, **kwargs)
+
+        pystache.parse = counting_parse
+
+    def tearDown(self):
+        pystache.parse = self.orig_parse
+        super(TestMustacheCache, self).tearDown()
+
+    def render(self, template_name):
+        return mustache(template_name)(
+            {"title": DATA["title"], "versions": list(DATA["versions"])},
+            OPTS)
+
+    def test_parsed_once(self):
+        for template in ("{{title}}: {{#versions}}{{label}} {{/versions}}",
+                         "{{title}} {{#title_chars}}={{/title_chars}}"):
+            file_put_contents("tpl.tpl", template)
+            del self.parsed[:]
+            first = self.render("tpl.tpl")
+            nb_parsed = len(self.parsed)
+            self.assertTrue(nb_parsed > 0)
+            self.assertEqual(self.render("tpl.tpl"), first)
+            self.assertEqual(len(self.parsed), nb_parsed)
+            self.assertEqual(
+                first, pystache.render(template, dict(
+                    DATA, general_title=True,
+                    title_chars=list(DATA["title"]),
+                    versions=[dict(DATA["versions"][0],
+                                   label="0.1 (2000-01-01)")])))
+
+    def test_modified_template(self):
+        file_put_contents("tpl.tpl", "first {{title}}")
+        os.utime("tpl.tpl", (1000000000, 1000000000))
+        self.assertEqual(self.render("tpl.tpl"), "first Changelog")
+
+        file_put_contents("tpl.tpl", "another {{title}}")
+        os.utime("tpl.tpl", (1000000000, 1000000000))
+        ## same mtime, but size differs
+        self.assertEqual(self.render("tpl.tpl"), "another Changelog")
+
+        file_put_contents("tpl.tpl", "again {{title}}")
+        self.assertEqual(self.render("tpl.tpl"), "again Changelog")
+        self.assertEqual(len(self.parsed), 3)
+
+    def test_bundled_templates(self):
+        for name in ("restructuredtext", "markdown"):
+            first = self.render(name)
+            nb_parsed = len(self.parsed)
+            self.assertEqual(self.render(name), first)
+            self.assertEqual(len(self.parsed), nb_parsed)
@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``--output`` option
+
+Changelog written in the given file must be the one written on standard
+output, and the file must only be replaced when its content changes.
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import os.path
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog.gitchangelog import write_file_atomically
+
+
+class TestOutput(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestOutput, self).setUp()
+
+        w("""
+
+            git commit -m 'new: first é' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second' --allow-empty
+
+        """)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_same_content(self):
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        out2, err, errlvl = cmd('$tprog -o CHANGELOG.rst')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertEqual(out2, "")
+        self.assertEqual(self.read("CHANGELOG.rst").decode("utf-8"), out)
+
+        ## revlist still given after the option
+        out, err, errlvl = cmd('$tprog 0.1')
+        cmd('$tprog --output=CHANGELOG.rst 0.1')
+        self.assertEqual(self.read("CHANGELOG.rst").decode("utf-8"), out)
+
+    def test_relative_to_current_directory(self):
+        os.mkdir("sub")
+        os.chdir("sub")
+        out, err, errlvl = cmd('$tprog -o CHANGELOG.rst')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertTrue(os.path.isfile("CHANGELOG.rst"))
+        self.assertFalse(os.path.exists(os.path.join("..", "CHANGELOG.rst")))
+
+    def test_unchanged_not_written(self):
+        cmd('$tprog -o CHANGELOG.rst')
+        os.chmod("CHANGELOG.rst", 0o640)
+        os.utime("CHANGELOG.rst", (1000000000, 1000000000))
+        out, err, errlvl = cmd('$tprog -o CHANGELOG.rst')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertEqual(os.stat("CHANGELOG.rst").st_mtime, 1000000000)
+
+        w("""
+
+            git commit -m 'fix: third' --allow-empty
+
+        """)
+        out, err, errlvl = cmd('$tprog -o CHANGELOG.rst')
+        self.assertNotEqual(os.stat("CHANGELOG.rst").st_mtime, 1000000000)
+        self.assertContains(self.read("CHANGELOG.rst").decode("utf-8"),
+                            "Third.")
+        self.assertEqual(os.stat("CHANGELOG.rst").st_mode & 0o777, 0o640)
+        self.assertEqual(sorted(os.listdir(".")),
+                         [".git", "CHANGELOG.rst"])
+
+    def test_untouched_on_error(self):
+        file_put_contents("CHANGELOG.rst", "previous content\n")
+        file_put_contents(".gitchangelog.rc", """
+def output_engine(data, opts={}):
+    yield "partial content"
+    raise ValueError("engine failure")
+""")
+        out, err, errlvl = cmd('$tprog -o CHANGELOG.rst')
+        self.assertEqual(errlvl, 255)
+        self.assertContains(err, "engine failure")
+        self.assertEqual(self.read("CHANGELOG.rst"), b"previous content\n")
+        self.assertEqual(sorted(os.listdir(".")),
+                         [".git", ".gitchangelog.rc", "CHANGELOG.rst"])
+
+    def test_write_file_atomically(self):
+        self.assertTrue(write_file_atomically("out.txt", ["a", "é"]))
+        self.assertEqual(self.read("out.txt"), "aé".encode("utf-8"))
+        self.assertFalse(write_file_atomically("out.txt", ["aé"]))
+        self.assertTrue(write_file_atomically("out.txt", ["aè"]))
+        self.assertEqual(self.read("out.txt"), "aè".encode("utf-8"))
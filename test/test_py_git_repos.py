@@ -0,0 +1,133 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``PyGitRepos``, the pure python repository reader
+
+Values and order of commits must be the same than the ones given by
+the ``git`` command.
+
+"""
+
+from __future__ import unicode_literals
+
+import difflib
+
+from .common import BaseGitReposTest, w, cmd, file_put_contents
+from gitchangelog.gitchangelog import GIT_FORMAT_KEYS, PyGitRepos
+
+
+class TestPyGitRepos(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestPyGitRepos, self).setUp()
+
+        ## Long similar messages get deltified when repacking.
+        body = "\n".join("line %d of a long body" % i for i in range(60))
+        file_put_contents("body", body)
+
+        w(r"""
+
+            git commit -m 'first commit' --allow-empty
+            git tag 0.0.1
+
+            git checkout -b develop
+            git commit -m 'new: first commit on develop' -m "$(cat body)" \
+                --allow-empty
+            git tag -a 0.0.2 -m 'annotated'
+
+            GIT_COMMITTER_DATE='2000-01-01 10:00:00' \
+                git commit -m 'new: skewed commit on develop' --allow-empty
+
+            git checkout master
+            git commit -m 'fix: hotfix on master' -m "$(cat body)" \
+                --allow-empty
+            git tag 0.0.3
+
+            git commit -m 'new: non-ascii éà' --allow-empty \
+                --author 'Bob Éric <bob@example.com>'
+
+            git checkout develop
+            git merge master --no-ff -m 'Merge master into develop'
+            git tag 0.0.4
+
+        """)
+
+    def assertSameRepos(self):
+        py_repos = PyGitRepos(".")
+        self.assertEqual(py_repos.gitdir, self.repos.gitdir)
+        self.assertEqual(py_repos.toplevel, self.repos.toplevel)
+
+        self.assertEqual(
+            [(t.identifier, t.sha1) for t in py_repos.tags()],
+            [(t.identifier, t.sha1) for t in self.repos.tags()])
+        self.assertEqual(
+            [t.identifier for t in py_repos.tags(contains="0.0.3")],
+            [t.identifier for t in self.repos.tags(contains="0.0.3")])
+
+        for includes, excludes in [(["HEAD"], []),
+                                   (["HEAD"], ["0.0.2"]),
+                                   (["0.0.4", "master"], ["0.0.1"]),
+                                   (["master"], ["develop"])]:
+            self.assertEqual(py_repos.boundary(includes, excludes),
+                             self.repos.boundary(includes, excludes))
+            for include_merge in (True, False):
+                kwargs = dict(includes=includes, excludes=excludes,
+                              include_merge=include_merge,
+                              with_parents=True)
+                commits = list(self.repos.log(**kwargs))
+                py_commits = list(py_repos.log(**kwargs))
+                self.assertEqual([c.sha1 for c in py_commits],
+                                 [c.sha1 for c in commits])
+                for c, py_c in zip(commits, py_commits):
+                    for key in list(GIT_FORMAT_KEYS) + ["parents"]:
+                        self.assertEqual(getattr(py_c, key), getattr(c, key),
+                                         msg="Mismatch on %r" % key)
+
+        self.assertTrue(py_repos.commit("0.0.1") <= py_repos.commit("HEAD"))
+        self.assertFalse(py_repos.commit("develop") <= py_repos.commit("master"))
+
+        from gitchangelog import gitchangelog
+        changelogs = ["".join(gitchangelog.changelog(repository=repos))
+                      for repos in (self.repos, py_repos)]
+        self.assertEqual(
+            changelogs[0], changelogs[1],
+            msg="Python reader should give the same changelog... "
+            "diff of git vs python:\n%s"
+            % '\n'.join(difflib.unified_diff(changelogs[0].split("\n"),
+                                             changelogs[1].split("\n"),
+                                             lineterm="")))
+
+    def test_loose_objects(self):
+        self.assertSameRepos()
+
+    def test_packed_objects_and_refs(self):
+        w("git gc -q --aggressive")
+        self.assertSameRepos()
+
+    def test_ref_deltas(self):
+        w("""
+            git -c repack.useDeltaBaseOffset=false repack -q -a -d -f
+            git pack-refs --all
+        """)
+        self.assertSameRepos()
+
+    def test_packed_and_loose_objects(self):
+        w("""
+            git repack -q -a -d
+            git commit -m 'new: loose commit' --allow-empty
+            git tag 0.0.5
+        """)
+        self.assertSameRepos()
+
+    def test_log_date_config(self):
+        w("git config log.date iso")
+        self.assertSameRepos()
+
+    def test_git_backend_option(self):
+        file_put_contents(".gitchangelog.rc", "git_backend = 'python'\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertContains(out, "Non-ascii éà")
+
+        file_put_contents(".gitchangelog.rc", "git_backend = 'foo'\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertNotEqual(errlvl, 0)
+        self.assertContains(err, "git_backend")
@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``rest_py`` output engine
+
+Output must be the same than the one of the previous renderer, that
+concatenated whole versions and wrapped subjects with ``textwrap``.
+
+"""
+
+from __future__ import unicode_literals
+
+import random
+import textwrap
+
+from .common import ExtendedTest
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import rest_py, wrap_lines, indent
+
+
+WORDS = ["fix", "a" * 75, "word", "é", "\t", "  ", "x\ty", "　", "",
+         "long-hyphenated-word", "--", ":", "[x]"]
+
+
+def reference_rest_py(data, opts):
+    """Previous implementation of ``rest_py``"""
+
+    def rest_title(label, char="="):
+        return (label.strip() + "\n") + (char * len(label) + "\n")
+
+    def render_version(version):
+        title = "%s (%s)" % (version["tag"], version["date"]) \
+                if version["tag"] else \
+                opts["unreleased_version_label"]
+        s = rest_title(title, char="-")
+        sections = version["sections"]
+        nb_sections = len(sections)
+        for section in sections:
+            section_label = section["label"] if section.get("label", None) \
+                            else "Other"
+            if not (section_label == "Other" and nb_sections == 1):
+                s += "\n" + rest_title(section_label, "~")
+            for commit in section["commits"]:
+                s += render_commit(commit)
+        return s
+
+    def render_commit(commit):
+        subject = commit["subject"]
+        subject += " [%s]" % (", ".join(commit["authors"]), )
+        entry = indent('\n'.join(textwrap.wrap(subject)),
+                       first="- ").strip() + "\n"
+        if commit["body"]:
+            entry += "\n" + indent(commit["body"])
+            entry += "\n"
+        return entry
+
+    out = ""
+    if data["title"]:
+        out += rest_title(data["title"], char="=") + "\n\n"
+    for version in data["versions"]:
+        if len(version["sections"]) > 0:
+            out += render_version(version) + "\n\n"
+    return out
+
+
+def random_text(rand, nb_words):
+    return " ".join(rand.choice(WORDS)
+                    for _ in range(rand.randint(0, nb_words)))
+
+
+def random_data(rand, nb_versions):
+    return {
+        "title": rand.choice(["Changelog", None]),
+        "versions": [{
+            "tag": rand.choice(["v%d" % idx, None]),
+            "date": "2020-01-01",
+            "sections": [{
+                "label": rand.choice(["New", "Other", None]),
+                "commits": [{
+                    "subject": random_text(rand, 40),
+                    "authors": ["Alice", "Bob"][:rand.randint(0, 2)],
+                    "body": "\n".join(random_text(rand, 10)
+                                      for _ in range(rand.randint(0, 3))),
+                } for _ in range(rand.randint(0, 20))],
+            } for _ in range(rand.randint(0, 3))],
+        } for idx in range(nb_versions)],
+    }
+
+
+class TestRestPy(ExtendedTest):
+
+    OPTS = {"unreleased_version_label": "unreleased"}
+
+    def test_same_output(self):
+        rand = random.Random(42)
+        for _ in range(50):
+            data = random_data(rand, 5)
+            self.assertEqual("".join(rest_py(data, self.OPTS)),
+                             reference_rest_py(data, self.OPTS))
+
+    def test_chunks(self):
+        data = random_data(random.Random(42), 200)
+        orig_size = gitchangelog.REST_PY_CHUNK_SIZE
+        gitchangelog.REST_PY_CHUNK_SIZE = 1024
+        try:
+            chunks = list(rest_py.chunks(data, self.OPTS))
+        finally:
+            gitchangelog.REST_PY_CHUNK_SIZE = orig_size
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in chunks[:-1]))
+        self.assertEqual("".join(chunks), reference_rest_py(data, self.OPTS))
+
+    def test_wrap_lines(self):
+        rand = random.Random(42)
+        for _ in range(20000):
+            text = random_text(rand, 30)
+            width = rand.randint(1, 80)
+            self.assertEqual(wrap_lines(text, width),
+                             textwrap.wrap(text, width),
+                             msg="Mismatch on %r with width %d"
+                             % (text, width))
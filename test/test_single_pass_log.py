@@ -0,0 +1,268 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``single_pass_log`` option
+
+The single ``git log`` walk must attribute commits to the same
+versions than the default one ``git log`` per tag implementation.
+
+"""
+
+from __future__ import unicode_literals
+
+import difflib
+import random
+
+from .common import BaseGitReposTest, simple_renderer, w, \
+    file_put_contents
+from gitchangelog import gitchangelog
+
+
+def sorted_renderer(data, opts):
+    """Order independent version of ``simple_renderer``"""
+    s = ""
+    for version in data["versions"]:
+        s += "%s\n" % version["tag"]
+        for section in version["sections"]:
+            s += "  %s:\n" % section["label"]
+            for subject in sorted(commit["subject"]
+                                  for commit in section["commits"]):
+                s += "    * %s\n" % subject
+        s += "\n"
+    return s
+
+
+class SinglePassLogTest(BaseGitReposTest):
+
+    def assertSameAttribution(self, output_engine=sorted_renderer,
+                              **kwargs):
+        changelogs = [
+            gitchangelog.changelog(
+                repository=self.repos, output_engine=output_engine,
+                single_pass_log=single_pass_log, **kwargs)
+            for single_pass_log in (False, True)]
+        self.assertEqual(
+            changelogs[0], changelogs[1],
+            msg="Single pass log should match per tag log... "
+            "diff of per tag vs single pass:\n%s"
+            % '\n'.join(difflib.unified_diff(changelogs[0].split("\n"),
+                                             changelogs[1].split("\n"),
+                                             lineterm="")))
+        return changelogs[1]
+
+
+class TestSinglePassCrossBranchTags(SinglePassLogTest):
+
+    def setUp(self):
+        super(TestSinglePassCrossBranchTags, self).setUp()
+
+        ## Target tree:
+        ##
+        ## *   Merge branch 'master' into develop  (HEAD, tag: 0.0.4, develop)
+        ## |\
+        ## | * new: some new commit  (master)
+        ## | * fix: hotfix on master  (tag: 0.0.3)
+        ## * | new: second commit on develop branch
+        ## * | new: first commit on develop branch  (tag: 0.0.2)
+        ## |/
+        ## * first commit  (tag: 0.0.1)
+
+        w("""
+
+            git commit -m 'first commit' --allow-empty
+            git tag 0.0.1
+
+            git checkout -b develop
+            git commit -m 'new: first commit on develop branch' --allow-empty
+            git tag 0.0.2
+
+            git commit -m 'new: second commit on develop branch' --allow-empty
+
+            git checkout master
+            git commit -m 'fix: hotfix on master' --allow-empty
+            git tag 0.0.3
+
+            git commit -m 'new: some new commit' --allow-empty
+
+            git checkout develop
+            git merge master --no-ff
+            git tag 0.0.4
+
+            git commit -m 'new: unreleased' --allow-empty
+
+        """)
+
+    def test_same_attribution(self):
+        changelog = self.assertSameAttribution()
+        self.assertContains(changelog, "None\n  None:\n    * new: unreleased")
+
+    def test_same_attribution_without_merges(self):
+        changelog = self.assertSameAttribution(include_merge=False)
+        self.assertNotContains(changelog, "Merge branch")
+
+    def test_same_attribution_with_revlist(self):
+        self.assertSameAttribution(revlist=["^0.0.2", "HEAD"])
+
+
+class TestSinglePassSharedTags(SinglePassLogTest):
+
+    def setUp(self):
+        super(TestSinglePassSharedTags, self).setUp()
+
+        ## Two tags on the same commit and a tag out of HEAD history.
+
+        w("""
+
+            git commit -m 'a' --allow-empty
+            git tag 0.1
+            git commit -m 'b' --allow-empty
+            git tag 0.2
+            git tag 0.3
+
+            git checkout -b side 0.1
+            git commit -m 'side' --allow-empty
+            git tag 1.0
+
+            git checkout master
+            git commit -m 'c' --allow-empty
+
+        """)
+
+    def test_same_attribution(self):
+        self.assertSameAttribution()
+
+
+def branchy_history(rand, nb_commits):
+    """Return a ``git fast-import`` stream of a random branchy history
+
+    Commit dates never decrease from parents to children, but are often
+    the same.
+
+    """
+    stream = []
+    dates = {}
+    tips = []
+    for mark in range(1, nb_commits + 1):
+        action = rand.random()
+        if not tips or action < 0.15:  ## new branch
+            parents = [rand.randint(1, mark - 1)] if tips else []
+            tips.append(mark)
+        elif action < 0.3 and len(tips) > 1:  ## merge
+            idx, other = rand.sample(range(len(tips)), 2)
+            parents = [tips[idx], tips[other]]
+            tips[idx] = mark
+            if rand.random() < 0.5:
+                tips.pop(other)
+        else:
+            idx = rand.randrange(len(tips))
+            parents = [tips[idx]]
+            tips[idx] = mark
+        dates[mark] = max([1000000000] + [dates[p] for p in parents]) + \
+                      rand.choice([0, 0, 1, 60])
+        message = "%s: C%d\n" % (rand.choice(["new", "fix", "chg"]), mark)
+        stream.append(
+            "commit refs/heads/tmp\nmark :%d\n"
+            "committer Bob <bob@example.com> %d +0000\n"
+            "data %d\n%s" % (mark, dates[mark], len(message), message))
+        stream.extend("%s :%d\n" % ("merge" if idx else "from", parent)
+                      for idx, parent in enumerate(parents))
+        stream.append("\n")
+        if rand.random() < 0.12:
+            stream.append("reset refs/tags/0.%d\nfrom :%d\n\n"
+                          % (mark, mark))
+    ## all branches end merged in the last commit
+    message = "new: last\n"
+    stream.append(
+        "commit refs/heads/tmp\nmark :%d\n"
+        "committer Bob <bob@example.com> %d +0000\n"
+        "data %d\n%s" % (nb_commits + 1, max(dates.values()) + 1,
+                          len(message), message))
+    stream.extend("%s :%d\n" % ("merge" if idx else "from", tip)
+                  for idx, tip in enumerate(tips))
+    stream.append("\n")
+    return "".join(stream)
+
+
+class TestSinglePassSameOrder(SinglePassLogTest):
+
+    def test_branchy_histories(self):
+        head = self.repos.swrap(["git", "symbolic-ref", "HEAD"]).strip()
+        for seed in range(3):
+            file_put_contents("../history.fi",
+                              branchy_history(random.Random(seed), 250))
+            out, err, errlvl = gitchangelog.cmd(
+                "git fast-import --quiet --force < ../history.fi")
+            self.assertEqual(errlvl, 0, msg="fast-import failed: %s" % err)
+            self.repos.swrap(["git", "update-ref", head, "refs/heads/tmp"])
+
+            changelog = self.assertSameAttribution(
+                output_engine=simple_renderer)
+            self.assertTrue(changelog.count("\n0.") > 10)
+            self.assertSameAttribution(output_engine=simple_renderer,
+                                       include_merge=False)
+            self.assertSameAttribution(output_engine=simple_renderer,
+                                       revlist=["HEAD", "^HEAD~5"])
+
+
+class TestSinglePassStreaming(SinglePassLogTest):
+
+    def setUp(self):
+        super(TestSinglePassStreaming, self).setUp()
+
+        ## ``side`` forks before 0.1, so its first commit has a parent
+        ## that is excluded by ``^0.1`` without being 0.1 itself.
+
+        w("""
+
+            git commit -m 'c1' --allow-empty
+            git checkout -b side
+            git commit -m 's1' --allow-empty
+            git checkout master
+            git commit -m 'c2' --allow-empty
+            git tag 0.1
+
+        """)
+
+    def add_versions(self):
+        w("""
+
+            git commit -m 'c3' --allow-empty
+            git commit -m 'c4' --allow-empty
+            git tag 0.2
+            git merge -q --no-ff -m 'merge side' side
+            git tag 0.3
+
+        """)
+
+    def assertStreams(self, **kwargs):
+        """First version must be given before the end of the log"""
+        log = self.repos.log
+        walked = []
+
+        def recording_log(*args, **kw):
+            for commit in log(*args, **kw):
+                walked.append(commit.sha1)
+                yield commit
+            walked.append(None)
+
+        self.repos.log = recording_log
+        try:
+            versions = gitchangelog.versions_data_iter(
+                self.repos, single_pass_log=True, **kwargs)
+            self.assertEqual(next(versions)["tag"], "0.3")
+            self.assertTrue(None not in walked,
+                            msg="Log should not be exhausted yet")
+            self.assertEqual([version["tag"] for version in versions],
+                             ["0.2"] if kwargs.get("revlist") else
+                             ["0.2", "0.1"])
+        finally:
+            del self.repos.log
+
+    def test_revlist_exclude(self):
+        self.add_versions()
+        self.assertStreams(revlist=["^0.1", "HEAD"])
+        self.assertSameAttribution(revlist=["^0.1", "HEAD"])
+
+    def test_incremental(self):
+        list(gitchangelog.versions_data_iter(
+            self.repos, single_pass_log=True, incremental="key"))
+        self.add_versions()
+        self.assertStreams(incremental="key")
@@ -0,0 +1,236 @@
+# -*- encoding: utf-8 -*-
+"""Tests streamed rendering of changelogs
+
+Output engines must render versions while they are read, and give
+the same output than rendering the whole changelog at once. Records
+read by ``Phile`` must not depend on how the output is cut in chunks.
+
+"""
+
+from __future__ import unicode_literals
+
+import copy
+import glob
+import io
+import os.path
+import random
+import threading
+import unittest
+
+from .common import BaseGitReposTest, ExtendedTest, w, cmd, file_put_contents
+from gitchangelog import gitchangelog
+from gitchangelog.gitchangelog import split_mustache_section, Iterator
+
+try:
+    import pystache
+except ImportError:
+    pystache = None
+
+try:
+    import mako
+except ImportError:
+    mako = None
+
+
+def lots_of_versions(consumed, nb=100000):
+    for idx in range(nb):
+        consumed[0] += 1
+        yield {
+            "tag": "0.%d" % idx, "date": "2000-01-01",
+            "sections": [{"label": "Fix", "commits": [{
+                "subject": "fix %d" % idx, "author": "Bob",
+                "authors": ["Bob"], "body": "",
+            }]}],
+        }
+
+
+TEMPLATE_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(gitchangelog.__file__)),
+    "templates")
+
+
+class ReadOnlyFile(object):
+    """File object without ``readinto(..)``, as on python 2"""
+
+    def __init__(self, content):
+        self._file = io.BytesIO(content)
+
+    def read(self, size):
+        return self._file.read(size)
+
+
+class TestPhile(ExtendedTest):
+
+    CHARS = ["a", "b", " ", "\n", "\x00", "é", "€", "\U0001f600", "-"]
+
+    def random_content(self, rand):
+        return "".join(rand.choice(self.CHARS)
+                       for _ in range(rand.randint(0, 40)))
+
+    def test_chunk_boundaries(self):
+        rand = random.Random(42)
+        for _ in range(300):
+            content = self.random_content(rand)
+            encoded = content.encode("utf-8")
+            for delimiter in ("\x00", "\n", "-", "€"):
+                expected = content.split(delimiter)
+                for buffersize in (1, 2, 3, 5, 64):
+                    for make_file in (io.BytesIO, ReadOnlyFile):
+                        phile = gitchangelog.Phile(
+                            make_file(encoded), buffersize=buffersize,
+                            encoding="utf-8")
+                        self.assertEqual(
+                            list(phile.read(delimiter=delimiter)), expected,
+                            msg="Mismatch on %r split by %r with "
+                            "buffersize %d" % (content, delimiter,
+                                               buffersize))
+
+    def test_invalid_bytes(self):
+        phile = gitchangelog.Phile(io.BytesIO(b"a\x00\xe9"), buffersize=1,
+                                   encoding="utf-8")
+        with self.assertRaises(UnicodeDecodeError):
+            list(phile.read(delimiter="\x00"))
+
+
+class TestSplitMustacheSection(ExtendedTest):
+
+    DATA = {
+        "title": "Changelog", "general_title": True, "empty": [],
+        "versions": [
+            {"label": "1.0", "tag": "1.0", "sections": [
+                {"label": "New", "display_label": True, "commits": [
+                    {"subject": "a", "author": "Bob", "body": "b",
+                     "body_indented": "  b",
+                     "author_names_joined": "Bob"}]}]},
+            {"label": "0.1", "tag": None, "sections": []},
+        ],
+    }
+
+    TEMPLATES = [
+        "{{title}}\n{{#versions}}\n* {{label}}\n{{/versions}}\nend\n",
+        "  {{#versions}}  \n{{label}}\n  {{/versions}}\n",
+        "\t{{#versions}}\n{{label}}\n {{/versions}}\rend",
+        "{{title}} {{#versions}}[{{label}}]{{/versions}} end",
+        "{{#versions}}{{#sections}}{{label}}{{/sections}}{{/versions}}",
+        "{{^empty}}\n{{title}}\n{{/empty}}\n{{#versions}}\n"
+        "{{#tag}}{{.}}{{/tag}}{{^tag}}unreleased{{/tag}}\n{{/versions}}",
+        "{{#versions}}\n{{/versions}}",
+        "{{#versions}}{{/versions}}\r\nend",
+    ]
+
+    def assertSameRendering(self, template):
+        parts = split_mustache_section(template, "versions")
+        self.assertTrue(parts is not None,
+                        msg="Template %r should be split" % template)
+        data = copy.deepcopy(self.DATA)
+        expected = pystache.render(template, data)
+        before, inner, after = parts
+        renderer = pystache.Renderer()
+        rendered = renderer.render(before, data) + "".join(
+            renderer.render(inner, data, version)
+            for version in data["versions"]) + renderer.render(after, data)
+        self.assertEqual(rendered, expected,
+                         msg="Different rendering of %r" % template)
+
+    @unittest.skipIf(pystache is None, "pystache is not installed")
+    def test_same_rendering(self):
+        for template in self.TEMPLATES:
+            self.assertSameRendering(template)
+
+    @unittest.skipIf(pystache is None, "pystache is not installed")
+    def test_bundled_templates(self):
+        for path in glob.glob(os.path.join(TEMPLATE_DIR, "mustache",
+                                           "*.tpl")):
+            with open(path) as f:
+                self.assertSameRendering(f.read())
+
+    def test_not_split(self):
+        for template in (
+                "no versions",
+                "{{#versions}}{{label}}",
+                "{{#versions}}a{{/versions}}{{#versions}}b{{/versions}}",
+                "{{#a}}{{#versions}}{{/versions}}{{/a}}",
+                "{{^versions}}none{{/versions}}",
+                "{{=<% %>=}}<%#versions%><%/versions%>"):
+            self.assertTrue(split_mustache_section(template, "versions")
+                            is None,
+                            msg="Template %r should not be split" % template)
+
+
+class TestStreamedEngines(BaseGitReposTest):
+
+    def assertStreams(self, engine):
+        consumed = [0]
+        threads = threading.active_count()
+        content = engine.chunks(
+            data={"title": "Changelog",
+                  "versions": lots_of_versions(consumed)},
+            opts={"unreleased_version_label": "unreleased"})
+        first = next(content)
+        self.assertTrue(first)
+        self.assertTrue(consumed[0] < 100000,
+                        msg="Output should start before all versions "
+                        "are read.")
+        content.close()
+        self.assertEqual(threading.active_count(), threads)
+
+    def assertSameContent(self, engine, iterator=False):
+        """Content must be a string unless streamed, or as ever"""
+        def data():
+            return {"title": "Changelog",
+                    "versions": lots_of_versions([0], nb=50)}
+        opts = {"unreleased_version_label": "unreleased"}
+        content = engine(data=data(), opts=opts)
+        if iterator:
+            self.assertTrue(isinstance(content, Iterator))
+            content = "".join(content)
+        self.assertTrue(isinstance(content, type("")))
+        self.assertEqual("".join(engine.chunks(data=data(), opts=opts)),
+                         content)
+
+    def test_rest_py(self):
+        self.assertStreams(gitchangelog.rest_py)
+        ## a generator, as it always was
+        self.assertSameContent(gitchangelog.rest_py, iterator=True)
+
+    @unittest.skipIf(pystache is None, "pystache is not installed")
+    def test_mustache(self):
+        for name in ("restructuredtext", "markdown"):
+            self.assertStreams(gitchangelog.mustache(name))
+            self.assertSameContent(gitchangelog.mustache(name))
+
+    @unittest.skipIf(mako is None, "mako is not installed")
+    def test_mako(self):
+        self.assertStreams(gitchangelog.makotemplate("restructuredtext"))
+        self.assertSameContent(gitchangelog.makotemplate("restructuredtext"))
+
+    @unittest.skipIf(mako is None, "mako is not installed")
+    def test_mako_errors(self):
+        file_put_contents("error.tpl",
+                          "% for version in data['versions']:\n"
+                          "${1 / 0}\n"
+                          "% endfor\n")
+        content = gitchangelog.makotemplate(
+            os.path.abspath("error.tpl")).chunks(
+            data={"title": None, "versions": iter([{}])}, opts={})
+        with self.assertRaises(ZeroDivisionError):
+            list(content)
+
+    def test_error_while_streaming(self):
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second' --allow-empty
+
+        """)
+        file_put_contents(
+            ".gitchangelog.rc",
+            "def subject_process(subject):\n"
+            "    if subject == 'new: first':\n"
+            "        raise ValueError('Bad subject')\n"
+            "    return subject\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 255)
+        self.assertContains(err, "Bad subject")
+        self.assertNotContains(err, "Traceback")
@@ -0,0 +1,50 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``GitRepos.tags()`` bulk resolution of tags
+
+"""
+
+from __future__ import unicode_literals
+
+from .common import BaseGitReposTest, w
+
+
+class TestTagsPrefetch(BaseGitReposTest):
+
+    def setUp(self):
+        super(TestTagsPrefetch, self).setUp()
+
+        w("""
+
+            GIT_COMMITTER_DATE='2000-01-01 10:00:00' \
+                git commit -m 'a' --allow-empty \
+                --author 'Bob <bob@example.com>' \
+                --date '2000-01-01 10:00:00'
+            git tag 0.1
+            GIT_COMMITTER_DATE='2000-01-03 10:00:00' \
+                git commit -m 'b' --allow-empty \
+                --author 'Alice <alice@example.com>' \
+                --date '2000-01-02 10:00:00'
+            git tag -a 0.2 -m 'annotated tag'
+
+        """)
+
+    def test_tag_attributes_are_prefetched(self):
+        tags = dict((tag.identifier, tag) for tag in self.repos.tags())
+        tag = tags["0.2"]
+        for attr in ("sha1", "author_name", "author_email",
+                     "author_date_timestamp", "committer_date_timestamp"):
+            self.assertTrue(attr in tag.__dict__,
+                            msg="%r should be prefetched" % attr)
+        self.assertEqual(tag.sha1, self.repos.commit("HEAD").sha1)
+        self.assertEqual(tag.author_name, "Alice")
+        self.assertEqual(tag.author_email, "alice@example.com")
+        self.assertEqual(tag.date, "2000-01-02")
+
+    def test_tags_order(self):
+        self.assertEqual([tag.identifier for tag in self.repos.tags()],
+                         ["0.1", "0.2"])
+
+    def test_tags_contains(self):
+        self.assertEqual([tag.identifier
+                          for tag in self.repos.tags(contains="0.2")],
+                         ["0.2"])
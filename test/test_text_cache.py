@@ -0,0 +1,132 @@
+# -*- encoding: utf-8 -*-
+"""Tests memoized subject and body processing
+
+Results must be the same than processing each text, while identical
+texts are only processed once, in a run or across runs.
+
+"""
+
+from __future__ import unicode_literals
+
+import os.path
+
+from .common import BaseGitReposTest, ExtendedTest, w, cmd, \
+    file_put_contents
+from gitchangelog.gitchangelog import (
+    MemoizedTextProc, TextCache, ucfirst, final_dot)
+
+
+class Counter(object):
+
+    def __init__(self, fun):
+        self.fun = fun
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return self.fun(text)
+
+
+class TestMemoizedTextProc(ExtendedTest):
+
+    def test_same_results(self):
+        proc = ucfirst | final_dot
+        memoized = MemoizedTextProc(proc, size=2)
+        texts = ["a", "b", "a", "c", "é", "b", "a"]
+        self.assertEqual(memoized.map(texts), proc.map(texts))
+        self.assertEqual([memoized(t) for t in texts],
+                         [proc(t) for t in texts])
+        self.assertEqual(memoized.stages, proc.stages)
+
+    def test_computed_once(self):
+        counter = Counter(lambda text: text.upper())
+        proc = MemoizedTextProc(counter)
+        self.assertEqual(proc.map(["a", "b", "a", "a"]), ["A", "B", "A", "A"])
+        self.assertEqual(proc.map(["b", "c"]), ["B", "C"])
+        self.assertEqual(counter.calls, ["a", "b", "c"])
+        self.assertEqual((proc.hits, proc.misses), (3, 3))
+
+    def test_lru_bound(self):
+        counter = Counter(lambda text: text.upper())
+        proc = MemoizedTextProc(counter, size=2)
+        for text in ["a", "b", "a", "c", "a", "b"]:
+            proc(text)
+        ## "b" was the least recently used when "c" came in
+        self.assertEqual(counter.calls, ["a", "b", "c", "b"])
+        self.assertEqual(len(proc._results), 2)
+
+        counter = Counter(lambda text: text.upper())
+        proc = MemoizedTextProc(counter, size=0)
+        proc.map(["a", "a"])
+        proc("a")
+        self.assertEqual(counter.calls, ["a", "a"])
+        self.assertEqual(len(proc._results), 0)
+
+
+class TestTextCache(BaseGitReposTest):
+
+    def test_persistence(self):
+        path = os.path.join(self.tmpdir, "cache", "texts.db")
+        counter = Counter(lambda text: text.upper())
+        cache = TextCache(path)
+        proc = MemoizedTextProc(counter, store=cache, key="k1")
+        self.assertEqual(proc.map(["a", "é"]), ["A", "É"])
+        cache.close()
+
+        cache = TextCache(path)
+        proc = MemoizedTextProc(counter, store=cache, key="k1")
+        self.assertEqual(proc.map(["é", "a", "b"]), ["É", "A", "B"])
+        self.assertEqual(counter.calls, ["a", "é", "b"])
+
+        ## other key, other results
+        proc = MemoizedTextProc(counter, store=cache, key="k2")
+        self.assertEqual(proc("a"), "A")
+        self.assertEqual(counter.calls, ["a", "é", "b", "a"])
+
+        ## large batches are read in several queries
+        texts = ["t%d" % idx for idx in range(600)]
+        proc = MemoizedTextProc(counter, store=cache, key="k1")
+        proc.map(texts[:300])
+        self.assertEqual(proc.map(["a"] + texts),
+                         ["A"] + [t.upper() for t in texts])
+        self.assertEqual(len(counter.calls), 4 + 600)
+        cache.close()
+
+    def test_changelog_runs(self):
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+            git commit -m 'fix: second' --allow-empty
+            git commit -m 'fix: second' --allow-empty
+
+        """)
+        reference, err, errlvl = cmd('$tprog --debug')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        ## not memoized by default
+        self.assertNotContains(err, "cached results used")
+
+        file_put_contents(".gitchangelog.rc", "text_cache = True\n")
+        for expected in ["1 cached results used, 2 computed",
+                         "3 cached results used, 0 computed"]:
+            out, err, errlvl = cmd('$tprog --debug')
+            self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+            self.assertEqual(out, reference)
+            self.assertContains(err.split("subject_process")[1], expected)
+        self.assertTrue(os.path.isfile(
+            os.path.join(".git", "gitchangelog", "texts.db")))
+
+        ## changing config files discards stored results, duplicates of
+        ## a same version are still processed once
+        file_put_contents(".gitchangelog.rc",
+                          "text_cache = True\ntext_cache_size = 16\n")
+        out, err, errlvl = cmd('$tprog --debug')
+        self.assertEqual(out, reference)
+        self.assertContains(err.split("subject_process")[1],
+                            "1 cached results used, 2 computed")
+
+    def test_invalid_size(self):
+        file_put_contents(".gitchangelog.rc", "text_cache_size = -1\n")
+        out, err, errlvl = cmd('$tprog')
+        self.assertEqual(errlvl, 1)
+        self.assertContains(err, "Invalid value -1 for 'text_cache_size'")
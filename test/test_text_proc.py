@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+"""Tests ``TextProc`` pipelines
+
+Chained processing functions are called as one flat list of stages,
+with the same results than calling them one after the other.
+
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from .common import BaseGitReposTest, ExtendedTest, w, cmd
+from gitchangelog.gitchangelog import (
+    TextProc, ReSub, Wrap, Indent, noop, strip, ucfirst, final_dot,
+    paragraph_wrap, indent)
+
+
+TEXTS = ["", "  fix: something @wip ", "new: Feature\n\nLong body " * 20,
+         "chg: dev: x\n\nKey: value", "é"]
+
+
+class TestTextProc(ExtendedTest):
+
+    def test_same_results(self):
+        proc = strip | ReSub(r'^(fix|new|chg):\s*', r'') | ucfirst | \
+               final_dot
+        for text in TEXTS[1:]:
+            expected = final_dot(ucfirst(re.sub(r'^(fix|new|chg):\s*', r'',
+                                                text.strip())))
+            self.assertEqual(proc(text), expected)
+        self.assertEqual(proc.map(TEXTS[1:]), [proc(t) for t in TEXTS[1:]])
+
+    def test_flat_stages(self):
+        proc = (noop | strip) | (Indent(chars="> ") | (noop | Wrap()))
+        self.assertEqual([name for name, _fun in proc.stages],
+                         ["noop", "strip", "indent", "noop", "Wrap('\\n\\n')"])
+        for text in TEXTS:
+            self.assertEqual(proc(text), paragraph_wrap(
+                indent(text.strip(), chars="> ")))
+
+    def test_resub_options(self):
+        self.assertEqual(ReSub(r'a', r'b', count=1)("aaa"), "baa")
+        self.assertEqual(ReSub(r'^x', r'y', flags=re.MULTILINE)("x\nx"),
+                         "y\ny")
+        self.assertEqual(ReSub(re.compile(r'a+'), r'b')("caa"), "cb")
+
+    def test_wrap_regexp(self):
+        text = "first part\nKey: value\nOther: value"
+        self.assertEqual(Wrap(regexp=r'\n(?=\w+\s*:)')(text),
+                         paragraph_wrap(text, regexp=r'\n(?=\w+\s*:)'))
+
+    def test_fun_compat(self):
+        self.assertEqual(ucfirst.fun("abc"), "Abc")
+        self.assertEqual((strip | ucfirst).fun(" abc"), "Abc")
+        self.assertEqual(TextProc(str.upper)("abc"), "ABC")
+        with self.assertRaises(SyntaxError):
+            strip | str.upper
+
+    def test_timings(self):
+        proc = strip | ucfirst
+        self.assertEqual(proc.timings(), [])
+        proc.enable_timing()
+        proc.map(["a", "b"])
+        proc("c")
+        self.assertEqual([(name, texts)
+                          for name, texts, _seconds in proc.timings()],
+                         [("strip", 3), ("ucfirst", 3)])
+        self.assertTrue(all(seconds >= 0
+                            for _n, _t, seconds in proc.timings()))
+
+
+class TestTimingsReport(BaseGitReposTest):
+
+    def test_debug_report(self):
+        w("""
+
+            git commit -m 'new: first' --allow-empty
+            git tag 0.1
+
+        """)
+        out, err, errlvl = cmd('$tprog --debug')
+        self.assertEqual(errlvl, 0, msg="Should not fail: %s" % err)
+        self.assertContains(err, "Time spent in subject_process stages:")
+        self.assertContains(err, "1 texts  ucfirst")
+
+        out, err, errlvl = cmd('$tprog')
+        self.assertNotContains(err, "Time spent")
@@ -0,0 +1,75 @@
+# -*- encoding: utf-8 -*-
+"""Tests trailers parsing of commit bodies
+
+Trailers must be found as ``REGEX_RFC822_POSTFIX`` finds them, but in
+linear time.
+
+"""
+
+from __future__ import unicode_literals
+
+import random
+import re
+import time
+
+from .common import ExtendedTest
+from gitchangelog.gitchangelog import (
+    GitCommit, GIT_FORMAT_KEYS, REGEX_RFC822_POSTFIX, trailers_start)
+
+
+LINES = [
+    "Key: value", "Co-Authored-By: Bob <bob@example.com>", "A: x", "Ab: ",
+    "Ab:x", "ab: x", "X-1: y", "Key-: v", "Ké: v", "Key: v\r", "text",
+    "", " ", " \t ", "  indented", "\tIndented: no", "\r",
+]
+
+
+def mk_commit(body):
+    commit = GitCommit(None, "sha1")
+    for key in GIT_FORMAT_KEYS:
+        setattr(commit, key, "")
+    commit.author_name = "Alice"
+    commit.author_email = "alice@example.com"
+    commit.body = body
+    return commit
+
+
+class TestTrailers(ExtendedTest):
+
+    def test_random_equivalence(self):
+        rand = random.Random(42)
+        for _ in range(20000):
+            body = "\n".join(rand.choice(LINES)
+                             for _ in range(rand.randint(0, 7)))
+            if rand.random() < 0.3:
+                body += "\n"
+            if rand.random() < 0.1:
+                body = "\n" + body
+            match = re.search(REGEX_RFC822_POSTFIX, body)
+            self.assertEqual(trailers_start(body),
+                             None if match is None else match.start(),
+                             msg="Mismatch on %r" % body)
+
+    def test_commit_trailers(self):
+        commit = mk_commit("Body\n\n"
+                           "Co-Authored-By: Bob <bob@example.com>\n"
+                           "Value-X: multi\n"
+                           "   line\n"
+                           "Co-Authored-By: Jack <jack@example.com>")
+        self.assertEqual(commit.trailer_value_x, "multi\nline")
+        self.assertEqual(commit.body, "Body\n")
+        self.assertEqual(commit.trailer_co_authored_by,
+                         ["Bob <bob@example.com>", "Jack <jack@example.com>"])
+        self.assertEqual(commit.author_names, ["Alice", "Bob", "Jack"])
+
+    def test_no_backtracking(self):
+        ## each more line doubled the time taken by the regexp
+        body = "Key: value\n" + "  more\n" * 2000 + "not a trailer"
+        start = time.time()
+        commit = mk_commit(body)
+        with self.assertRaises(AttributeError):
+            commit.trailer_key
+        self.assertEqual(commit.body, body)
+        self.assertTrue(time.time() - start < 1,
+                        msg="Parsing trailers took %.2fs"
+                        % (time.time() - start))